@@ -2,8 +2,8 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 
-from recommandation_de_livres.iads.app_ui import display_book_card, validate_pending_ratings
-from recommandation_de_livres.iads.utils import imdb_weighted_rating
+from recommandation_de_livres.iads.app_ui import display_book_card, validate_pending_ratings, get_popularity_ranker
+from recommandation_de_livres.iads.popularity import recommandation_populaire_top_k
 
 # --- Vérifier connexion ---
 if not st.session_state.get("logged_in", False):
@@ -38,21 +38,15 @@ if books_user_full.empty:
     # --- Suggestions populaires ---
     st.subheader("🔥 Suggestions populaires pour vous")
 
-    popularity_df = ratings.groupby("item_id").agg(
-        count=("rating", "count"),
-        mean_rating=("rating", "mean")
-    ).reset_index()
+    ranker = get_popularity_ranker()
+    genre = st.text_input("Filtrer par genre (optionnel)")
+    languages = sorted(ranker.table["language"].dropna().unique()) if "language" in ranker.table.columns else []
+    language = st.selectbox("Langue", ["Toutes"] + languages) if languages else "Toutes"
 
-    m = popularity_df["count"].quantile(0.80)
-    C = popularity_df["mean_rating"].mean()
-    popularity_df["score"] = popularity_df.apply(
-        lambda x: imdb_weighted_rating(x["count"], x["mean_rating"], m, C), axis=1
+    recommended_books = recommandation_populaire_top_k(
+        5, ranker, books, genre=genre or None, language=None if language == "Toutes" else language
     )
 
-    popularity_df = popularity_df.merge(books, on="item_id", how="inner")
-    top_books = popularity_df.sort_values("score", ascending=False).head(100)
-    recommended_books = top_books.head(5)
-
     cols = st.columns(5)
     for i, (_, book) in enumerate(recommended_books.iterrows()):
         with cols[i % 5]:
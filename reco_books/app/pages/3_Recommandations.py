@@ -1,15 +1,21 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import pickle
 import gensim
 from pathlib import Path
 from recommandation_de_livres.config import PROCESSED_DATA_DIR, MODELS_DIR
-from recommandation_de_livres.iads.app_ui import display_book_card, stars
+from recommandation_de_livres.iads.app_ui import display_book_card, stars, get_interaction_index, get_popularity_ranker, get_title_matcher, get_user_profiles, load_mf_scorer
 from recommandation_de_livres.loaders.load_data import load_pkl, load_parquet
-from recommandation_de_livres.iads.collabo_utils import recommandation_collaborative_top_k
-from recommandation_de_livres.iads.content_utils import suggest_titles, recommandation_content_top_k, user_profile_embedding, recommandation_content_user_top_k
+from recommandation_de_livres.iads.collabo_utils import get_index, recommandation_collaborative_top_k
+from recommandation_de_livres.iads.ann_index import load_content_knn
+from recommandation_de_livres.iads.batch_utils import precomputed_top_k
+from recommandation_de_livres.iads.catalog_index import CatalogIndex
+from recommandation_de_livres.iads.embedding_store import load_embedding_store, load_embeddings
+from recommandation_de_livres.iads.autocomplete import autocomplete_titles, load_title_autocomplete
+from recommandation_de_livres.iads.content_utils import recommandation_content_top_k, recommandation_content_user_top_k
 from recommandation_de_livres.iads.hybrid_utils import recommandation_hybride
+from recommandation_de_livres.iads.popularity import recommandation_populaire_top_k
+from recommandation_de_livres.iads.query_encoder import load_query_encoder
 
 DIR = st.session_state['DIR']
 
@@ -36,42 +42,41 @@ def load_content():
     return load_parquet(PROCESSED_DATA_DIR / DIR / "content_dataset.parquet")
 
 @st.cache_resource
-def load_tfidf():
-    with open(MODELS_DIR / DIR / "tfidf_model.pkl", "rb") as f:
-        tfidf = pickle.load(f)
-    with open(PROCESSED_DATA_DIR / DIR / "tfidf_matrix.pkl", "rb") as f:
-        tfidf_matrix = pickle.load(f)
-    return tfidf, tfidf_matrix
-
-@st.cache_resource
-def load_svd_model():
-    path = MODELS_DIR / DIR / "svd_model.pkl"
-    return load_pkl(path)
+def load_autocomplete():
+    # Index d'autocomplétion des titres et auteurs, construit une fois puis sauvegardé
+    return load_title_autocomplete(PROCESSED_DATA_DIR / DIR / "title_autocomplete.npz", load_content(), ratings)
 
 @st.cache_resource
 def load_sbert_model():
-    from sentence_transformers import SentenceTransformer
-    path = MODELS_DIR / DIR / "sbert_model"
-    return SentenceTransformer(str(path))
+    # Encodeur des titres hors catalogue : backend quantifié gardé en mémoire, cache des derniers titres
+    return load_query_encoder(MODELS_DIR / DIR / "sbert_model")
 
-@st.cache_data
+@st.cache_resource
 def load_embeddings_sbert():
-    return np.load(PROCESSED_DATA_DIR / DIR / "embeddings_sbert.npy")
+    # Projection mémoire en lecture seule, partagée par toutes les sessions
+    return load_embeddings(PROCESSED_DATA_DIR / DIR / "embeddings_sbert.npy")
+
+@st.cache_resource
+def load_store_sbert():
+    return load_embedding_store(PROCESSED_DATA_DIR / DIR / "embeddings_sbert.npy", load_content()["item_id"].to_numpy())
 
 # --- NOUVEAU : Chargement KNN Goodreads ---
 @st.cache_resource
 def load_knn_sbert():
-    path = MODELS_DIR / DIR / "knn_model_sbert.joblib"
-    if path.exists():
-        import joblib
-        return joblib.load(path)
-    return None
+    return load_content_knn(MODELS_DIR / DIR, "sbert", rerank_vectors=load_store_sbert().vectors)
+
+@st.cache_resource
+def load_catalog():
+    # Index titre / item_id du catalogue, construit une fois et partagé par toutes les sessions
+    return CatalogIndex.from_books(load_content())
 
-tfidf, tfidf_matrix = load_tfidf()
+autocomplete = load_autocomplete()
 content_df = load_content()
+catalog = load_catalog()
 embeddings = load_embeddings_sbert()
+store = load_store_sbert()
 knn = load_knn_sbert()
-svd_model = load_svd_model()
+svd_model = load_mf_scorer(DIR, "svd")
 
 # ---------------------------
 # Formulaire unique
@@ -89,10 +94,16 @@ if str(user_id) not in str(ratings['user_id']):
     if reco_type == "Livres proches en thème et style":
         book_title_input = st.text_input("Titre du livre de départ")
         if book_title_input:
-            suggestions_df = suggest_titles(book_title_input, tfidf, tfidf_matrix, content_df, k=10)
+            suggestions_df = autocomplete_titles(book_title_input, autocomplete, content_df, k=10)
+            if suggestions_df.empty:
+                # Aucune suggestion : titre le plus proche de la saisie dans tout le catalogue
+                book_index = get_index(book_title_input, content_df, matcher=get_title_matcher(DIR))
+                if book_index is not None:
+                    suggestions_df = content_df.loc[[book_index], ['title', 'authors']]
             suggestion_list = suggestions_df['title'] + " - " + suggestions_df['authors']
             selected_title_author = st.selectbox("Titres suggérés :", suggestion_list)
-            selected_title = selected_title_author.split(" - ")[0]
+            if selected_title_author:
+                selected_title = selected_title_author.split(" - ")[0]
 
 # Slider alpha pour hybride
 if reco_type == "Recommandations personnalisées":
@@ -106,23 +117,32 @@ if reco_type == "Recommandations personnalisées":
 # Recherche et affichage
 # ---------------------------
 if st.button("Rechercher"):
-    # vecteur utilisateur si dispo
-    item_id_to_idx = {item_id: idx for idx, item_id in enumerate(books['item_id'])}
-    user_vec = user_profile_embedding(user_id, ratings, embeddings, item_id_to_idx)
+    top_books = None
+    # vecteur utilisateur si dispo (ligne de la matrice des profils précalculés)
+    profiles = get_user_profiles("sbert", embeddings, content_df["item_id"].to_numpy())
+    user_vec = profiles.profile(user_id)
 
     # --- Cas 1 : Collaborative ---
     if reco_type == "Recommandations basées sur vos goûts":
         if user_vec is not None:
-            top_books, _ = recommandation_collaborative_top_k(
-                k=top_k,
-                user_id=user_id,
-                model=svd_model,
-                ratings=ratings,
-                books=books
-            )
+            # Recommandations précalculées par le job batch_recommend si elles existent
+            # et si l'utilisateur n'a pas noté de livres depuis (fold-in)
+            top_books = None
+            if str(user_id) not in svd_model.folded_users:
+                top_books = precomputed_top_k(PROCESSED_DATA_DIR / DIR / "recommendations" / "svd",
+                                              user_id, top_k, index=get_interaction_index())
+            if top_books is None:
+                top_books, _ = recommandation_collaborative_top_k(
+                    k=top_k,
+                    user_id=user_id,
+                    model=svd_model,
+                    ratings=ratings,
+                    books=books,
+                    index=get_interaction_index(),
+                    catalog=catalog
+                )
         else:
-            st.info("⚠️ Pas de notes disponibles, passez aux recommandations par thèmes et styles.")
-            st.stop()
+            st.info("⚠️ Pas de notes disponibles, voici les livres les plus populaires. Passez aussi aux recommandations par thèmes et styles.")
 
     # --- Cas 2 : Contenu ---
     if reco_type == "Livres proches en thème et style":
@@ -134,7 +154,9 @@ if st.button("Rechercher"):
                 None,
                 content_df,
                 knn=knn,
-                k=top_k
+                k=top_k,
+                store=store,
+                catalog=catalog
             )
         elif user_vec is not None:
             top_books, _ = recommandation_content_user_top_k(
@@ -143,7 +165,11 @@ if st.button("Rechercher"):
                 content_df,
                 ratings,
                 knn=knn,
-                k=top_k
+                k=top_k,
+                profiles=profiles,
+                store=store,
+                index=get_interaction_index(),
+                catalog=catalog
             )
         else:
             st.warning("Veuillez saisir un titre pour obtenir des recommandations.")
@@ -163,12 +189,22 @@ if st.button("Rechercher"):
                 alpha=alpha,
                 knn=knn,
                 k=top_k,
-                top_k_content=100
+                top_k_content=100,
+                index=get_interaction_index(),
+                store=store,
+                catalog=catalog,
+                books_catalog=catalog
             )
         else:
-            st.info("⚠️ Pas de notes trouvées : passez aux recommandations par thèmes et styles.")
-            st.stop()
-            
+            st.info("⚠️ Pas de notes trouvées : voici les livres les plus populaires. Passez aussi aux recommandations par thèmes et styles.")
+
+    # ---------------------------
+    # Repli sur les livres populaires
+    # ---------------------------
+    if top_books is None or top_books.empty:
+        top_books = recommandation_populaire_top_k(
+            top_k, get_popularity_ranker(), books, exclude=get_interaction_index().rated_item_ids(user_id)
+        )
 
     # ---------------------------
     # Fusion avec books
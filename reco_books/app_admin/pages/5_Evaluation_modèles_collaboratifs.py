@@ -2,12 +2,11 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import time
+import os
 from pathlib import Path
-from surprise import SVD, NMF, Dataset, Reader
-from surprise.model_selection import KFold
 from recommandation_de_livres.config import PROCESSED_DATA_DIR
 from recommandation_de_livres.loaders.load_data import load_parquet
-from recommandation_de_livres.iads.evaluation import precision_recall_at_k
+from recommandation_de_livres.iads.cross_validation import cross_validate
 
 
 # --- TITRE ---
@@ -31,7 +30,7 @@ st.write(f"📊 Dataset chargé avec **{len(collaborative_df)} notes**.")
 st.write(f"Nombre de livres uniques : {len(collaborative_df['item_id'].unique())}")
 
 # --- Échantillonnage optionnel ---
-sample_size = st.number_input("Taille de l'échantillon (0 = tout le dataset)", min_value=0, max_value=len(collaborative_df), value=100, step=1000)
+sample_size = st.number_input("Taille de l'échantillon (0 = tout le dataset)", min_value=0, max_value=len(collaborative_df), value=0, step=1000)
 if sample_size > 0 and sample_size < len(collaborative_df):
     collaborative_df = collaborative_df.sample(sample_size, random_state=42)
     st.success(f"Utilisation d'un échantillon de **{len(collaborative_df)}** notes.")
@@ -44,8 +43,9 @@ if min_rating >= max_rating:
     st.stop()
 rating_scale = (min_rating, max_rating)
 
-k_top = st.slider("K pour Precision@K et Recall@K", min_value=1, max_value=50, value=10)
+k_top = st.slider("K pour les métriques @K (Precision, Recall, NDCG, MAP, HitRate)", min_value=1, max_value=50, value=10)
 threshold = st.slider("Seuil d'une recommandation 'pertinente'", min_value=float(min_rating), max_value=float(max_rating), value=4.0, step=0.5)
+full_catalog = st.checkbox("Évaluer aussi le classement sur tout le catalogue (tous les livres non notés sont scorés)")
 
 # --- Paramètres spécifiques SVD & NMF ---
 tab1, tab2 = st.tabs(['Paramètres SVD', 'Paramètres NMF'])
@@ -64,67 +64,48 @@ with tab2:
     reg_pu_nmf = st.number_input("Régularisation utilisateurs", min_value=0.001, max_value=0.1, value=0.06, step=0.001)
     reg_qi_nmf = st.number_input("Régularisation items", min_value=0.001, max_value=0.1, value=0.06, step=0.001)
 
+# --- Paramètres d'exécution ---
+n_workers = st.number_input("Nombre de processus", min_value=1, max_value=64, value=min(os.cpu_count(), 10), step=1)
+seed = st.number_input("Graine du découpage en folds", min_value=0, value=42, step=1)
+
 # --- Bouton d'évaluation ---
 if st.button("🚀 Lancer la cross-validation complète"):
-    reader = Reader(rating_scale=rating_scale)
-    data = Dataset.load_from_df(collaborative_df[['user_id', 'item_id', 'rating']], reader)
-
-    results = {}
-    kf = KFold(n_splits=5)
-
     algos = {
-        "SVD": SVD(n_factors=n_factors_svd, n_epochs=n_epochs_svd, lr_all=lr_all_svd, reg_all=reg_all_svd),
-        "NMF": NMF(n_factors=n_factors_nmf, n_epochs=n_epochs_nmf, reg_pu=reg_pu_nmf, reg_qi=reg_qi_nmf)
+        "SVD": {"n_factors": n_factors_svd, "n_epochs": n_epochs_svd, "lr_all": lr_all_svd, "reg_all": reg_all_svd},
+        "NMF": {"n_factors": n_factors_nmf, "n_epochs": n_epochs_nmf, "reg_pu": reg_pu_nmf, "reg_qi": reg_qi_nmf}
     }
-
-    for model_name, algo in algos.items():
-        with st.spinner(f"Évaluation du modèle {model_name}..."):
-            start_model_time = time.time()
-
-            rmse_scores, mae_scores, precisions, recalls, catalog_coverages = [], [], [], [], []
-
-            for fold, (trainset, testset) in enumerate(kf.split(data), start=1):
-                fold_start = time.time()
-
-                algo.fit(trainset)
-                predictions = algo.test(testset)
-
-                # RMSE & MAE
-                rmse = np.sqrt(np.mean([(pred.est - pred.r_ui) ** 2 for pred in predictions]))
-                mae = np.mean([abs(pred.est - pred.r_ui) for pred in predictions])
-                rmse_scores.append(rmse)
-                mae_scores.append(mae)
-
-                # Precision@K & Recall@K
-                prec, rec = precision_recall_at_k(predictions, k=k_top, threshold=threshold)
-                precisions.append(prec)
-                recalls.append(rec)
-
-                # Catalog Coverage
-                all_items = collaborative_df['item_id'].unique()
-                recommended_items = set(pred.iid for pred in predictions if pred.est >= threshold)
-                catalog_cov = len(recommended_items) / len(all_items)
-                catalog_coverages.append(catalog_cov)
-
-                st.write(f"**{model_name} - Fold {fold}/5 terminé** ({time.time() - fold_start:.2f}s)")
-
-            total_time = time.time() - start_model_time
-
-            results[model_name] = {
-                "RMSE": np.mean(rmse_scores),
-                "MAE": np.mean(mae_scores),
-                "Precision@K": np.mean(precisions),
-                "Recall@K": np.mean(recalls),
-                "CatalogCoverage": np.mean(catalog_coverages),
-                "TempsTotal(s)": total_time,
-                "TempsMoyenParFold(s)": total_time / 5
-            }
+    n_splits = 5
+    n_tasks = n_splits * len(algos)
+
+    # Les folds et les algorithmes sont évalués en parallèle, les résultats arrivent au fil de l'eau
+    start_time = time.time()
+    progress = st.progress(0, text="Cross-validation en cours...")
+    fold_table = st.empty()
+    fold_results = []
+
+    for result in cross_validate(collaborative_df, algos, n_splits=n_splits, seed=int(seed), rating_scale=rating_scale,
+                                 k=k_top, threshold=threshold, full_catalog=full_catalog, n_workers=int(n_workers),
+                                 cache_dir=PROCESSED_DATA_DIR / DIR / "cv_folds"):
+        fold_results.append(result)
+        progress.progress(len(fold_results) / n_tasks,
+                          text=f"{result['model']} - Fold {result['fold'] + 1}/{n_splits} terminé "
+                               f"({result['TempsEntrainement(s)'] + result['TempsEvaluation(s)']:.2f}s)")
+        fold_table.dataframe(pd.DataFrame(fold_results).sort_values(["model", "fold"]), hide_index=True)
+
+    total_time = time.time() - start_time
+    st.write(f"⏱️ Cross-validation terminée en {total_time:.2f}s")
+
+    per_fold = pd.DataFrame(fold_results).drop(columns="fold")
+    per_fold["TempsFold(s)"] = per_fold["TempsEntrainement(s)"] + per_fold["TempsEvaluation(s)"]
+    summary = per_fold.groupby("model").mean().rename(columns={"TempsFold(s)": "TempsMoyenParFold(s)"})
+    summary["TempsTotal(s)"] = per_fold.groupby("model")["TempsFold(s)"].sum()
+    summary = summary.drop(columns=["TempsEntrainement(s)", "TempsEvaluation(s)"])
 
     # --- Résultats ---
     st.subheader("📊 Résultats comparatifs")
-    summary = pd.DataFrame(results).T
+    higher_is_better = [c for c in summary.columns if c.endswith(("@K", "CatalogCoverage"))]
     styled_summary = summary.style.highlight_max(
-        subset=["Precision@K", "Recall@K", "CatalogCoverage"], color="lightgreen", axis=0
+        subset=higher_is_better, color="lightgreen", axis=0
     ).highlight_min(
         subset=["RMSE", "MAE", "TempsTotal(s)", "TempsMoyenParFold(s)"], color="lightblue", axis=0
     )
@@ -1,8 +1,11 @@
 import streamlit as st
-import pickle
+import pandas as pd
+import json
 from surprise import SVD, NMF, Dataset, Reader
 from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
 from recommandation_de_livres.loaders.load_data import load_parquet
+from recommandation_de_livres.iads.als import ALS, build_rating_matrix
+from recommandation_de_livres.iads.model_store import model_dir, save_mf_model
 
 st.title("⚙️ Entraînement des modèles collaboratifs")
 
@@ -25,8 +28,17 @@ if not features_path.exists():
 collaborative_df = load_parquet(features_path)
 st.info(f"📊 {len(collaborative_df)} notes chargées.")
 
-# --- Onglets pour SVD et NMF ---
-tab_svd, tab_nmf = st.tabs(["📈 SVD", "🔢 NMF"])
+def load_search_best(name):
+    """ Retourne la meilleure configuration trouvée par `search_mf` pour le modèle `name`, s'il y en a une.
+    """
+    path = MODELS_DIR / DIR / f"{name}_search_best.json"
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+# --- Onglets pour SVD, NMF et ALS ---
+tab_svd, tab_nmf, tab_als = st.tabs(["📈 SVD", "🔢 NMF", "⚡ ALS"])
 
 # =====================================================
 # ====================== SVD ==========================
@@ -34,11 +46,14 @@ tab_svd, tab_nmf = st.tabs(["📈 SVD", "🔢 NMF"])
 with tab_svd:
     st.subheader("Paramètres SVD")
 
-    # --- Hyperparamètres ---
-    n_factors_svd = st.number_input("Nombre de facteurs latents", min_value=10, max_value=500, value=50, step=10, key="svd_n_factors")
-    n_epochs_svd = st.number_input("Nombre d'epochs", min_value=5, max_value=200, value=50, step=5, key="svd_n_epochs")
-    lr_all = st.number_input("Learning rate", min_value=0.0001, max_value=0.1, value=0.002, step=0.001, format="%.4f", key="svd_lr")
-    reg_all = st.number_input("Régularisation", min_value=0.001, max_value=0.1, value=0.02, step=0.001, format="%.4f", key="svd_reg")
+    # --- Hyperparamètres (meilleure configuration de la recherche par défaut) ---
+    best_svd = load_search_best("svd")
+    if best_svd:
+        st.info(f"Valeurs par défaut issues de la recherche d'hyperparamètres (RMSE validation : {best_svd['rmse']:.4f}).")
+    n_factors_svd = st.number_input("Nombre de facteurs latents", min_value=10, max_value=500, value=int(best_svd.get("n_factors", 50)), step=10, key="svd_n_factors")
+    n_epochs_svd = st.number_input("Nombre d'epochs", min_value=5, max_value=200, value=int(best_svd.get("n_epochs", 50)), step=5, key="svd_n_epochs")
+    lr_all = st.number_input("Learning rate", min_value=0.0001, max_value=0.1, value=float(best_svd.get("lr_all", 0.002)), step=0.001, format="%.4f", key="svd_lr")
+    reg_all = st.number_input("Régularisation", min_value=0.001, max_value=0.1, value=float(best_svd.get("reg_all", 0.02)), step=0.001, format="%.4f", key="svd_reg")
 
     st.subheader("Échelle des notes")
     min_rating = st.number_input("Note minimale", min_value=1.0, max_value=10.0, value=1.0, step=0.5, key="svd_min_rating")
@@ -58,14 +73,12 @@ with tab_svd:
 
         svd = SVD(n_factors=n_factors_svd, n_epochs=n_epochs_svd, lr_all=lr_all, reg_all=reg_all)
 
-        model_path = MODELS_DIR / DIR / "svd_model.pkl"
-        model_path.parent.mkdir(parents=True, exist_ok=True)
+        model_path = model_dir(MODELS_DIR / DIR, "svd")
 
         with st.spinner("Entraînement SVD en cours..."):
             svd.fit(trainset)
 
-        with open(model_path, 'wb') as f:
-            pickle.dump(svd, f)
+        save_mf_model(svd, model_path, algo="svd", n_factors=n_factors_svd, n_epochs=n_epochs_svd, lr_all=lr_all, reg_all=reg_all)
 
         st.success(f"✅ Modèle SVD sauvegardé dans {model_path}")
 
@@ -75,11 +88,14 @@ with tab_svd:
 with tab_nmf:
     st.subheader("Paramètres NMF")
 
-    # --- Hyperparamètres ---
-    n_factors_nmf = st.number_input("Nombre de facteurs latents", min_value=10, max_value=500, value=50, step=10, key="nmf_n_factors")
-    n_epochs_nmf = st.number_input("Nombre d'epochs", min_value=5, max_value=200, value=50, step=5, key="nmf_n_epochs")
-    reg_pu = st.number_input("Régularisation utilisateurs", min_value=0.001, max_value=1.0, value=0.06, step=0.01, format="%.3f", key="nmf_reg_pu")
-    reg_qi = st.number_input("Régularisation items", min_value=0.001, max_value=1.0, value=0.06, step=0.01, format="%.3f", key="nmf_reg_qi")
+    # --- Hyperparamètres (meilleure configuration de la recherche par défaut) ---
+    best_nmf = load_search_best("nmf")
+    if best_nmf:
+        st.info(f"Valeurs par défaut issues de la recherche d'hyperparamètres (RMSE validation : {best_nmf['rmse']:.4f}).")
+    n_factors_nmf = st.number_input("Nombre de facteurs latents", min_value=10, max_value=500, value=int(best_nmf.get("n_factors", 50)), step=10, key="nmf_n_factors")
+    n_epochs_nmf = st.number_input("Nombre d'epochs", min_value=5, max_value=200, value=int(best_nmf.get("n_epochs", 50)), step=5, key="nmf_n_epochs")
+    reg_pu = st.number_input("Régularisation utilisateurs", min_value=0.001, max_value=1.0, value=float(best_nmf.get("reg_pu", 0.06)), step=0.01, format="%.3f", key="nmf_reg_pu")
+    reg_qi = st.number_input("Régularisation items", min_value=0.001, max_value=1.0, value=float(best_nmf.get("reg_qi", 0.06)), step=0.01, format="%.3f", key="nmf_reg_qi")
 
     st.subheader("Échelle des notes")
     min_rating_nmf = st.number_input("Note minimale", min_value=1.0, max_value=10.0, value=1.0, step=0.5, key="nmf_min_rating")
@@ -99,13 +115,47 @@ with tab_nmf:
 
         nmf = NMF(n_factors=n_factors_nmf, n_epochs=n_epochs_nmf, reg_pu=reg_pu, reg_qi=reg_qi)
 
-        model_path = MODELS_DIR / DIR / "nmf_model.pkl"
-        model_path.parent.mkdir(parents=True, exist_ok=True)
+        model_path = model_dir(MODELS_DIR / DIR, "nmf")
 
         with st.spinner("Entraînement NMF en cours..."):
             nmf.fit(trainset)
 
-        with open(model_path, 'wb') as f:
-            pickle.dump(nmf, f)
+        save_mf_model(nmf, model_path, algo="nmf", n_factors=n_factors_nmf, n_epochs=n_epochs_nmf, reg_pu=reg_pu, reg_qi=reg_qi)
 
         st.success(f"✅ Modèle NMF sauvegardé dans {model_path}")
+
+# =====================================================
+# ====================== ALS ==========================
+# =====================================================
+with tab_als:
+    st.subheader("Paramètres ALS")
+    st.info("ALS multithreadé sur une matrice creuse, sans passer par Surprise.")
+
+    # --- Hyperparamètres ---
+    n_factors_als = st.number_input("Nombre de facteurs latents", min_value=10, max_value=500, value=50, step=10, key="als_n_factors")
+    n_epochs_als = st.number_input("Nombre d'epochs", min_value=1, max_value=100, value=15, step=1, key="als_n_epochs")
+    reg_als = st.number_input("Régularisation", min_value=0.001, max_value=10.0, value=0.1, step=0.01, format="%.3f", key="als_reg")
+    implicit_als = st.checkbox("Mode implicite (utilise aussi les interactions de note 0)", key="als_implicit")
+    alpha_als = st.number_input("Coefficient de confiance (alpha)", min_value=1.0, max_value=200.0, value=40.0, step=1.0, key="als_alpha", disabled=not implicit_als)
+    max_rating_als = st.number_input("Note maximale", min_value=1.0, max_value=10.0, value=5.0, step=0.5, key="als_max_rating")
+
+    # --- Entraînement ---
+    if st.button("🚀 Lancer l'entraînement ALS"):
+        interactions = collaborative_df[['user_id', 'item_id', 'rating']]
+        implicit_path = PROCESSED_DATA_DIR / DIR / "implicit_dataset.parquet"
+        if implicit_als and implicit_path.exists():
+            interactions = pd.concat([interactions, load_parquet(implicit_path)[['user_id', 'item_id', 'rating']]], ignore_index=True)
+
+        matrix, user_ids, item_ids = build_rating_matrix(interactions)
+        als = ALS(n_factors=n_factors_als, n_epochs=n_epochs_als, reg=reg_als, implicit=implicit_als, alpha=alpha_als)
+
+        model_path = model_dir(MODELS_DIR / DIR, "als")
+
+        progress = st.progress(0, text="Entraînement ALS en cours...")
+        als.fit(matrix, user_ids, item_ids,
+                callback=lambda epoch, _: progress.progress((epoch + 1) / n_epochs_als, text=f"Epoch {epoch + 1}/{n_epochs_als}"))
+
+        save_mf_model(als.to_scorer(rating_scale=(1, max_rating_als)), model_path, algo="als",
+                      n_factors=n_factors_als, n_epochs=n_epochs_als, reg=reg_als, implicit=implicit_als, alpha=alpha_als)
+
+        st.success(f"✅ Modèle ALS sauvegardé dans {model_path}")
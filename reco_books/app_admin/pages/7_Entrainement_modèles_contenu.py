@@ -9,7 +9,9 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from pathlib import Path
 from recommandation_de_livres.config import PROCESSED_DATA_DIR, MODELS_DIR
 from recommandation_de_livres.loaders.load_data import load_parquet
-from recommandation_de_livres.iads.content_utils import get_text_vector
+from recommandation_de_livres.iads.w2v_embedding import embed_documents
+from recommandation_de_livres.iads.sbert_encoding import encode_texts
+from recommandation_de_livres.iads.embedding_store import refresh_dependents, save_embeddings
 from recommandation_de_livres.iads.progress_w2v import TqdmCorpus, EpochLogger
 import multiprocessing as mp
 
@@ -67,8 +69,8 @@ with tabs[0]:
             w2v.save(str(model_path))
             progress.progress(70, text="Modèle sauvegardé...")
 
-            book_embeddings = np.vstack([get_text_vector(tokens, w2v) for tokens in corpus])
-            np.save(embeddings_path, book_embeddings)
+            book_embeddings = embed_documents(w2v, content_df['text_clean'])
+            save_embeddings(embeddings_path, book_embeddings, content_df['item_id'].to_numpy(), models_dir=MODELS_DIR / DIR)
             progress.progress(100, text="Embeddings sauvegardés ✅")
 
             st.success("Word2Vec terminé !")
@@ -84,6 +86,9 @@ with tabs[1]:
     st.info("Génère des embeddings Sentence-BERT pour chaque livre à partir du texte nettoyé.")
 
     batch_size = st.number_input("Batch size", min_value=8, max_value=256, value=64, step=8)
+    max_tokens = st.number_input("Tokens maximum par texte", min_value=32, max_value=512, value=256, step=32)
+    n_workers_sbert = st.number_input("Processus d'encodage (CPU)", min_value=1, max_value=mp.cpu_count(),
+                                      value=max(1, mp.cpu_count() // 4))
 
     if st.button("🚀 Lancer SBERT"):
         progress = st.progress(0, text="Initialisation...")
@@ -95,16 +100,18 @@ with tabs[1]:
             sbert = SentenceTransformer('all-MiniLM-L6-v2', device=device)
             progress.progress(30, text=f"Modèle chargé sur {device}")
 
-            embeddings = sbert.encode(content_df['text_clean'], convert_to_numpy=True, batch_size=batch_size, show_progress_bar=True)
-            progress.progress(80, text="Encodage terminé")
-
             model_path = MODELS_DIR / DIR / "sbert_model"
             embeddings_path = PROCESSED_DATA_DIR / DIR / "embeddings_sbert.npy"
             model_path.parent.mkdir(parents=True, exist_ok=True)
-            embeddings_path.parent.mkdir(parents=True, exist_ok=True)
-
             sbert.save(str(model_path))
-            np.save(embeddings_path, embeddings)
+
+            # Encodage par blocs, repris là où il s'est arrêté si la page a été interrompue
+            encode_texts(sbert, content_df['text_clean'].tolist(), embeddings_path, model_path=model_path,
+                         max_tokens=int(max_tokens), batch_size=int(batch_size), n_workers=int(n_workers_sbert),
+                         callback=lambda done, total: progress.progress(30 + int(70 * done / total),
+                                                                        text=f"Encodage : bloc {done}/{total}"))
+            # Store reconstruit ; index ANN et profils calculés sur les anciens embeddings supprimés
+            refresh_dependents(embeddings_path, content_df['item_id'].to_numpy(), models_dir=MODELS_DIR / DIR)
             progress.progress(100, text="Terminé ✅")
 
             st.success("SBERT terminé !")
@@ -1,13 +1,16 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import pickle
 import gensim
-from recommandation_de_livres.iads.app_ui import display_book_card
-from recommandation_de_livres.iads.collabo_utils import recommandation_collaborative_top_k
-from recommandation_de_livres.iads.content_utils import (
-    recommandation_content_top_k, suggest_titles, user_profile_embedding, recommandation_content_user_top_k
-)
+from recommandation_de_livres.iads.app_ui import display_book_card, get_interaction_index, get_popularity_ranker, get_title_matcher, get_user_profiles, load_mf_scorer
+from recommandation_de_livres.iads.ann_index import load_content_knn
+from recommandation_de_livres.iads.catalog_index import CatalogIndex
+from recommandation_de_livres.iads.embedding_store import load_embedding_store, load_embeddings
+from recommandation_de_livres.iads.popularity import recommandation_populaire_top_k
+from recommandation_de_livres.iads.query_encoder import load_query_encoder
+from recommandation_de_livres.iads.collabo_utils import get_index, recommandation_collaborative_top_k
+from recommandation_de_livres.iads.autocomplete import autocomplete_titles, load_title_autocomplete
+from recommandation_de_livres.iads.content_utils import recommandation_content_top_k, recommandation_content_user_top_k
 from recommandation_de_livres.iads.hybrid_utils import recommandation_hybride
 from recommandation_de_livres.loaders.load_data import load_parquet, load_pkl
 from recommandation_de_livres.config import PROCESSED_DATA_DIR, MODELS_DIR
@@ -29,20 +32,18 @@ def load_content():
     return load_parquet(PROCESSED_DATA_DIR / DIR / "content_dataset.parquet")
 
 @st.cache_resource
-def load_tfidf():
-    with open(MODELS_DIR / DIR / "tfidf_model.pkl", "rb") as f:
-        tfidf = pickle.load(f)
-    with open(PROCESSED_DATA_DIR / DIR / "tfidf_matrix.pkl", "rb") as f:
-        tfidf_matrix = pickle.load(f)
-    return tfidf, tfidf_matrix
+def load_autocomplete():
+    # Index d'autocomplétion des titres et auteurs, construit une fois puis sauvegardé
+    return load_title_autocomplete(PROCESSED_DATA_DIR / DIR / "title_autocomplete.npz", load_content(), ratings)
 
-@st.cache_resource
 def load_svd_model():
-    return load_pkl(MODELS_DIR / DIR / "svd_model.pkl")
+    return load_mf_scorer(DIR, "svd")
 
-@st.cache_resource
 def load_nmf_model():
-    return load_pkl(MODELS_DIR / DIR / "nmf_model.pkl")
+    return load_mf_scorer(DIR, "nmf")
+
+def load_als_model():
+    return load_mf_scorer(DIR, "als")
 
 @st.cache_resource
 def load_w2v_model():
@@ -50,28 +51,37 @@ def load_w2v_model():
 
 @st.cache_resource
 def load_sbert_model():
-    from sentence_transformers import SentenceTransformer
-    return SentenceTransformer(str(MODELS_DIR / DIR / "sbert_model"))
+    return load_query_encoder(MODELS_DIR / DIR / "sbert_model")
 
-@st.cache_data
+# Projection mémoire en lecture seule, partagée par toutes les sessions
+@st.cache_resource
 def load_embeddings_w2v():
-    return np.load(PROCESSED_DATA_DIR / DIR / "embeddings_w2v.npy")
+    return load_embeddings(PROCESSED_DATA_DIR / DIR / "embeddings_w2v.npy")
 
-@st.cache_data
+@st.cache_resource
 def load_embeddings_sbert():
-    return np.load(PROCESSED_DATA_DIR / DIR / "embeddings_sbert.npy")
+    return load_embeddings(PROCESSED_DATA_DIR / DIR / "embeddings_sbert.npy")
+
+@st.cache_resource
+def load_store_w2v():
+    return load_embedding_store(PROCESSED_DATA_DIR / DIR / "embeddings_w2v.npy")
+
+@st.cache_resource
+def load_store_sbert():
+    return load_embedding_store(PROCESSED_DATA_DIR / DIR / "embeddings_sbert.npy")
 
 @st.cache_resource
 def load_knn_w2v():
-    import joblib
-    path = MODELS_DIR / DIR / "knn_model_w2v.joblib"
-    return joblib.load(path) if path.exists() else None
+    return load_content_knn(MODELS_DIR / DIR, "w2v", rerank_vectors=load_store_w2v().vectors)
 
 @st.cache_resource
 def load_knn_sbert():
-    import joblib
-    path = MODELS_DIR / DIR / "knn_model_sbert.joblib"
-    return joblib.load(path) if path.exists() else None
+    return load_content_knn(MODELS_DIR / DIR, "sbert", rerank_vectors=load_store_sbert().vectors)
+
+@st.cache_resource
+def load_catalog():
+    # Index titre / item_id du catalogue, construit une fois et partagé par toutes les sessions
+    return CatalogIndex.from_books(load_content())
 
 # -----------------------------
 # Initialisation
@@ -83,7 +93,8 @@ if "ratings" not in st.session_state:
 
 books = st.session_state["books"]
 ratings = st.session_state["ratings"]
-tfidf, tfidf_matrix = load_tfidf()
+autocomplete = load_autocomplete()
+catalog = load_catalog()
 
 # -----------------------------
 # Choix mode : utilisateur ou titre
@@ -102,17 +113,23 @@ if reco_mode == "Utilisateur":
 elif reco_mode == "Titre de départ":
     book_title_input = st.text_input("Titre du livre de départ")
     if book_title_input:
-        suggestions_df = suggest_titles(book_title_input, tfidf, tfidf_matrix, books, k=10)
+        suggestions_df = autocomplete_titles(book_title_input, autocomplete, books, k=10)
+        if suggestions_df.empty:
+            # Aucune suggestion : titre le plus proche de la saisie dans tout le catalogue
+            book_index = get_index(book_title_input, books, matcher=get_title_matcher(DIR))
+            if book_index is not None:
+                suggestions_df = books.loc[[book_index], ['title', 'authors']]
         suggestion_list = suggestions_df['title'] + " - " + suggestions_df['authors']
         selected_title_author = st.selectbox("Titres suggérés :", suggestion_list)
-        selected_title = selected_title_author.split(" - ")[0]
+        if selected_title_author:
+            selected_title = selected_title_author.split(" - ")[0]
 
 # -----------------------------
 # Choix modèle
 # -----------------------------
 model_type = st.selectbox(
     "Choisir le modèle",
-    ["Word2Vec", "Sentence-BERT", "SVD", "NMF", "Hybride"]  # NMF ajouté
+    ["Word2Vec", "Sentence-BERT", "SVD", "NMF", "ALS", "Hybride", "Popularité"]
 )
 top_k = st.slider("Nombre de recommandations", 1, 20, 5)
 alpha = None
@@ -122,7 +139,7 @@ collab_model_type = None
 if model_type == "Hybride":
     alpha = st.slider("Pondération collaborative vs contenu (alpha)", 0.0, 1.0, 0.5, 0.05)
     content_model_type = st.selectbox("Choisir le modèle de contenu", ["Word2Vec", "Sentence-BERT"])
-    collab_model_type = st.selectbox("Choisir le modèle collaboratif", ["SVD", "NMF"])
+    collab_model_type = st.selectbox("Choisir le modèle collaboratif", ["SVD", "NMF", "ALS"])
 
 # -----------------------------
 # Lancer recommandation
@@ -130,31 +147,36 @@ if model_type == "Hybride":
 if st.button("Lancer la recommandation"):
 
     embeddings = None
+    store = None
     content_model = None
     knn = None
     top_books = None
 
     # Chargement modèles collaboratifs
-    svd_model, nmf_model = None, None
+    svd_model, nmf_model, als_model = None, None, None
     if model_type == "SVD" or (model_type=="Hybride" and collab_model_type=="SVD"):
         svd_model = load_svd_model()
     if model_type == "NMF" or (model_type=="Hybride" and collab_model_type=="NMF"):
-        nmf_model = load_pkl(MODELS_DIR / DIR / "nmf_model.pkl")
+        nmf_model = load_nmf_model()
+    if model_type == "ALS" or (model_type=="Hybride" and collab_model_type=="ALS"):
+        als_model = load_als_model()
 
     # Chargement modèles contenu
     if reco_mode == "Utilisateur" and selected_user is not None:
         if model_type in ["Word2Vec", "Sentence-BERT"] or (model_type=="Hybride" and content_model_type in ["Word2Vec", "Sentence-BERT"]):
             m = content_model_type if model_type=="Hybride" else model_type
             embeddings = load_embeddings_w2v() if m=="Word2Vec" else load_embeddings_sbert()
+            store = load_store_w2v() if m=="Word2Vec" else load_store_sbert()
             content_model = load_w2v_model() if m=="Word2Vec" else load_sbert_model()
             knn = load_knn_w2v() if m=="Word2Vec" else load_knn_sbert()
 
         if model_type in ["Word2Vec", "Sentence-BERT"]:
-            item_id_to_idx = {item_id: idx for idx, item_id in enumerate(books['item_id'])}
-            user_vec = user_profile_embedding(selected_user, ratings, embeddings, item_id_to_idx)
+            profiles = get_user_profiles("w2v" if m=="Word2Vec" else "sbert", embeddings, books["item_id"].to_numpy())
+            user_vec = profiles.profile(selected_user)
             if user_vec is not None:
                 top_books, _ = recommandation_content_user_top_k(
-                    selected_user, embeddings, content_model, books, ratings, knn=knn, k=top_k
+                    selected_user, embeddings, books, ratings, knn=knn, k=top_k, profiles=profiles, store=store,
+                    index=get_interaction_index(), catalog=catalog
                 )
             else:
                 st.warning("L'utilisateur n'a pas encore de notes. Veuillez saisir un titre de départ.")
@@ -164,26 +186,31 @@ if st.button("Lancer la recommandation"):
     if reco_mode == "Titre de départ" and selected_title:
         if model_type in ["Word2Vec", "Sentence-BERT"] or (model_type=="Hybride" and content_model_type in ["Word2Vec", "Sentence-BERT"]):
             top_books, _ = recommandation_content_top_k(
-                selected_title, embeddings, content_model, books, knn=knn, k=top_k
+                selected_title, embeddings, content_model, books, knn=knn, k=top_k, store=store, catalog=catalog
             )
 
     # Reco collaborative simple
     elif model_type == "SVD" and selected_user is not None:
         top_books, _ = recommandation_collaborative_top_k(
-            top_k, selected_user, svd_model, ratings, books
+            top_k, selected_user, svd_model, ratings, books, index=get_interaction_index(), catalog=catalog
         )
     elif model_type == "NMF" and selected_user is not None:
         top_books, _ = recommandation_collaborative_top_k(
-            top_k, selected_user, nmf_model, ratings, books
+            top_k, selected_user, nmf_model, ratings, books, index=get_interaction_index(), catalog=catalog
+        )
+    elif model_type == "ALS" and selected_user is not None:
+        top_books, _ = recommandation_collaborative_top_k(
+            top_k, selected_user, als_model, ratings, books, index=get_interaction_index(), catalog=catalog
         )
 
     # Reco Hybride
     elif model_type == "Hybride" and selected_user is not None:
         embeddings = load_embeddings_w2v() if content_model_type=="Word2Vec" else load_embeddings_sbert()
+        store = load_store_w2v() if content_model_type=="Word2Vec" else load_store_sbert()
         content_model = load_w2v_model() if content_model_type=="Word2Vec" else load_sbert_model()
         knn = load_knn_w2v() if content_model_type=="Word2Vec" else load_knn_sbert()
         
-        collab_model = svd_model if collab_model_type=="SVD" else nmf_model
+        collab_model = {"SVD": svd_model, "NMF": nmf_model, "ALS": als_model}[collab_model_type]
         
         top_books = recommandation_hybride(
             user_id=selected_user,
@@ -196,9 +223,20 @@ if st.button("Lancer la recommandation"):
             alpha=alpha,
             knn=knn,
             k=top_k,
-            top_k_content=50
+            top_k_content=50,
+            index=get_interaction_index(),
+            store=store,
+            catalog=catalog,
+            books_catalog=catalog
         )
 
+    # Reco par popularité, aussi utilisée en repli des autres modèles
+    if model_type == "Popularité" or ((top_books is None or top_books.empty) and selected_user is not None):
+        if model_type != "Popularité":
+            st.info("Aucune recommandation personnalisée : repli sur les livres les plus populaires.")
+        exclude = get_interaction_index().rated_item_ids(selected_user) if selected_user is not None else None
+        top_books = recommandation_populaire_top_k(top_k, get_popularity_ranker(), books, exclude=exclude)
+
     # -----------------------------
     # Merge et affichage
     # -----------------------------
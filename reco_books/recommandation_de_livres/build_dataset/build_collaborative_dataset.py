@@ -1,7 +1,7 @@
 from recommandation_de_livres.preprocessing.preprocess_collaborative import preprocess_collaborative, add_book_metadata
 from recommandation_de_livres.preprocessing.preprocess_content import map_author_names
 
-def build_collaborative_dataset(books, ratings, authors=None, min_ratings=0, min_users_interaction=0):
+def build_collaborative_dataset(books, ratings, authors=None, min_ratings=0, min_users_interaction=0, return_implicit=False):
     """ Fonction permettant de créer le dataset collaboratif. Un index est aussi créé en se basant sur les user_id.
         Args:
             books (pd.DataFrame) : DataFrame des livres
@@ -9,11 +9,13 @@ def build_collaborative_dataset(books, ratings, authors=None, min_ratings=0, min
             authors (pd.DataFrame) : DataFrame des auteurs avec leur id et leur nom
             min_ratings (int) : nombre de notes minimal que le livre a reçu
             min_users_interaction (int) : nombre de notes minimal que l'utilisateur a donné
+            return_implicit (bool) : si True, retourne aussi les interactions implicites (note 0)
         Returns:
             collaborative_dataset (pd.DataFrame) : DataFrame du dataset collaboratif complet
+            implicit_dataset (pd.DataFrame) : DataFrame des interactions implicites, si return_implicit
     """
 
-    ratings_explicit, _ = preprocess_collaborative(ratings, min_ratings=min_ratings, min_users_interaction=min_users_interaction)
+    ratings_explicit, ratings_implicit = preprocess_collaborative(ratings, min_ratings=min_ratings, min_users_interaction=min_users_interaction)
 
     collaborative_dataset = add_book_metadata(ratings_explicit, books)
 
@@ -23,4 +25,8 @@ def build_collaborative_dataset(books, ratings, authors=None, min_ratings=0, min
     cats = collaborative_dataset['user_id'].astype("category") # Création de l'index unique
     collaborative_dataset['user_index'] = cats.cat.codes + 1  
 
+    if return_implicit:
+        implicit_dataset = ratings_implicit[['user_id', 'item_id', 'rating']].drop_duplicates(subset=['user_id', 'item_id'])
+        return collaborative_dataset, implicit_dataset
+
     return collaborative_dataset
\ No newline at end of file
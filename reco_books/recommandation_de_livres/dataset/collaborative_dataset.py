@@ -6,6 +6,8 @@ import typer
 from recommandation_de_livres.loaders import load_data
 from recommandation_de_livres.build_dataset import build_collaborative_dataset
 from recommandation_de_livres.iads.create_users import create_users_file
+from recommandation_de_livres.iads.interaction_index import InteractionIndex
+from recommandation_de_livres.iads.popularity import PopularityRanker, build_popularity_table
 from recommandation_de_livres.iads.utils import save_df_to_csv, save_df_to_parquet
 from recommandation_de_livres.config import RAW_DATA_DIR, PROCESSED_DATA_DIR, INTERIM_DATA_DIR
 
@@ -30,7 +32,10 @@ def main(
     ratings_path: Path = INTERIM_DATA_DIR / DIR / "ratings_uniform.parquet",
     output_path: Path = PROCESSED_DATA_DIR / DIR / "collaborative_dataset.csv",
     output_path_parquet: Path = PROCESSED_DATA_DIR / DIR / "collaborative_dataset.parquet",
-    output_users: Path =PROCESSED_DATA_DIR / DIR / "users.csv"
+    output_users: Path =PROCESSED_DATA_DIR / DIR / "users.csv",
+    output_index: Path = PROCESSED_DATA_DIR / DIR / "interaction_index.npz",
+    output_implicit: Path = PROCESSED_DATA_DIR / DIR / "implicit_dataset.parquet",
+    output_popularity: Path = PROCESSED_DATA_DIR / DIR / "popularity.parquet"
 ):
     
     logger.info("Loading raw datasets...")
@@ -41,14 +46,23 @@ def main(
     logger.info("Building a collaborative filtering dataset...")
 
     if content_df is not None:
-        ratings_df = build_collaborative_dataset.build_collaborative_dataset(content_df, ratings, authors=None, min_ratings=0, min_users_interaction=100)
+        ratings_df, implicit_df = build_collaborative_dataset.build_collaborative_dataset(content_df, ratings, authors=None, min_ratings=0, min_users_interaction=100, return_implicit=True)
     else:
-        ratings_df = build_collaborative_dataset.build_collaborative_dataset(books, ratings, authors=authors, min_ratings=0, min_users_interaction=100)
+        ratings_df, implicit_df = build_collaborative_dataset.build_collaborative_dataset(books, ratings, authors=authors, min_ratings=0, min_users_interaction=100, return_implicit=True)
     
     logger.info(f"Saving processed dataset to {output_path} and {output_path_parquet}")
     save_df_to_csv(ratings_df, output_path)
     save_df_to_parquet(ratings_df, output_path_parquet)
     create_users_file(output_path, output_users)
+
+    logger.info(f"Saving {len(implicit_df)} implicit interactions to {output_implicit}")
+    save_df_to_parquet(implicit_df, output_implicit)
+
+    logger.info(f"Building the interaction index to {output_index}")
+    InteractionIndex.from_ratings(ratings_df).save(output_index)
+
+    logger.info(f"Building the popularity table to {output_popularity}")
+    PopularityRanker(build_popularity_table(ratings_df, content_df if content_df is not None else books)).save(output_popularity)
     logger.success("Processing dataset complete.")
 
 if __name__ == "__main__":
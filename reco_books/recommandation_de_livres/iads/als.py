@@ -0,0 +1,199 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from recommandation_de_livres.iads.mf_scoring import MFScorer
+
+# threadpoolctl évite que chaque thread lance lui-même un BLAS multithreadé
+try:
+    from threadpoolctl import threadpool_limits
+except ModuleNotFoundError:
+    threadpool_limits = None
+
+PAD_BUDGET = 65536  # nombre maximal de notes (zéros compris) par lot de lignes
+
+
+def build_rating_matrix(ratings, implicit_weight=1.0):
+    """
+    Construit la matrice creuse utilisateurs x livres au format CSR.
+
+    Les interactions implicites (note 0) sont conservées avec le poids `implicit_weight`
+    pour pouvoir être utilisées par l'ALS implicite.
+
+    Args:
+        ratings (pd.DataFrame) : DataFrame contenant au moins ['user_id', 'item_id', 'rating']
+        implicit_weight (float, optional) : Valeur donnée aux interactions de note 0. Defaults to 1.0.
+
+    Returns:
+        tuple:
+            - matrix (sp.csr_matrix) : Matrice (n_users x n_items)
+            - user_ids (np.array) : Identifiants des utilisateurs (lignes)
+            - item_ids (np.array) : Identifiants des livres (colonnes)
+    """
+    ratings = ratings.drop_duplicates(subset=["user_id", "item_id"], keep="last")
+    user_codes, user_ids = pd.factorize(ratings["user_id"], sort=True)
+    item_codes, item_ids = pd.factorize(ratings["item_id"], sort=True)
+    values = ratings["rating"].to_numpy(dtype=np.float32)
+    values = np.where(values == 0, implicit_weight, values).astype(np.float32)
+
+    matrix = sp.csr_matrix((values, (user_codes, item_codes)), shape=(len(user_ids), len(item_ids)))
+    return matrix, np.asarray(user_ids), np.asarray(item_ids)
+
+
+class ALS:
+    """
+    Factorisation matricielle par moindres carrés alternés (ALS) sur une matrice creuse.
+
+    À chaque epoch, les facteurs utilisateurs sont résolus à facteurs livres fixés, puis l'inverse.
+    Les blocs de lignes sont résolus en parallèle par un pool de threads (les produits matriciels et
+    `np.linalg.solve` relâchent le GIL).
+
+    - Mode explicite : ALS-WR sur les notes centrées, régularisation `reg * n_notes`.
+    - Mode implicite (Hu, Koren & Volinsky) : préférence 1 pour chaque interaction,
+      confiance `1 + alpha * valeur`.
+    """
+
+    def __init__(self, n_factors=50, n_epochs=15, reg=0.1, implicit=False, alpha=40.0,
+                 n_threads=None, block_size=2048, random_state=None):
+        """
+        Args:
+            n_factors (int) : Nombre de facteurs latents
+            n_epochs (int) : Nombre d'alternances utilisateurs/livres
+            reg (float) : Régularisation
+            implicit (bool) : True pour l'ALS implicite avec poids de confiance
+            alpha (float) : Coefficient de confiance du mode implicite
+            n_threads (int, optional) : Nombre de threads (défaut : nombre de CPU)
+            block_size (int) : Nombre de lignes résolues par tâche
+            random_state (int, optional) : Graine d'initialisation des facteurs
+        """
+        self.n_factors = n_factors
+        self.n_epochs = n_epochs
+        self.reg = reg
+        self.implicit = implicit
+        self.alpha = alpha
+        self.n_threads = n_threads or os.cpu_count()
+        self.block_size = block_size
+        self.random_state = random_state
+
+    def _solve_block(self, matrix, fixed, gram, start, stop, out):
+        """
+        Résout les lignes [start, stop) de `out` à facteurs `fixed` constants.
+
+        Les équations normales sont construites par lots de lignes de longueurs voisines : les facteurs
+        des livres notés sont complétés par des zéros jusqu'à la plus longue ligne du lot, puis un produit
+        matriciel par lot (BLAS, sans le GIL) remplace une boucle Python par ligne.
+        """
+        d = self.n_factors
+        lengths = np.diff(matrix.indptr[start:stop + 1])
+        lhs = np.empty((stop - start, d, d), dtype=np.float64)
+        rhs = np.empty((stop - start, d), dtype=np.float64)
+
+        # Lignes triées par longueur puis regroupées tant que le lot complété reste sous PAD_BUDGET notes
+        order = np.argsort(lengths, kind="stable")
+        sorted_lengths = np.maximum(lengths[order], 1)
+        a = 0
+        while a < len(order):
+            padded = np.arange(1, len(order) - a + 1) * sorted_lengths[a:]
+            b = a + max(int(np.searchsorted(padded, PAD_BUDGET, side="right")), 1)
+            rows = order[a:b]
+            lhs[rows], rhs[rows] = self._normal_equations(matrix, fixed, gram, start + rows, lengths[rows])
+            a = b
+
+        out[start:stop] = np.linalg.solve(lhs, rhs[..., None])[..., 0]
+
+    def _normal_equations(self, matrix, fixed, gram, rows, lengths):
+        """Équations normales (lhs, rhs) d'un lot de lignes, facteurs complétés par des zéros."""
+        d = self.n_factors
+        width = int(lengths.max(initial=0))
+        # Position de chaque note dans la matrice creuse et dans le lot complété (ligne, rang)
+        batch_rows = np.repeat(np.arange(len(rows)), lengths)
+        ranks = np.arange(len(batch_rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        entries = np.repeat(matrix.indptr[rows], lengths) + ranks
+
+        factors = np.zeros((len(rows), width, d), dtype=np.float64)
+        factors[batch_rows, ranks] = fixed[matrix.indices[entries]]
+        values = np.zeros((len(rows), width), dtype=np.float64)
+        values[batch_rows, ranks] = matrix.data[entries]
+        factors_t = factors.transpose(0, 2, 1)
+
+        eye = np.eye(d)
+        if self.implicit:
+            confidence = self.alpha * values
+            lhs = gram + (factors_t * confidence[:, None, :]) @ factors + self.reg * eye
+            rhs = (factors_t @ (1 + confidence)[..., None])[..., 0]
+        else:
+            lhs = factors_t @ factors + self.reg * np.maximum(lengths, 1)[:, None, None] * eye
+            rhs = (factors_t @ values[..., None])[..., 0]
+        return lhs, rhs
+
+    def _sweep(self, matrix, fixed, out, pool):
+        """Met à jour toutes les lignes de `out` en parallèle."""
+        gram = fixed.T @ fixed if self.implicit else None
+        blocks = range(0, matrix.shape[0], self.block_size)
+        futures = [pool.submit(self._solve_block, matrix, fixed, gram, start,
+                               min(start + self.block_size, matrix.shape[0]), out)
+                   for start in blocks]
+        for future in futures:
+            future.result()
+
+    def fit(self, matrix, user_ids=None, item_ids=None, callback=None):
+        """
+        Entraîne le modèle sur une matrice CSR utilisateurs x livres.
+
+        Args:
+            matrix (sp.csr_matrix) : Matrice des notes (ou des poids des interactions en mode implicite)
+            user_ids (np.array, optional) : Identifiants des lignes
+            item_ids (np.array, optional) : Identifiants des colonnes
+            callback (callable, optional) : Fonction appelée avec (epoch, modèle) après chaque epoch
+
+        Returns:
+            ALS : Le modèle entraîné
+        """
+        matrix = sp.csr_matrix(matrix, dtype=np.float64, copy=True)
+        self.user_ids = user_ids if user_ids is not None else np.arange(matrix.shape[0])
+        self.item_ids = item_ids if item_ids is not None else np.arange(matrix.shape[1])
+
+        self.global_mean = 0.0 if self.implicit else float(matrix.data.mean())
+        if not self.implicit:
+            matrix.data -= self.global_mean
+        matrix_t = matrix.T.tocsr()
+
+        rng = np.random.default_rng(self.random_state)
+        self.pu = rng.normal(0, 0.01, (matrix.shape[0], self.n_factors))
+        self.qi = rng.normal(0, 0.01, (matrix.shape[1], self.n_factors))
+
+        limits = threadpool_limits(1) if threadpool_limits is not None else nullcontext()
+        with limits, ThreadPoolExecutor(max_workers=self.n_threads) as pool:
+            for epoch in range(self.n_epochs):
+                self._sweep(matrix, self.qi, self.pu, pool)
+                self._sweep(matrix_t, self.pu, self.qi, pool)
+                if callback is not None:
+                    callback(epoch, self)
+        return self
+
+    def to_scorer(self, rating_scale=None):
+        """
+        Exporte les facteurs vers un `MFScorer`, utilisable par le même top-K que SVD.
+
+        Args:
+            rating_scale (tuple, optional) : Échelle des notes du mode explicite. Defaults to None.
+
+        Returns:
+            MFScorer : Scorer vectorisé
+        """
+        # En explicite, des biais nuls font ajouter la moyenne globale au produit scalaire
+        explicit = not self.implicit
+        return MFScorer(
+            pu=self.pu.astype(np.float32),
+            qi=self.qi.astype(np.float32),
+            bu=np.zeros(len(self.pu), dtype=np.float32) if explicit else None,
+            bi=np.zeros(len(self.qi), dtype=np.float32) if explicit else None,
+            global_mean=self.global_mean,
+            user_ids=self.user_ids,
+            item_ids=self.item_ids,
+            rating_scale=None if self.implicit else rating_scale,
+        )
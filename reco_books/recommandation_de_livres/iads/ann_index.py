@@ -0,0 +1,319 @@
+import json
+
+import numpy as np
+
+from recommandation_de_livres.iads.array_utils import normalize_rows
+from recommandation_de_livres.iads.pq import PQIndex
+from recommandation_de_livres.iads.topk_utils import top_k_indices
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def ann_index_dir(models_dir, name):
+    """Retourne le dossier de l'index ANN des embeddings `name` (sbert ou w2v)."""
+    return models_dir / f"ann_{name}"
+
+
+def _as_queries(X):
+    """Convertit une ou plusieurs requêtes en matrice float32 normalisée (n_requetes, dimension)."""
+    return normalize_rows(np.atleast_2d(np.asarray(X, dtype=np.float32)))
+
+
+def _spherical_kmeans(vectors, n_clusters, n_iter=10, seed=42):
+    """
+    K-means sphérique (similarité cosinus) sur des vecteurs normalisés.
+
+    Returns:
+        np.array : Centroïdes normalisés de forme (n_clusters, dimension)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        empty = np.flatnonzero(np.bincount(assign, minlength=n_clusters) == 0)
+        # Les listes vides sont réinitialisées sur des points tirés au hasard
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Index ANN par listes inversées (IVF) pour la similarité cosinus.
+
+    Les embeddings sont répartis en `n_lists` listes par k-means sphérique et rangés de façon contiguë
+    liste par liste. Une requête ne compare que les vecteurs des `nprobe` listes dont le centroïde est
+    le plus proche : `nprobe` règle le compromis vitesse / rappel (nprobe = n_lists donne le résultat exact).
+
+    L'interface `kneighbors` est celle de `sklearn.neighbors.NearestNeighbors(metric="cosine")` :
+    les distances renvoyées valent 1 - similarité cosinus.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, centroids, vectors, ids, offsets, nprobe=8):
+        """
+        Args:
+            centroids (np.array) : Centroïdes normalisés (n_lists, dimension)
+            vectors (np.array) : Embeddings normalisés rangés liste par liste
+            ids (np.array) : Ligne d'origine (dans la matrice d'embeddings) de chaque vecteur de `vectors`
+            offsets (np.array) : Début de chaque liste dans `vectors` (taille n_lists + 1)
+            nprobe (int, optional) : Nombre de listes parcourues par requête. Defaults to 8.
+        """
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = np.asarray(offsets)
+        self.nprobe = int(nprobe)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, nprobe=8, n_iter=10, sample_size=100_000, seed=42):
+        """
+        Construit l'index IVF des embeddings.
+
+        Args:
+            embeddings (np.array) : Embeddings des livres (n_livres, dimension)
+            n_lists (int, optional) : Nombre de listes (défaut : 4 * sqrt(n_livres)). Defaults to None.
+            nprobe (int, optional) : Nombre de listes parcourues par requête. Defaults to 8.
+            n_iter (int, optional) : Nombre d'itérations du k-means. Defaults to 10.
+            sample_size (int, optional) : Nombre de vecteurs utilisés pour apprendre les centroïdes. Defaults to 100_000.
+            seed (int, optional) : Graine du k-means. Defaults to 42.
+
+        Returns:
+            IVFIndex : Index construit
+        """
+        vectors = normalize_rows(embeddings)
+        n = len(vectors)
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(n))
+        n_lists = max(1, min(int(n_lists), n))
+
+        rng = np.random.default_rng(seed)
+        sample = vectors if n <= sample_size else vectors[rng.choice(n, sample_size, replace=False)]
+        centroids = _spherical_kmeans(sample, min(n_lists, len(sample)), n_iter=n_iter, seed=seed)
+
+        # Affectation de tous les vecteurs par blocs pour borner la mémoire
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, 65536):
+            assign[start:start + 65536] = np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=len(centroids)), out=offsets[1:])
+        return cls(centroids, np.ascontiguousarray(vectors[order]), order.astype(np.int64), offsets, nprobe)
+
+    def _probe(self, query, nprobe):
+        """
+        Calcule les similarités de la requête avec les vecteurs des `nprobe` listes les plus proches.
+
+        Chaque liste est une tranche contiguë de `vectors` : la lecture reste séquentielle en mmap.
+
+        Returns:
+            tuple: (positions dans `vectors`, similarités)
+        """
+        lists, _ = top_k_indices(self.centroids @ query, nprobe)
+        ranges = [(self.offsets[list_id], self.offsets[list_id + 1]) for list_id in lists]
+        positions = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+        sims = np.concatenate([self.vectors[start:stop] @ query for start, stop in ranges])
+        return positions, sims
+
+    def kneighbors(self, X, n_neighbors=10, nprobe=None):
+        """
+        Recherche les plus proches voisins (cosinus) d'une ou plusieurs requêtes.
+
+        Args:
+            X (np.array) : Requête(s) de forme (dimension,) ou (n_requetes, dimension)
+            n_neighbors (int, optional) : Nombre de voisins par requête. Defaults to 10.
+            nprobe (int, optional) : Nombre de listes parcourues (défaut : `self.nprobe`). Defaults to None.
+
+        Returns:
+            tuple:
+                - distances (np.array) : 1 - similarité cosinus, de forme (n_requetes, n_voisins)
+                - indices (np.array) : Lignes des voisins dans la matrice d'embeddings
+        """
+        queries = _as_queries(X)
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        n_neighbors = min(int(n_neighbors), len(self))
+
+        distances = np.full((len(queries), n_neighbors), np.inf, dtype=np.float32)
+        indices = np.full((len(queries), n_neighbors), -1, dtype=np.int64)
+        for q, query in enumerate(queries):
+            positions, sims = self._probe(query, nprobe)
+            top, top_sims = top_k_indices(sims, n_neighbors)
+            distances[q, :len(top)] = 1 - top_sims
+            indices[q, :len(top)] = self.ids[positions[top]]
+        return distances, indices
+
+    def save(self, path):
+        """Sauvegarde l'index dans un dossier de fichiers `.npy` avec un manifeste JSON."""
+        path.mkdir(parents=True, exist_ok=True)
+        for key in ("centroids", "vectors", "ids", "offsets"):
+            np.save(path / f"{key}.npy", np.asarray(getattr(self, key)), allow_pickle=False)
+        _write_manifest(path, self.kind, n_items=len(self), n_lists=self.n_lists, nprobe=self.nprobe)
+
+    @classmethod
+    def load(cls, path, manifest, mmap_mode="r"):
+        """Charge un index sauvegardé avec `save` (vecteurs projetés en mémoire)."""
+        arrays = {key: np.load(path / f"{key}.npy", mmap_mode=mmap_mode)
+                  for key in ("centroids", "vectors", "ids", "offsets")}
+        return cls(nprobe=manifest["nprobe"], **arrays)
+
+
+class HNSWIndex:
+    """
+    Index ANN par graphe HNSW (bibliothèque optionnelle `hnswlib`), même interface que `IVFIndex`.
+
+    `ef` (taille de la liste de candidats à la recherche) règle le compromis vitesse / rappel.
+    """
+
+    kind = "hnsw"
+
+    def __init__(self, index, ef=64):
+        """
+        Args:
+            index (hnswlib.Index) : Graphe HNSW construit sur les embeddings
+            ef (int, optional) : Taille de la liste de candidats à la recherche. Defaults to 64.
+        """
+        self.index = index
+        self.ef = int(ef)
+        self.index.set_ef(self.ef)
+
+    def __len__(self):
+        return self.index.get_current_count()
+
+    @classmethod
+    def build(cls, embeddings, M=16, ef_construction=200, ef=64, seed=42):
+        """
+        Construit le graphe HNSW des embeddings.
+
+        Args:
+            embeddings (np.array) : Embeddings des livres (n_livres, dimension)
+            M (int, optional) : Nombre de liens par nœud. Defaults to 16.
+            ef_construction (int, optional) : Taille de la liste de candidats à la construction. Defaults to 200.
+            ef (int, optional) : Taille de la liste de candidats à la recherche. Defaults to 64.
+            seed (int, optional) : Graine de la construction. Defaults to 42.
+
+        Returns:
+            HNSWIndex : Index construit
+        """
+        import hnswlib
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        index = hnswlib.Index(space="cosine", dim=embeddings.shape[1])
+        index.init_index(max_elements=len(embeddings), ef_construction=ef_construction, M=M, random_seed=seed)
+        index.add_items(embeddings, np.arange(len(embeddings)))
+        return cls(index, ef=ef)
+
+    def kneighbors(self, X, n_neighbors=10, ef=None):
+        """
+        Recherche les plus proches voisins (cosinus) d'une ou plusieurs requêtes.
+
+        Args:
+            X (np.array) : Requête(s) de forme (dimension,) ou (n_requetes, dimension)
+            n_neighbors (int, optional) : Nombre de voisins par requête. Defaults to 10.
+            ef (int, optional) : Taille de la liste de candidats (au moins n_neighbors). Defaults to None.
+
+        Returns:
+            tuple: (distances, indices), cf. `IVFIndex.kneighbors`
+        """
+        n_neighbors = min(int(n_neighbors), len(self))
+        self.index.set_ef(max(ef or self.ef, n_neighbors))
+        labels, distances = self.index.knn_query(_as_queries(X), k=n_neighbors)
+        return distances.astype(np.float32), labels.astype(np.int64)
+
+    def save(self, path):
+        """Sauvegarde le graphe et le manifeste JSON dans un dossier."""
+        path.mkdir(parents=True, exist_ok=True)
+        self.index.save_index(str(path / "hnsw.bin"))
+        _write_manifest(path, self.kind, n_items=len(self), dim=self.index.dim, ef=self.ef)
+
+    @classmethod
+    def load(cls, path, manifest, mmap_mode=None):
+        """Charge un graphe sauvegardé avec `save`."""
+        import hnswlib
+
+        index = hnswlib.Index(space="cosine", dim=manifest["dim"])
+        index.load_index(str(path / "hnsw.bin"), max_elements=manifest["n_items"])
+        return cls(index, ef=manifest["ef"])
+
+
+ANN_INDEXES = {"ivf": IVFIndex, "hnsw": HNSWIndex, "pq": PQIndex}
+
+
+def _write_manifest(path, kind, **infos):
+    """Écrit le manifeste JSON d'un index ANN."""
+    with open(path / MANIFEST, "w", encoding="utf-8") as f:
+        json.dump({"format_version": FORMAT_VERSION, "kind": kind, **infos}, f, indent=2)
+
+
+def build_ann_index(embeddings, kind="ivf", **params):
+    """
+    Construit un index ANN des embeddings.
+
+    Args:
+        embeddings (np.array) : Embeddings des livres
+        kind (str, optional) : "ivf", "hnsw" (nécessite hnswlib) ou "pq" (embeddings compressés). Defaults to "ivf".
+        **params : Paramètres de `IVFIndex.build`, `HNSWIndex.build` ou `PQIndex.build`
+
+    Returns:
+        IVFIndex ou HNSWIndex : Index construit
+    """
+    if kind not in ANN_INDEXES:
+        raise ValueError(f"Index ANN inconnu : {kind} (ivf, hnsw ou pq attendu).")
+    return ANN_INDEXES[kind].build(embeddings, **params)
+
+
+def load_ann_index(path, mmap_mode="r"):
+    """
+    Charge un index ANN sauvegardé, quel que soit son type.
+
+    Args:
+        path (Path) : Dossier de l'index
+        mmap_mode (str, optional) : Mode de projection mémoire des vecteurs (IVF). Defaults to "r".
+
+    Returns:
+        IVFIndex, HNSWIndex ou None : Index chargé, None si le dossier n'existe pas
+    """
+    if not (path / MANIFEST).exists():
+        return None
+    with open(path / MANIFEST, encoding="utf-8") as f:
+        manifest = json.load(f)
+    return ANN_INDEXES[manifest["kind"]].load(path, manifest, mmap_mode=mmap_mode)
+
+
+def load_content_knn(models_dir, name, rerank_vectors=None):
+    """
+    Charge l'index des plus proches voisins des embeddings `name` (sbert ou w2v).
+
+    L'index ANN (dossier ann_<name>) est utilisé s'il existe ; sinon l'ancien modèle
+    `NearestNeighbors` sauvegardé avec joblib (knn_model_<name>.joblib).
+
+    Args:
+        models_dir (Path) : Dossier des modèles du dataset
+        name (str) : sbert ou w2v
+        rerank_vectors (np.array, optional) : Embeddings normalisés (ex. `EmbeddingStore.vectors` en mmap)
+                                              pour le reclassement exact d'un index PQ. Defaults to None.
+
+    Returns:
+        Objet exposant `kneighbors`, ou None si aucun index n'a été construit
+    """
+    index = load_ann_index(ann_index_dir(models_dir, name))
+    if index is not None:
+        if index.kind == "pq":
+            index.rerank_vectors = rerank_vectors
+        return index
+    legacy_path = models_dir / f"knn_model_{name}.joblib"
+    if legacy_path.exists():
+        import joblib
+        return joblib.load(legacy_path)
+    return None
@@ -1,10 +1,22 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from recommandation_de_livres.iads.utils import save_df_to_parquet
-from recommandation_de_livres.config import RAW_DATA_DIR, INTERIM_DATA_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.loaders.load_data import load_parquet
+from recommandation_de_livres.iads.interaction_index import load_interaction_index
+from recommandation_de_livres.iads.fuzzy_match import FuzzyTitleMatcher
+from recommandation_de_livres.iads.fold_in import fold_in_path, fold_in_user, load_fold_in, save_fold_in
+from recommandation_de_livres.iads.model_store import load_scorer, model_dir, model_exists
+from recommandation_de_livres.iads.popularity import PopularityRanker, build_popularity_table
+from recommandation_de_livres.iads.user_profiles import UserProfiles
+from recommandation_de_livres.config import RAW_DATA_DIR, INTERIM_DATA_DIR, PROCESSED_DATA_DIR, MODELS_DIR
 from pathlib import Path
+import threading
 import streamlit as st
 
+# Le scorer de `load_mf_scorer` est partagé par toutes les sessions : une seule mise à jour par fold-in à la fois
+FOLD_IN_LOCK = threading.Lock()
+
 def stars(rating: float, max_stars: int = 5) -> str:
     """Retourne une chaîne d'étoiles ⭐ pour une note donnée."""
     full_stars = int(rating)
@@ -106,14 +118,101 @@ def validate_pending_ratings():
             how="left"
         )
 
+        n_interactions = len(st.session_state["ratings"])
+        index = get_interaction_index()
         st.session_state["ratings"] = pd.concat([st.session_state["ratings"], books_user_full], ignore_index=True)
         RATINGS_PATH = PROCESSED_DATA_DIR / st.session_state['DIR'] / "collaborative_dataset.parquet"
         save_df_to_parquet(st.session_state["ratings"], RATINGS_PATH)
 
+        # L'index des interactions doit refléter les nouvelles notes : elles sont ajoutées à sa structure CSR
+        index = index.append(books_user_full)
+        index.save(PROCESSED_DATA_DIR / st.session_state['DIR'] / "interaction_index.npz")
+        st.session_state["interaction_index"] = index
+        update_user_profiles(new_entries, n_interactions)
+
+        # Le vecteur latent de l'utilisateur est recalculé sans réentraîner le SVD
+        # (NMF et ALS ne sont pas mis à jour : l'utilisateur y reste inconnu jusqu'au réentraînement)
+        model_path = model_dir(MODELS_DIR / st.session_state['DIR'], "svd")
+        if model_exists(model_path):
+            scorer = load_mf_scorer(st.session_state['DIR'], "svd")
+            user_id = new_entries["user_id"].iloc[0]
+            item_ids, ratings = index.user_ratings(user_id)
+            with FOLD_IN_LOCK:
+                if fold_in_user(scorer, user_id, item_ids, ratings) is not None:
+                    save_fold_in(scorer, fold_in_path(model_path))
+
         st.success(f"{len(st.session_state['pending_ratings'])} livre(s) ajouté(s) à votre collection 🎉")
         st.session_state["pending_ratings"] = []  # On vide le panier
         st.rerun()
 
+@st.cache_resource
+def load_mf_scorer(DIR, name):
+    """ Charge le modèle de factorisation `name` (svd, nmf ou als) sous forme de `MFScorer`,
+        avec les facteurs des utilisateurs ajoutés depuis son entraînement.
+        Les facteurs sont projetés en mémoire (mmap) et partagés entre les sessions.
+    """
+    model_path = model_dir(MODELS_DIR / DIR, name)
+    return load_fold_in(load_scorer(model_path), fold_in_path(model_path))
+
+@st.cache_resource
+def get_title_matcher(DIR):
+    """ Retourne le matcher des titres approchés du catalogue du dataset `DIR`, construit une fois et partagé par toutes les sessions.
+    """
+    return FuzzyTitleMatcher.from_books(load_parquet(PROCESSED_DATA_DIR / DIR / "content_dataset.parquet"))
+
+def get_popularity_ranker():
+    """ Retourne la table de popularité des livres, chargée depuis le disque ou construite depuis les notes en session.
+    """
+    if "popularity_ranker" not in st.session_state:
+        path = PROCESSED_DATA_DIR / st.session_state['DIR'] / "popularity.parquet"
+        if path.exists():
+            ranker = PopularityRanker.load(path)
+        else:
+            ranker = PopularityRanker(build_popularity_table(st.session_state["ratings"], st.session_state["books"]))
+        st.session_state["popularity_ranker"] = ranker
+    return st.session_state["popularity_ranker"]
+
+def get_interaction_index():
+    """ Retourne l'index des interactions des notes en session.
+        Il est chargé depuis le disque si son empreinte correspond aux notes en session, reconstruit sinon.
+    """
+    if "interaction_index" not in st.session_state:
+        index_path = PROCESSED_DATA_DIR / st.session_state['DIR'] / "interaction_index.npz"
+        st.session_state["interaction_index"] = load_interaction_index(index_path, st.session_state["ratings"])
+    return st.session_state["interaction_index"]
+
+def get_user_profiles(name, embeddings, content_item_ids):
+    """ Retourne les profils de contenu de tous les utilisateurs pour les embeddings `name` (sbert ou w2v).
+        Ils sont chargés depuis profiles_<name>.npy s'ils correspondent à l'index des interactions,
+        recalculés (un seul produit matriciel) et sauvegardés sinon.
+    """
+    cache = st.session_state.setdefault("user_profiles", {})
+    if name not in cache:
+        index = get_interaction_index()
+        path = PROCESSED_DATA_DIR / st.session_state['DIR'] / f"profiles_{name}.npy"
+        profiles = UserProfiles.load(path)
+        if profiles is None or profiles.is_stale(index, len(embeddings)):
+            profiles = UserProfiles.from_index(index, embeddings, content_item_ids)
+            profiles.save(path)
+        cache[name] = profiles
+    return cache[name]
+
+def update_user_profiles(new_entries, n_interactions):
+    """ Ajoute les nouvelles notes aux profils de contenu sauvegardés (sbert, w2v), en O(d) par note.
+        Les profils qui n'étaient pas à jour avant ces notes (`n_interactions`) seront recalculés au prochain chargement.
+    """
+    cache = st.session_state.setdefault("user_profiles", {})
+    for name in ("sbert", "w2v"):
+        path = PROCESSED_DATA_DIR / st.session_state['DIR'] / f"profiles_{name}.npy"
+        profiles = cache.get(name) or UserProfiles.load(path)
+        if profiles is None or profiles.n_interactions != n_interactions:
+            cache.pop(name, None)
+            continue
+        embeddings = np.load(PROCESSED_DATA_DIR / st.session_state['DIR'] / f"embeddings_{name}.npy", mmap_mode="r")
+        for user_id, entries in new_entries.groupby("user_id"):
+            profiles.add_ratings(user_id, entries["item_id"].to_numpy(), entries["rating"].to_numpy(), embeddings)
+        cache[name] = profiles
+
 def choose_dataset_streamlit(raw=True):
     """
     Liste dynamiquement les datasets et fichiers dans RAW_DATA_DIR ou PROCESSED_DATA_DIR
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+
+def compact_ids(ids):
+    """
+    Convertit des identifiants bruts en tableau numpy sans objets Python (chargeable en mmap).
+
+    Les identifiants entiers sont stockés en int32 quand ils le permettent, les autres en chaînes
+    de taille fixe.
+    """
+    ids = np.asarray(ids)
+    if ids.dtype == object and pd.api.types.infer_dtype(ids, skipna=False) == "integer":
+        ids = ids.astype(np.int64)
+    if ids.dtype.kind in "iu":
+        if len(ids) == 0 or (ids.min() >= np.iinfo(np.int32).min and ids.max() <= np.iinfo(np.int32).max):
+            return ids.astype(np.int32)
+        return ids.astype(np.int64)
+    return ids.astype(str)
+
+
+def storable_ids(ids):
+    """Convertit un tableau d'identifiants en dtype sauvegardable sans pickle (numérique ou str)."""
+    ids = np.asarray(ids)
+    if ids.dtype.kind in "iuf":
+        return ids
+    return ids.astype(str)
+
+
+def normalize_rows(matrix):
+    """Normalise les lignes d'une matrice (norme L2), les lignes nulles restent nulles."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
@@ -0,0 +1,243 @@
+import bisect
+from functools import lru_cache
+
+import numpy as np
+
+from recommandation_de_livres.iads.text_cleaning import nettoyage_titre
+from recommandation_de_livres.iads.topk_utils import top_k_indices
+from recommandation_de_livres.iads.trigram_index import TrigramIndex
+
+# Qualité de chaque type de correspondance ; la popularité ne départage que des correspondances de même qualité
+QUALITY_EXACT = 1.0
+QUALITY_TITLE_PREFIX = 0.9
+QUALITY_AUTHOR_PREFIX = 0.8
+QUALITY_FUZZY = 0.7
+POPULARITY_WEIGHT = 0.05
+MIN_SIMILARITY = 0.3  # similarité trigrammes minimale d'une suggestion approchée
+
+
+class SortedStrings:
+    """
+    Chaînes triées stockées dans un seul bloc UTF-8 avec leurs offsets.
+
+    Seules les chaînes lues sont décodées : une recherche dichotomique (`bisect`) n'en décode que log(n),
+    et le tout se sauvegarde en npz sans pickle.
+    """
+
+    def __init__(self, blob, offsets):
+        """
+        Args:
+            blob (np.array) : Octets UTF-8 des chaînes concaténées (uint8)
+            offsets (np.array) : Début de chaque chaîne dans `blob`, de taille n + 1
+        """
+        self.blob = np.asarray(blob, dtype=np.uint8)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self._bytes = self.blob.tobytes()
+
+    @classmethod
+    def from_strings(cls, strings):
+        """Encode une liste de chaînes (déjà triées)."""
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self._bytes[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def prefix_range(self, prefix):
+        """Positions [lo, hi) des chaînes commençant par `prefix`."""
+        lo = bisect.bisect_left(self, prefix)
+        hi = bisect.bisect_left(self, prefix + "\U0010ffff", lo)
+        return lo, hi
+
+    def exact_range(self, text, lo=0):
+        """Positions [lo, hi) des chaînes égales à `text`."""
+        lo = bisect.bisect_left(self, text, lo)
+        return lo, bisect.bisect_right(self, text, lo)
+
+
+def _sorted_column(texts, rows=None):
+    """Trie des textes et retourne (SortedStrings, ligne du catalogue de chaque texte trié)."""
+    order = np.argsort(np.asarray(texts, dtype=object), kind="stable")
+    rows = order if rows is None else np.asarray(rows)[order]
+    return SortedStrings.from_strings([texts[i] for i in order]), rows
+
+
+def _word_suffixes(texts):
+    """Suffixes de chaque texte commençant à un début de mot ("j k rowling" -> ..., "k rowling", "rowling")."""
+    suffixes, rows = [], []
+    for row, text in enumerate(texts):
+        words = text.split()
+        for i in range(len(words)):
+            suffixes.append(" ".join(words[i:]))
+            rows.append(row)
+    return suffixes, rows
+
+
+class TitleAutocomplete:
+    """
+    Index d'autocomplétion des titres (`title_clean`) et des auteurs d'un catalogue.
+
+    - préfixes exacts : recherche dichotomique dans les titres triés et dans les auteurs triés
+      (à partir de chaque mot du nom, pour trouver un auteur par son nom de famille) ;
+    - correspondances approchées : index inversé des trigrammes de caractères des titres, utilisé
+      seulement si les préfixes ne donnent pas assez de suggestions.
+
+    Les suggestions sont classées par qualité de correspondance puis par popularité, et les
+    dernières requêtes sont gardées dans un cache LRU.
+    """
+
+    def __init__(self, titles, title_order, authors, author_order, popularity, trigrams, cache_size=1024):
+        """
+        Args:
+            titles (SortedStrings) : Titres normalisés triés
+            title_order (np.array) : Ligne du catalogue de chaque titre trié
+            authors (SortedStrings) : Suffixes triés des auteurs normalisés
+            author_order (np.array) : Ligne du catalogue de chaque suffixe trié
+            popularity (np.array) : Popularité de chaque ligne, dans [0, 1]
+            trigrams (TrigramIndex) : Index des trigrammes des titres (lignes du catalogue)
+            cache_size (int, optional) : Nombre de requêtes gardées en cache. Defaults to 1024.
+        """
+        self.titles = titles
+        self.title_order = np.asarray(title_order)
+        self.authors = authors
+        self.author_order = np.asarray(author_order)
+        self.popularity = np.asarray(popularity, dtype=np.float32)
+        self.trigrams = trigrams
+
+        self._title_popularity = self.popularity[self.title_order]
+        self._author_popularity = self.popularity[self.author_order]
+        self.suggest = lru_cache(maxsize=cache_size)(self._suggest)
+
+    def __len__(self):
+        return len(self.title_order)
+
+    @classmethod
+    def from_books(cls, books, popularity=None, cache_size=1024):
+        """
+        Construit l'index à partir du catalogue.
+
+        Args:
+            books (pd.DataFrame) : DataFrame des livres (title_clean ou title, authors)
+            popularity (array-like, optional) : Popularité de chaque livre (ex. nombre de notes). Defaults to None.
+            cache_size (int, optional) : Nombre de requêtes gardées en cache. Defaults to 1024.
+
+        Returns:
+            TitleAutocomplete : Index construit
+        """
+        if "title_clean" in books.columns:
+            titles = books["title_clean"].fillna("").astype(str).tolist()
+        else:
+            titles = [nettoyage_titre(t) for t in books["title"]]
+        authors = [nettoyage_titre(a) for a in books["authors"]] if "authors" in books.columns else [""] * len(books)
+
+        # Popularité ramenée dans [0, 1] sur une échelle logarithmique
+        if popularity is None:
+            popularity = np.zeros(len(books), dtype=np.float32)
+        popularity = np.log1p(np.maximum(np.asarray(popularity, dtype=np.float64), 0))
+        popularity = popularity / popularity.max() if len(popularity) and popularity.max() > 0 else popularity
+
+        sorted_titles, title_order = _sorted_column(titles)
+        sorted_authors, author_order = _sorted_column(*_word_suffixes(authors))
+        return cls(sorted_titles, title_order, sorted_authors, author_order, popularity,
+                   TrigramIndex.build(titles), cache_size=cache_size)
+
+    def _suggest(self, query, k=10):
+        """Calcule les suggestions d'une requête (cf. `suggest`, qui met le résultat en cache)."""
+        q = nettoyage_titre(query)
+        if not q or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = {}
+
+        def add(rows, quality):
+            for row in rows:
+                score = quality + POPULARITY_WEIGHT * float(self.popularity[row])
+                if score > scores.get(row, -1.0):
+                    scores[row] = score
+
+        # Titres exacts puis préfixes de titres et d'auteurs, les plus populaires d'abord
+        lo, hi = self.titles.prefix_range(q)
+        exact_lo, exact_hi = self.titles.exact_range(q, lo)
+        add(self.title_order[exact_lo:min(exact_hi, exact_lo + k)], QUALITY_EXACT)
+        best, _ = top_k_indices(self._title_popularity[lo:hi], k)
+        add(self.title_order[lo + best], QUALITY_TITLE_PREFIX)
+        lo, hi = self.authors.prefix_range(q)
+        best, _ = top_k_indices(self._author_popularity[lo:hi], k)
+        add(self.author_order[lo + best], QUALITY_AUTHOR_PREFIX)
+
+        # Correspondances approchées (fautes de frappe, mot au milieu du titre) si les préfixes ne suffisent pas
+        if len(scores) < k:
+            candidates, similarity = self.trigrams.candidates(q, n=2 * k)
+            keep = similarity >= MIN_SIMILARITY
+            fuzzy = QUALITY_FUZZY * similarity[keep] + POPULARITY_WEIGHT * self.popularity[candidates[keep]]
+            for row, score in zip(candidates[keep].tolist(), fuzzy.tolist()):
+                if score > scores.get(row, -1.0):
+                    scores[row] = score
+
+        rows = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+        values = np.fromiter(scores.values(), dtype=np.float32, count=len(scores))
+        best, values = top_k_indices(values, k)
+        return rows[best], values
+
+    def save(self, path):
+        """Sauvegarde l'index au format npz."""
+        np.savez(path, title_blob=self.titles.blob, title_offsets=self.titles.offsets, title_order=self.title_order,
+                 author_blob=self.authors.blob, author_offsets=self.authors.offsets, author_order=self.author_order,
+                 popularity=self.popularity,
+                 **{f"trigram_{key}": value for key, value in self.trigrams.arrays().items()})
+
+    @classmethod
+    def load(cls, path, cache_size=1024):
+        """Charge un index sauvegardé avec `save`."""
+        with np.load(path) as f:
+            arrays = {key: f[key] for key in f.files}
+        trigrams = TrigramIndex.from_arrays({key[len("trigram_"):]: value for key, value in arrays.items()
+                                             if key.startswith("trigram_")})
+        return cls(SortedStrings(arrays["title_blob"], arrays["title_offsets"]), arrays["title_order"],
+                   SortedStrings(arrays["author_blob"], arrays["author_offsets"]), arrays["author_order"],
+                   arrays["popularity"], trigrams, cache_size=cache_size)
+
+
+def load_title_autocomplete(path, books, ratings=None):
+    """
+    Charge l'index d'autocomplétion s'il correspond au catalogue, sinon le construit et le sauvegarde.
+
+    Args:
+        path (Path) : Fichier npz de l'index
+        books (pd.DataFrame) : DataFrame des livres (lignes de l'index)
+        ratings (pd.DataFrame, optional) : Notes servant à la popularité (nombre de notes par livre). Defaults to None.
+
+    Returns:
+        TitleAutocomplete : Index d'autocomplétion
+    """
+    if path.exists():
+        index = TitleAutocomplete.load(path)
+        if len(index) == len(books):
+            return index
+    popularity = None
+    if ratings is not None:
+        popularity = books["item_id"].map(ratings["item_id"].value_counts()).fillna(0).to_numpy()
+    index = TitleAutocomplete.from_books(books, popularity=popularity)
+    index.save(path)
+    return index
+
+
+def autocomplete_titles(query, index, books, k=5):
+    """
+    Suggestions de titres pour une saisie partielle (même sortie que `content_utils.suggest_titles`).
+
+    Args:
+        query (str) : Texte saisi
+        index (TitleAutocomplete) : Index d'autocomplétion du catalogue `books`
+        books (pd.DataFrame) : DataFrame des livres
+        k (int, optional) : Nombre de suggestions. Defaults to 5.
+
+    Returns:
+        pd.DataFrame : ['title', 'authors'] des livres suggérés
+    """
+    rows, _ = index.suggest(query, k)
+    return books.iloc[rows][['title', 'authors']]
@@ -0,0 +1,198 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from recommandation_de_livres.iads.array_utils import normalize_rows
+from recommandation_de_livres.iads.mf_scoring import lookup_ids
+from recommandation_de_livres.iads.topk_utils import top_k_indices
+from recommandation_de_livres.iads.user_profiles import UserProfiles
+
+# État partagé par les processus du pool, initialisé une fois par worker
+_STATE = {}
+
+
+def user_buckets(user_ids, n_buckets):
+    """
+    Retourne la partition Parquet de chaque utilisateur.
+
+    Le hachage porte sur la forme str de l'identifiant pour que la lecture retrouve la même partition
+    quel que soit le type (int ou str) de `user_id` côté application.
+
+    Args:
+        user_ids (np.array) : Identifiants des utilisateurs
+        n_buckets (int) : Nombre de partitions
+
+    Returns:
+        np.array : Numéro de partition de chaque utilisateur
+    """
+    hashed = pd.util.hash_array(np.asarray(user_ids).astype(str).astype(object))
+    return (hashed % np.uint64(n_buckets)).astype(np.int32)
+
+
+def minmax_rows(scores):
+    """Normalise chaque ligne dans [0, 1] en ignorant les scores exclus (-inf)."""
+    finite = np.where(np.isfinite(scores), scores, np.nan)
+    low = np.nanmin(finite, axis=1, keepdims=True)
+    high = np.nanmax(finite, axis=1, keepdims=True)
+    return (scores - low) / (high - low + 1e-8)
+
+
+def init_worker(state):
+    """Initialise l'état partagé d'un worker du pool."""
+    _STATE.clear()
+    _STATE.update(state)
+
+
+def _content_scores(codes):
+    """
+    Calcule les similarités cosinus entre les profils d'un bloc d'utilisateurs et les embeddings.
+
+    Returns:
+        tuple:
+            - scores (np.array) : Similarités (n_utilisateurs x n_livres)
+            - has_profile (np.array) : Masque des utilisateurs ayant un profil (au moins une note avec embedding)
+    """
+    # Profils cherchés par identifiant : leurs lignes ne suivent pas forcément les codes de l'index
+    user_ids = _STATE["index"].user_ids[codes]
+    profiles = _STATE["profiles"]
+    scores = normalize_rows(profiles.batch(user_ids)) @ _STATE["embeddings_norm"].T
+    return scores, profiles.batch_counts(user_ids) > 0
+
+
+def score_user_block(start, stop):
+    """
+    Calcule le top-N de tous les utilisateurs de codes [start, stop) par produits matriciels par bloc.
+
+    Args:
+        start (int) : Premier code utilisateur du bloc
+        stop (int) : Code utilisateur de fin (exclu)
+
+    Returns:
+        pd.DataFrame : Colonnes ['user_id', 'rank', 'item_id', 'score']
+    """
+    index = _STATE["index"]
+    model_type = _STATE["model_type"]
+    codes = np.arange(start, stop)
+
+    if model_type == "content":
+        scores, has_profile = _content_scores(codes)
+        # Sans profil, tous les scores seraient nuls : pas de recommandation précalculée (repli popularité)
+        scores[~has_profile] = -np.inf
+        catalog = _STATE["content_item_ids"]
+    else:
+        scorer = _STATE["scorer"]
+        scores = scorer.score_users(_STATE["inner_uids"][start:stop])
+        catalog = scorer.item_ids
+        if model_type == "hybrid":
+            content, _ = _content_scores(codes)
+            rows = _STATE["catalog_to_row"]
+            content = np.where(rows >= 0, content[:, np.maximum(rows, 0)], 0)
+            alpha = _STATE["alpha"]
+            scores = alpha * minmax_rows(scores) + (1 - alpha) * minmax_rows(content)
+        else:
+            scores = scorer.clip(scores)
+
+    exclude = np.vstack([index.exclusion_mask(index.user_ids[c], catalog) for c in codes])
+    top_idx, top_scores = top_k_indices(scores, _STATE["top_n"], exclude=exclude)
+
+    n_users, top_n = top_idx.shape
+    block = pd.DataFrame({
+        "user_id": np.repeat(index.user_ids[codes], top_n),
+        "rank": np.tile(np.arange(1, top_n + 1, dtype=np.int16), n_users),
+        "item_id": catalog[top_idx.ravel()],
+        "score": top_scores.ravel().astype(np.float32),
+    })
+    return block[np.isfinite(block["score"])]
+
+
+def build_state(model_type, index, top_n, scorer=None, embeddings=None, content_item_ids=None, alpha=0.5,
+                profiles=None):
+    """
+    Prépare l'état partagé par les workers du job de recommandation par lot.
+
+    Args:
+        model_type (str) : "svd", "nmf", "als", "content" ou "hybrid"
+        index (InteractionIndex) : Index des interactions (utilisateurs à traiter et livres à exclure)
+        top_n (int) : Nombre de recommandations par utilisateur
+        scorer (MFScorer, optional) : Scorer collaboratif (svd, nmf, als, hybrid)
+        embeddings (np.array, optional) : Embeddings des livres du dataset de contenu (content, hybrid)
+        content_item_ids (np.array, optional) : item_id alignés sur les lignes de `embeddings`
+        alpha (float, optional) : Poids du score collaboratif pour le modèle hybride. Defaults to 0.5.
+        profiles (UserProfiles, optional) : Profils précalculés à jour ; sinon ils sont calculés
+                                            pour tous les utilisateurs en un seul produit matriciel.
+
+    Returns:
+        dict : État à transmettre à `init_worker`
+    """
+    state = {"model_type": model_type, "index": index, "top_n": top_n, "alpha": alpha}
+    if scorer is not None:
+        state["scorer"] = scorer
+        state["inner_uids"] = lookup_ids(pd.Index(scorer.user_ids), index.user_ids)
+    if embeddings is not None:
+        if profiles is None:
+            profiles = UserProfiles.from_index(index, embeddings, content_item_ids)
+        state["profiles"] = profiles
+        state["embeddings_norm"] = normalize_rows(embeddings)
+        state["content_item_ids"] = np.asarray(content_item_ids)
+        if scorer is not None:
+            state["catalog_to_row"] = lookup_ids(pd.Index(content_item_ids), scorer.item_ids)
+    return state
+
+
+def write_manifest(output_dir, **infos):
+    """Écrit le manifeste JSON décrivant une table de recommandations précalculées."""
+    with open(output_dir / "manifest.json", "w") as f:
+        json.dump(infos, f, indent=2)
+
+
+def lookup_recommendations(output_dir, user_id):
+    """
+    Lit les recommandations précalculées d'un utilisateur (une seule partition est lue).
+
+    Args:
+        output_dir (Path) : Dossier de la table Parquet partitionnée
+        user_id (int ou str) : ID de l'utilisateur
+
+    Returns:
+        pd.DataFrame ou None : Colonnes ['user_id', 'rank', 'item_id', 'score'] triées par rang,
+                               None si aucune table n'existe
+    """
+    manifest_path = output_dir / "manifest.json"
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    bucket = user_buckets([user_id], manifest["n_buckets"])[0]
+    partition = output_dir / f"user_bucket={bucket}"
+    if not partition.exists():
+        return pd.DataFrame(columns=["user_id", "rank", "item_id", "score"])
+    recos = pd.read_parquet(partition)
+    recos = recos[recos["user_id"].astype(str) == str(user_id)]
+    return recos.sort_values("rank").reset_index(drop=True)
+
+
+def precomputed_top_k(output_dir, user_id, k, index=None):
+    """
+    Retourne les k premières recommandations précalculées encore valides pour un utilisateur.
+
+    Les livres notés depuis le calcul du lot sont retirés grâce à l'index des interactions.
+
+    Args:
+        output_dir (Path) : Dossier de la table Parquet partitionnée
+        user_id (int ou str) : ID de l'utilisateur
+        k (int) : Nombre de recommandations
+        index (InteractionIndex, optional) : Index des interactions à jour. Defaults to None.
+
+    Returns:
+        pd.DataFrame ou None : Colonnes ['item_id', 'score'], None s'il n'y a pas assez de recommandations
+    """
+    recos = lookup_recommendations(output_dir, user_id)
+    if recos is None:
+        return None
+    if index is not None and not recos.empty:
+        recos = recos[~index.exclusion_mask(user_id, recos["item_id"].to_numpy())]
+    if len(recos) < k:
+        return None
+    return recos[["item_id", "score"]].head(k).reset_index(drop=True)
@@ -0,0 +1,180 @@
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from recommandation_de_livres.iads.mf_scoring import lookup_ids
+
+
+def normalize_titles(titles):
+    """
+    Normalise des titres pour la recherche exacte : Unicode NFKC, casse ignorée, espaces réduits.
+
+    Args:
+        titles (pd.Series ou list) : Titres bruts
+
+    Returns:
+        pd.Series : Titres normalisés ("" pour les titres manquants)
+    """
+    titles = pd.Series(titles, dtype=object).fillna("").astype(str)
+    return titles.str.normalize("NFKC").str.casefold().str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def normalize_title(title):
+    """Normalise un seul titre comme `normalize_titles`, sans passer par pandas."""
+    if not isinstance(title, str):
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", title).casefold().split())
+
+
+class CatalogIndex:
+    """
+    Index d'un catalogue de livres : titre normalisé -> lignes et item_id -> ligne en O(1).
+
+    Les lignes sont celles du DataFrame d'origine (et donc de la matrice d'embeddings du dataset de contenu).
+    Chaque titre normalisé reçoit un code ; les lignes de chaque code sont regroupées au format CSR
+    (`title_indptr`, `title_rows`), ce qui donne aussi tous les doublons de titre d'un livre.
+    Cet index des titres n'est construit qu'à la première recherche par titre.
+    Les métadonnées sont gardées en colonnes NumPy pour construire les DataFrames de résultats
+    sans filtrer le catalogue.
+    """
+
+    def __init__(self, item_ids, titles, columns=None):
+        """
+        Args:
+            item_ids (np.array) : Identifiants des livres, un par ligne
+            titles (np.array) : Titres bruts des livres, un par ligne
+            columns (dict, optional) : Métadonnées {nom de colonne: tableau aligné sur les lignes}. Defaults to None.
+        """
+        self.item_ids = np.asarray(item_ids)
+        self.titles = np.asarray(titles, dtype=object)
+        self.columns = dict(columns or {})
+
+        # item_id -> première ligne du livre (les item_id en double renvoient la première occurrence)
+        ids = pd.Index(self.item_ids)
+        self._first_item_rows = np.flatnonzero(~ids.duplicated())
+        self._item_index = ids[self._first_item_rows]
+
+        self._title_index = None
+        self._title_codes = None
+        self._title_indptr = None
+        self._title_rows = None
+
+    @classmethod
+    def from_books(cls, books, columns=None):
+        """
+        Construit l'index à partir d'un DataFrame de livres.
+
+        Args:
+            books (pd.DataFrame) : DataFrame contenant au moins ['item_id', 'title']
+            columns (list, optional) : Colonnes de métadonnées conservées. Defaults to None (toutes).
+
+        Returns:
+            CatalogIndex : Index construit
+        """
+        columns = list(books.columns) if columns is None else list(columns)
+        return cls(books["item_id"].to_numpy(), books["title"].to_numpy(),
+                   {col: books[col].to_numpy() for col in columns if col in books.columns})
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def _build_titles(self):
+        """Titre normalisé -> code, puis code -> lignes (CSR)."""
+        codes, keys = pd.factorize(normalize_titles(self.titles))
+        self._title_codes = codes.astype(np.int64)
+        self._title_index = pd.Index(keys)
+        counts = np.bincount(self._title_codes, minlength=len(keys))
+        self._title_indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self._title_indptr[1:])
+        self._title_rows = np.argsort(self._title_codes, kind="stable")
+
+    @property
+    def title_codes(self):
+        """Code du titre normalisé de chaque ligne."""
+        if self._title_codes is None:
+            self._build_titles()
+        return self._title_codes
+
+    @property
+    def title_indptr(self):
+        if self._title_indptr is None:
+            self._build_titles()
+        return self._title_indptr
+
+    @property
+    def title_rows(self):
+        if self._title_rows is None:
+            self._build_titles()
+        return self._title_rows
+
+    @property
+    def title_counts(self):
+        """Nombre de lignes portant chaque titre normalisé (indexé par code de titre)."""
+        return np.diff(self.title_indptr)
+
+    def title_code(self, titles):
+        """Codes des titres (bruts) recherchés, -1 pour les titres absents du catalogue."""
+        if self._title_index is None:
+            self._build_titles()
+        return self._title_index.get_indexer(normalize_titles(titles))
+
+    def first_rows(self, titles):
+        """Première ligne portant chacun des titres recherchés (-1 si absent)."""
+        codes = self.title_code(titles)
+        rows = np.full(len(codes), -1, dtype=np.int64)
+        found = codes >= 0
+        rows[found] = self.title_rows[self.title_indptr[codes[found]]]
+        return rows
+
+    def _single_title_code(self, title):
+        if self._title_index is None:
+            self._build_titles()
+        try:
+            return self._title_index.get_loc(normalize_title(title))
+        except KeyError:
+            return -1
+
+    def rows_for_title(self, title):
+        """Toutes les lignes portant un titre (tableau vide si le titre est absent)."""
+        code = self._single_title_code(title)
+        if code < 0:
+            return np.empty(0, dtype=np.int64)
+        return self.title_rows[self.title_indptr[code]:self.title_indptr[code + 1]]
+
+    def has_title(self, title):
+        return self._single_title_code(title) >= 0
+
+    def rows(self, item_ids):
+        """Lignes des livres (-1 pour les item_id absents), avec repli str <-> int comme `lookup_ids`."""
+        positions = lookup_ids(self._item_index, item_ids)
+        return np.where(positions >= 0, self._first_item_rows[np.maximum(positions, 0)], -1)
+
+    def row(self, item_id):
+        """Ligne d'un livre, ou -1 s'il est absent."""
+        try:
+            return int(self._first_item_rows[self._item_index.get_loc(item_id)])
+        except (KeyError, TypeError):
+            return int(self.rows([item_id])[0])
+
+    def frame(self, rows):
+        """
+        DataFrame des métadonnées des lignes demandées, dans l'ordre.
+
+        Args:
+            rows (np.array) : Lignes des livres (-1 pour un livre absent : métadonnées manquantes)
+
+        Returns:
+            pd.DataFrame : Une ligne par élément de `rows`
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        missing = rows < 0
+        data = {}
+        for col, values in self.columns.items():
+            if missing.any():
+                taken = np.full(len(rows), None, dtype=object)
+                taken[~missing] = values[rows[~missing]]
+            else:
+                taken = values[rows]
+            data[col] = taken
+        return pd.DataFrame(data)
@@ -1,8 +1,12 @@
-import difflib
 import random
 import pandas as pd
 import numpy as np
 
+from recommandation_de_livres.iads.catalog_index import CatalogIndex
+from recommandation_de_livres.iads.fuzzy_match import FuzzyTitleMatcher
+from recommandation_de_livres.iads.interaction_index import InteractionIndex
+from recommandation_de_livres.iads.mf_scoring import as_scorer
+
 
 def rescale_ratings(ratings, new_min=1, new_max=5):
     """
@@ -21,53 +25,59 @@ def rescale_ratings(ratings, new_min=1, new_max=5):
     return ((ratings - old_min) / (old_max - old_min)) * (new_max - new_min) + new_min
 
 
-def get_unrated_item(user_id, ratings):
+def get_unrated_item(user_id, ratings, index=None):
     """
     Retourne les `item_id` que l'utilisateur n'a pas encore notés.
 
     Args:
         user_id (int ou str) : ID de l'utilisateur
         ratings (pd.DataFrame) : DataFrame contenant au moins ['user_id', 'item_id', 'title']
+        index (InteractionIndex, optional) : Index des interactions précalculé. Defaults to None.
 
     Returns:
         list : Liste des item_id non notés par l'utilisateur
     """
-    item_id_to_title = dict(zip(ratings['item_id'], ratings['title']))
-    rated_item_id = set(ratings.loc[ratings['user_id'] == user_id, 'item_id'])
-    rated_titles = set(item_id_to_title[i] for i in rated_item_id)
-    all_item_id = set(ratings['item_id'])
-    unrated_item_id = [item_id for item_id in all_item_id if item_id_to_title[item_id] not in rated_titles]
-    return unrated_item_id
+    if index is None:
+        index = InteractionIndex.from_ratings(ratings)
+    unrated_item_id = index.item_ids[~index.exclusion_mask(user_id)]
+    return list(unrated_item_id)
 
 
-def get_index(title, books):
+def get_index(title, books, matcher=None):
     """
     Retourne l’index d’un livre dans le DataFrame `books` en cherchant le titre le plus proche.
 
     Args:
         title (str) : Titre à rechercher
         books (pd.DataFrame) : DataFrame contenant la colonne 'title'
+        matcher (FuzzyTitleMatcher, optional) : Matcher construit une fois sur `books` ; sinon il est construit ici.
 
     Returns:
-        int : Index du livre correspondant
+        int ou None : Index du livre correspondant, None si aucun titre n'est assez proche
     """
-    existing_titles = list(books['title'])
-    closest_titles = difflib.get_close_matches(title, existing_titles)
-    book_id = books[books['title'] == closest_titles[0]].index[0]
-    return book_id
+    if matcher is None:
+        matcher = FuzzyTitleMatcher.from_books(books)
+    row, _ = matcher.best(title)
+    if row < 0:
+        return None
+    return books.index[row]
 
 
-def get_book(item_id, books):
+def get_book(item_id, books, catalog=None):
     """
     Retourne la ligne correspondant à un livre donné à partir de son item_id.
 
     Args:
         item_id (int ou str) : ID du livre
         books (pd.DataFrame) : DataFrame contenant au moins ['item_id']
+        catalog (CatalogIndex, optional) : Index du catalogue `books` ; la recherche est alors en O(1).
 
     Returns:
         pd.Series ou str : Ligne du DataFrame correspondant au livre ou 'Titre inconnu' si non trouvé
     """
+    if catalog is not None:
+        row = catalog.row(item_id)
+        return books.iloc[row] if row >= 0 else 'Titre inconnu'
     match = books[books['item_id'] == item_id]
     if not match.empty:
         return match.iloc[0]
@@ -80,43 +90,46 @@ def predict_unrated_books(user_id, model, non_note):
 
     Args:
         user_id (int ou str) : ID de l'utilisateur
-        model (Surprise model) : Modèle entraîné pouvant prédire avec `.predict(uid, iid)`
+        model (Surprise model ou MFScorer) : Modèle collaboratif entraîné
         non_note (list) : Liste d’item_id non notés par l’utilisateur
 
     Returns:
         pd.DataFrame : DataFrame triée par note prédite décroissante avec colonnes ['item_id', 'note_predite']
     """
-    pred_dict = {'user_id': user_id, 'item_id': [], 'note_predite': []}
-    for id in non_note:
-        pred = model.predict(uid=user_id, iid=id)
-        pred_dict['item_id'].append(id)
-        pred_dict['note_predite'].append(pred.est)
-    pred_data = pd.DataFrame(pred_dict).sort_values('note_predite', ascending=False)
-    pred_data = pred_data.drop(columns='user_id')
+    scorer = as_scorer(model)
+    pred_data = pd.DataFrame({'item_id': list(non_note), 'note_predite': scorer.predict(user_id, non_note)})
+    pred_data = pred_data.sort_values('note_predite', ascending=False)
     return pred_data
 
 
-def recommandation_collaborative_top_k(k, user_id, model, ratings, books):
+def recommandation_collaborative_top_k(k, user_id, model, ratings, books, index=None, catalog=None):
     """
     Retourne les top-K recommandations pour un utilisateur avec un modèle collaboratif.
 
+    Le catalogue entier est scoré en un seul produit matrice-vecteur par `MFScorer`.
+
     Args:
         k (int) : Nombre de recommandations à retourner
         user_id (int ou str) : ID de l'utilisateur
-        model (Surprise model) : Modèle entraîné
+        model (Surprise model ou MFScorer) : Modèle entraîné
         ratings (pd.DataFrame) : DataFrame des notes avec éventuellement la colonne 'title'
         books (pd.DataFrame) : DataFrame des livres avec 'item_id' et autres métadonnées
+        index (InteractionIndex, optional) : Index des interactions précalculé. Defaults to None.
+        catalog (CatalogIndex, optional) : Index du catalogue `books` construit une fois. Defaults to None.
 
     Returns:
         tuple:
-            - top_k_df (pd.Series) : Titre ou ligne des livres recommandés
+            - top_k_df (pd.DataFrame) : Métadonnées des livres recommandés présents dans le catalogue
             - top_k (pd.DataFrame) : DataFrame contenant ['item_id', 'note_predite'] pour les top K
     """
-    non_note = get_unrated_item(user_id, ratings)
-    pred_ratings = predict_unrated_books(user_id, model, non_note)
-    top_k = pred_ratings.head(k).copy()
-    if 'title' in ratings.columns:
-        top_k_df = top_k['item_id'].apply(get_book, books=ratings)
-    else:
-        top_k_df = top_k['item_id'].apply(get_book, books=books)
+    scorer = as_scorer(model)
+    if index is None:
+        index = InteractionIndex.from_ratings(ratings)
+    exclude = index.exclusion_mask(user_id, scorer.item_ids)
+    item_ids, scores = scorer.recommend(user_id, k, exclude=exclude)
+    top_k = pd.DataFrame({'item_id': item_ids, 'note_predite': scores})
+    if catalog is None:
+        catalog = CatalogIndex.from_books(books)
+    rows = catalog.rows(top_k['item_id'])
+    top_k_df = catalog.frame(rows[rows >= 0])
     return top_k_df, top_k
@@ -1,8 +1,14 @@
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import pandas as pd
 import gensim
 
+from recommandation_de_livres.iads.catalog_index import CatalogIndex
+from recommandation_de_livres.iads.embedding_store import as_embedding_store
+from recommandation_de_livres.iads.interaction_index import InteractionIndex
+from recommandation_de_livres.iads.mf_scoring import lookup_ids
+from recommandation_de_livres.iads.query_encoder import QueryEncoder
+from recommandation_de_livres.iads.topk_utils import top_k_indices
+
 def get_text_vector(text, model):
     vectors = [model.wv[word] for word in text if word in model.wv]
     if vectors:
@@ -14,43 +20,48 @@ def get_book_embedding(book_title, model):
     """Génère l'embedding d'un titre de livre selon le modèle fourni.
     Args:
         book_title (str) : Titre du livre.
-        model : Modèle utilisé pour générer l'embedding (gensim Word2Vec ou SentenceTransformer).
+        model : Modèle utilisé pour générer l'embedding (gensim Word2Vec, QueryEncoder ou SentenceTransformer).
     Returns:
         np.ndarray : Vecteur embedding du livre.
     Raises:
         ValueError : Si le modèle fourni n'est pas reconnu.
     """
-    from sentence_transformers import SentenceTransformer
+    if isinstance(model, QueryEncoder):
+        # Backend déjà chargé et cache LRU des titres récents (cf. query_encoder)
+        return model.encode([book_title])
     if isinstance(model, gensim.models.Word2Vec):
         tokens = gensim.utils.simple_preprocess(book_title)
-        vec = get_text_vector(tokens, model).reshape(1, -1)
-    elif isinstance(model, SentenceTransformer):
-        vec = model.encode([book_title], convert_to_numpy=True)
-    else:
-        raise ValueError("Modèle non reconnu")
-    return vec
+        return get_text_vector(tokens, model).reshape(1, -1)
+    from sentence_transformers import SentenceTransformer
+    if isinstance(model, SentenceTransformer):
+        return model.encode([book_title], convert_to_numpy=True)
+    raise ValueError("Modèle non reconnu")
 
-def get_book_index(title, books):
+def get_book_index(title, books, catalog=None):
     """Récupère l'index d'un livre à partir de son titre.
     Args:
         title (str) : Titre du livre à chercher.
         books (pd.DataFrame) : DataFrame contenant les livres et leurs titres.
+        catalog (CatalogIndex, optional) : Index du catalogue `books` ; la recherche est alors en O(1).
     Returns:
         np.ndarray : Indice ou indices du livre correspondant dans le DataFrame.
     """
+    if catalog is not None:
+        return catalog.rows_for_title(title)
     index = np.where(books['title'] == title)[0]
     return index
 
-def calcul_cosinus_similarite(books_df, book_title, book_index, book_embedding, embeddings, books_names, k):
-    # Calcul des similarités
-    similarity = cosine_similarity(book_embedding, embeddings)[0]
+def calcul_cosinus_similarite(books_df, book_index, book_embedding, embeddings, k):
+    # Embeddings normalisés : la similarité cosinus est un produit scalaire (cf. embedding_store)
+    store = as_embedding_store(embeddings)
 
-    if book_title in books_names:
-        similarity[book_index] = 0
+    # Le livre de départ (et ses doublons de titre) est exclu du top k
+    exclude = None
+    if len(book_index):
+        exclude = np.zeros(len(store), dtype=bool)
+        exclude[book_index] = True
 
-    # Top k indices
-    top_k_idx = np.argsort(similarity)[-k:][::-1]
-    sim_scores = similarity[top_k_idx].copy()
+    top_k_idx, sim_scores = store.search(np.atleast_2d(book_embedding)[0], k, exclude=exclude)
     top_books = books_df.iloc[top_k_idx].copy()
 
     return top_books, sim_scores
@@ -59,8 +70,9 @@ def calcul_cosinus_similarite(books_df, book_title, book_index, book_embedding,
 def suggest_titles(query, tfidf, tfidf_matrix, books, k=5):
     query_clean = query.lower()
     vec = tfidf.transform([query_clean])
-    similarity = cosine_similarity(vec, tfidf_matrix).flatten()
-    top_idx = similarity.argsort()[-k:][::-1]
+    # Les vecteurs TF-IDF sont normalisés (norme L2) : le cosinus est un produit scalaire creux
+    similarity = (tfidf_matrix @ vec.T).toarray().ravel()
+    top_idx, _ = top_k_indices(similarity, k)
     return books.iloc[top_idx][['title','authors']]
 
 def combine_text(row, cols):
@@ -71,6 +83,8 @@ def user_profile_embedding(user_id, ratings, embeddings, item_id_to_idx):
     """
     Calcule le vecteur d'embedding représentant le profil d'un utilisateur.
 
+    Pour le profil de nombreux utilisateurs, préférer `user_profiles.UserProfiles` (un seul produit matriciel).
+
     Args:
         user_id (int ou str) : ID de l'utilisateur
         ratings (pd.DataFrame) : DataFrame contenant les colonnes ['user_id', 'item_id', 'rating']
@@ -85,114 +99,170 @@ def user_profile_embedding(user_id, ratings, embeddings, item_id_to_idx):
     if rated_books.empty:
         return None
 
-    vectors = []
-    for _, row in rated_books.iterrows():
-        idx = item_id_to_idx.get(row['item_id'])
-        if idx is not None:
-            vectors.append(embeddings[idx] * row['rating'])
-
-    if not vectors:
+    idx = rated_books["item_id"].map(item_id_to_idx)
+    found = idx.notna().to_numpy()
+    if not found.any():
         return None
 
-    user_vec = np.mean(vectors, axis=0)
-    return user_vec
+    weights = rated_books["rating"].to_numpy(dtype=np.float32)[found]
+    return weights @ np.asarray(embeddings)[idx.to_numpy()[found].astype(np.int64)] / found.sum()
 
 #--------------FONCTION DE RECOMMANDATION--------------
 
-def recommandation_content_top_k(book_title, embeddings, model, books_df, knn, k=5):
+def recommandation_content_top_k(book_title, embeddings, model, books_df, knn, k=5, store=None, catalog=None):
     """Retourne les k livres les plus similaires à un titre donné, selon un modèle, des embeddings et un KNN pré-entraîné.
     Args:
         book_title (str) : Titre du livre de référence.
         embeddings (np.ndarray) : Matrice des embeddings des livres (nb_livres x dimension).
         model : Modèle utilisé pour générer l'embedding si le titre n'est pas dans books_df (Word2Vec, SentenceTransformer, etc.).
         books_df (pd.DataFrame) : DataFrame des livres (doit contenir au moins une colonne 'title').
-        knn (sklearn.neighbors.NearestNeighbors) : Modèle KNN pré-entraîné sur les embeddings pour accélérer la recherche de voisins proches.
+        knn (IVFIndex, HNSWIndex ou NearestNeighbors) : Index des plus proches voisins des embeddings (cf. `ann_index`).
         k (int) : Nombre de recommandations à retourner.
+        store (EmbeddingStore, optional) : Embeddings normalisés à l'entraînement ; sinon `embeddings` est normalisé à chaque requête.
+        catalog (CatalogIndex, optional) : Index du catalogue `books_df` ; sinon le titre est cherché par comparaison sur tout le catalogue.
     Returns:
         (pd.DataFrame, np.ndarray) : 
             - DataFrame contenant les informations des k livres recommandés.
             - Tableau des scores de similarité correspondants (valeurs entre 0 et 1).
     """
 
-    books_names = set(books_df['title'])
+    book_index = get_book_index(book_title, books_df, catalog=catalog)
 
     # Embedding du livre donné
-    if book_title in books_names:
-        book_index = get_book_index(book_title, books_df)
+    if len(book_index):
         book_embedding = embeddings[book_index]
 
         if knn is not None:
 
-            # Calcul des similarités et Top k indices
-            distances, top_k_idx = knn.kneighbors(book_embedding)
-            top_books = books_df.iloc[top_k_idx[0][1:k+1]].copy()
-
-            sim_scores = 1 - distances
-            sim_scores = sim_scores[0][1:k+1]
+            # Voisins du livre (k variable), sans le livre lui-même ni ses doublons de titre
+            distances, neighbors = knn.kneighbors(book_embedding[:1], n_neighbors=k + len(book_index))
+            keep = ~np.isin(neighbors[0], book_index) & (neighbors[0] >= 0)
+            top_books = books_df.iloc[neighbors[0][keep][:k]].copy()
+            sim_scores = (1 - distances[0])[keep][:k]
         else:
-            top_books, sim_scores = calcul_cosinus_similarite(books_df, book_title, book_index,
-                                                              book_embedding, embeddings, books_names,
-                                                              k)       
+            top_books, sim_scores = calcul_cosinus_similarite(books_df, book_index, book_embedding,
+                                                              store if store is not None else embeddings, k)
 
     # Si le livre n'est pas dans le dataset
     else:
         book_embedding = get_book_embedding(book_title, model)
 
-        # Calcul des similarités
-        similarity = cosine_similarity(book_embedding, embeddings)[0]
-
-        # Top k indices
-        top_k_idx = np.argsort(similarity)[-k:][::-1]
-        sim_scores = similarity[top_k_idx].copy()
+        # Calcul des similarités et top k
+        store = as_embedding_store(store if store is not None else embeddings)
+        top_k_idx, sim_scores = store.search(np.atleast_2d(book_embedding)[0], k)
         top_books = books_df.iloc[top_k_idx].copy()
 
     return top_books, sim_scores
 
-def recommandation_content_user_top_k(user_id, embeddings, books_df, ratings, knn=None, k=5):
+def recommandation_content_batch_top_k(queries, embeddings, books_df, knn=None, k=5, store=None, catalog=None):
+    """
+    Retourne les k livres les plus similaires à chacun des livres d'une liste, en une seule recherche.
+
+    Toutes les requêtes sont scorées ensemble : un produit matriciel par blocs (`EmbeddingStore.search`)
+    ou une seule requête groupée à l'index KNN. Comme dans `recommandation_content_top_k`, le livre
+    de départ et ses doublons de titre sont exclus de ses voisins.
+
+    Args:
+        queries (list) : Titres des livres, ou lignes des livres dans `books_df` / `embeddings`.
+        embeddings (np.ndarray) : Matrice des embeddings des livres (nb_livres x dimension).
+        books_df (pd.DataFrame) : DataFrame des livres aligné sur `embeddings` (colonne 'title').
+        knn (optional) : Index des plus proches voisins des embeddings (cf. `ann_index`). Defaults to None.
+        k (int) : Nombre de recommandations par requête.
+        store (EmbeddingStore, optional) : Embeddings normalisés à l'entraînement ; sinon `embeddings` est normalisé ici.
+        catalog (CatalogIndex, optional) : Index du catalogue `books_df` ; sinon il est construit ici.
+    Returns:
+        (np.ndarray, np.ndarray) :
+            - Lignes des livres recommandés, de forme (n_requetes, k), -1 pour les places vides
+              (titre absent du catalogue ou catalogue trop petit).
+            - Similarités cosinus correspondantes (-inf pour les places vides).
+    """
+    # Le premier livre portant un titre sert de requête, tous ses doublons de titre sont exclus
+    if catalog is None:
+        catalog = CatalogIndex.from_books(books_df, columns=[])
+    title_codes = catalog.title_codes
+    queries = np.asarray(queries)
+    if np.issubdtype(queries.dtype, np.integer):
+        rows = queries.astype(np.int64)
+    else:
+        rows = catalog.first_rows(queries)
+
+    neighbors = np.full((len(rows), k), -1, dtype=np.int64)
+    sim_scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+    found = np.flatnonzero(rows >= 0)
+    if len(found) == 0:
+        return neighbors, sim_scores
+
+    # On demande assez de voisins pour en garder k une fois les doublons de titre retirés
+    query_codes = title_codes[rows[found]]
+    n_fetch = min(k + int(catalog.title_counts[query_codes].max()), len(books_df))
+    query_vectors = np.asarray(embeddings[rows[found]], dtype=np.float32)
+    if knn is not None:
+        distances, candidates = knn.kneighbors(query_vectors, n_neighbors=n_fetch)
+        candidate_scores = 1 - distances
+    else:
+        store = as_embedding_store(store if store is not None else embeddings)
+        candidates, candidate_scores = store.search(query_vectors, n_fetch)
+
+    # Les candidats retirés passent en fin de ligne (tri stable), puis on garde les k premiers
+    drop = (candidates < 0) | (title_codes[np.maximum(candidates, 0)] == query_codes[:, None])
+    order = np.argsort(drop, axis=1, kind="stable")[:, :k]
+    kept = ~np.take_along_axis(drop, order, axis=1)
+    width = order.shape[1]
+    neighbors[found, :width] = np.where(kept, np.take_along_axis(candidates, order, axis=1), -1)
+    sim_scores[found, :width] = np.where(kept, np.take_along_axis(candidate_scores, order, axis=1), -np.inf)
+    return neighbors, sim_scores
+
+def recommandation_content_user_top_k(user_id, embeddings, books_df, ratings, knn=None, k=5, profiles=None, store=None,
+                                      index=None, catalog=None):
     """
     Retourne les k livres les plus similaires au profil utilisateur.
     Args:
         user_id : ID de l'utilisateur.
         embeddings (np.ndarray) : Matrice des embeddings des livres.
-        model : Modèle utilisé pour générer un embedding si nécessaire (Word2Vec, SBERT, etc.)
-        books_df (pd.DataFrame) : DataFrame des livres.
+        books_df (pd.DataFrame) : DataFrame des livres (aligné sur les lignes de `embeddings`).
         ratings (pd.DataFrame) : DataFrame des ratings (user_id, item_id, rating).
-        knn : KNN pré-entraîné sur les embeddings (optionnel).
+        knn : Index des plus proches voisins des embeddings (cf. `ann_index`, optionnel).
         k (int) : Nombre de recommandations.
+        profiles (UserProfiles, optional) : Profils précalculés ; le profil est alors une simple lecture de ligne.
+        store (EmbeddingStore, optional) : Embeddings normalisés à l'entraînement.
+        index (InteractionIndex, optional) : Index des interactions précalculé ; sinon il est construit depuis `ratings`.
+        catalog (CatalogIndex, optional) : Index du catalogue `books_df`.
     Returns:
         (pd.DataFrame, np.ndarray) : top-k livres + scores de similarité
     """
+    if index is None:
+        index = InteractionIndex.from_ratings(ratings)
+    item_ids = catalog.item_ids if catalog is not None else books_df['item_id'].to_numpy()
 
-    # Créer le vecteur profil utilisateur
-    rated_books = ratings[ratings["user_id"] == user_id]
-    if rated_books.empty:
+    # Vecteur profil utilisateur
+    if profiles is not None:
+        user_vec = profiles.profile(user_id)
+    else:
+        # Notes de l'utilisateur lues dans l'index (tranche CSR), sans parcourir `ratings`
+        rated_ids, rated_values = index.user_ratings(user_id)
+        rows = catalog.rows(rated_ids) if catalog is not None else lookup_ids(pd.Index(item_ids), rated_ids)
+        found = rows >= 0
+        user_vec = None
+        if found.any():
+            weights = np.asarray(rated_values, dtype=np.float32)[found]
+            user_vec = weights @ np.asarray(embeddings[rows[found]], dtype=np.float32) / found.sum()
+    if user_vec is None:
         return pd.DataFrame(), np.array([])
+    user_vec = np.asarray(user_vec, dtype=np.float32).reshape(1, -1)
 
-    item_id_to_idx = {item_id: idx for idx, item_id in enumerate(books_df['item_id'])}
-    vectors = []
-    for _, row in rated_books.iterrows():
-        idx = item_id_to_idx.get(row['item_id'])
-        if idx is not None:
-            vectors.append(embeddings[idx] * row['rating'])
-    user_vec = np.mean(vectors, axis=0).reshape(1, -1)
+    # Livres déjà notés (et autres éditions du même titre) exclus du top-k, comme en collaboratif
+    exclude = index.exclusion_mask(user_id, item_ids)
 
-    # Calcul similarité
     if knn is not None:
-        # utiliser KNN pour récupérer top-k
-        distances, top_k_idx = knn.kneighbors(user_vec)
-        top_books = books_df.iloc[top_k_idx[0]].copy()
-        sim_scores = 1 - distances[0]
+        # Le KNN renvoie aussi des livres déjà notés : on demande assez de voisins pour en garder k
+        n_neighbors = min(k + int(exclude.sum()), len(books_df))
+        distances, neighbors = knn.kneighbors(user_vec, n_neighbors=n_neighbors)
+        neighbors, sim_scores = neighbors[0], 1 - distances[0]
+        keep = (neighbors >= 0) & ~exclude[np.maximum(neighbors, 0)]
+        top_k_idx, sim_scores = neighbors[keep][:k], sim_scores[keep][:k]
     else:
-        # cosine similarity brute
-        similarity = cosine_similarity(user_vec, embeddings)[0]
-        top_k_idx = np.argsort(similarity)[-k:][::-1]
-        top_books = books_df.iloc[top_k_idx].copy()
-        sim_scores = similarity[top_k_idx]
-
-    # Exclure les livres déjà notés
-    top_books = top_books[~top_books['item_id'].isin(rated_books['item_id'])].reset_index(drop=True)
-    top_books = top_books.iloc[1:k+1]
-    sim_scores = sim_scores[:len(top_books)]
+        store = as_embedding_store(store if store is not None else embeddings)
+        top_k_idx, sim_scores = store.search(user_vec[0], k, exclude=exclude)
 
+    top_books = books_df.iloc[top_k_idx].reset_index(drop=True)
     return top_books, sim_scores
-
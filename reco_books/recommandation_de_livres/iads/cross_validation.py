@@ -0,0 +1,169 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import time
+
+import numpy as np
+import pandas as pd
+from surprise import NMF, SVD, Dataset, Reader
+
+from recommandation_de_livres.iads.evaluation import (
+    full_catalog_metrics,
+    ranking_metrics,
+    rmse_mae,
+)
+from recommandation_de_livres.iads.mf_scoring import MFScorer
+
+ALGORITHMS = {"SVD": SVD, "NMF": NMF}
+
+# État partagé par les processus du pool, initialisé une fois par worker
+_STATE = {}
+
+
+def dataset_hash(ratings):
+    """
+    Calcule une empreinte courte du contenu des notes (user_id, item_id, rating).
+
+    Args:
+        ratings (pd.DataFrame) : DataFrame des notes
+
+    Returns:
+        str : Empreinte hexadécimale
+    """
+    hashed = pd.util.hash_pandas_object(ratings[["user_id", "item_id", "rating"]], index=False)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()[:16]
+
+
+def kfold_indices(n, n_splits=5, seed=42):
+    """
+    Découpe les indices [0, n) en `n_splits` folds de test disjoints, après mélange.
+
+    Args:
+        n (int) : Nombre de notes
+        n_splits (int, optional) : Nombre de folds. Defaults to 5.
+        seed (int, optional) : Graine du mélange. Defaults to 42.
+
+    Returns:
+        list : Indices de test de chaque fold (np.array d'entiers)
+    """
+    permutation = np.random.default_rng(seed).permutation(n)
+    return [np.sort(fold) for fold in np.array_split(permutation, n_splits)]
+
+
+def load_or_build_folds(ratings, n_splits=5, seed=42, cache_dir=None):
+    """
+    Retourne les indices de test des folds, lus depuis le cache disque s'ils ont déjà été calculés.
+
+    Le fichier de cache est identifié par l'empreinte du dataset, le nombre de folds et la graine.
+
+    Args:
+        ratings (pd.DataFrame) : DataFrame des notes
+        n_splits (int, optional) : Nombre de folds. Defaults to 5.
+        seed (int, optional) : Graine du mélange. Defaults to 42.
+        cache_dir (Path, optional) : Dossier du cache (pas de cache si None). Defaults to None.
+
+    Returns:
+        list : Indices de test de chaque fold
+    """
+    if cache_dir is None:
+        return kfold_indices(len(ratings), n_splits, seed)
+
+    path = cache_dir / f"folds_{dataset_hash(ratings)}_{n_splits}_{seed}.npz"
+    if path.exists():
+        with np.load(path) as f:
+            return [f[f"fold_{i}"] for i in range(n_splits)]
+
+    folds = kfold_indices(len(ratings), n_splits, seed)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        np.savez(f, **{f"fold_{i}": fold for i, fold in enumerate(folds)})
+    return folds
+
+
+def init_worker(state):
+    """Initialise l'état partagé d'un worker du pool."""
+    _STATE.clear()
+    _STATE.update(state)
+
+
+def run_fold(model_name, params, fold):
+    """
+    Entraîne un algorithme sur le train d'un fold et l'évalue sur son test.
+
+    Args:
+        model_name (str) : Nom de l'algorithme (clé de ALGORITHMS)
+        params (dict) : Hyperparamètres de l'algorithme
+        fold (int) : Numéro du fold
+
+    Returns:
+        dict : Modèle, fold, métriques et temps d'entraînement et d'évaluation
+    """
+    users, items, ratings = _STATE["users"], _STATE["items"], _STATE["ratings"]
+    test_idx = _STATE["folds"][fold]
+    train_mask = np.ones(len(ratings), dtype=bool)
+    train_mask[test_idx] = False
+
+    start = time.time()
+    train_df = pd.DataFrame({"user_id": users[train_mask], "item_id": items[train_mask], "rating": ratings[train_mask]})
+    trainset = Dataset.load_from_df(train_df, Reader(rating_scale=_STATE["rating_scale"])).build_full_trainset()
+    algo = ALGORITHMS[model_name](**params)
+    algo.fit(trainset)
+    fit_time = time.time() - start
+
+    start = time.time()
+    k, threshold = _STATE["k"], _STATE["threshold"]
+    scorer = MFScorer.from_surprise(algo)
+    test_users, test_items, test_ratings = users[test_idx], items[test_idx], ratings[test_idx]
+    est = scorer.predict_pairs(test_users, test_items)
+
+    rmse, mae = rmse_mae(test_ratings, est)
+    metrics = {"RMSE": rmse, "MAE": mae}
+    metrics.update(ranking_metrics(test_users, test_ratings, est, k=k, threshold=threshold))
+    metrics["CatalogCoverage"] = len(np.unique(test_items[est >= threshold].astype(str))) / _STATE["n_items"]
+    if _STATE["full_catalog"]:
+        catalog = full_catalog_metrics(scorer, test_users, test_items, test_ratings, k=k, threshold=threshold,
+                                       train_users=users[train_mask], train_items=items[train_mask])
+        metrics.update({f"Catalogue {name}": value for name, value in catalog.items()})
+
+    return {"model": model_name, "fold": fold, **metrics,
+            "TempsEntrainement(s)": fit_time, "TempsEvaluation(s)": time.time() - start}
+
+
+def cross_validate(ratings, algos, n_splits=5, seed=42, rating_scale=(1, 5), k=10, threshold=3.5,
+                   full_catalog=False, n_workers=None, cache_dir=None):
+    """
+    Lance la cross-validation de plusieurs algorithmes en parallèle (un processus par couple algorithme/fold).
+
+    Les résultats sont renvoyés au fil de l'eau, dès qu'un fold est terminé.
+
+    Args:
+        ratings (pd.DataFrame) : DataFrame contenant ['user_id', 'item_id', 'rating']
+        algos (dict) : {nom de l'algorithme : hyperparamètres}, ex. {"SVD": {"n_factors": 100}}
+        n_splits (int, optional) : Nombre de folds. Defaults to 5.
+        seed (int, optional) : Graine du découpage. Defaults to 42.
+        rating_scale (tuple, optional) : Échelle des notes. Defaults to (1, 5).
+        k (int, optional) : Taille du top des métriques @K. Defaults to 10.
+        threshold (float, optional) : Seuil d'une note pertinente. Defaults to 3.5.
+        full_catalog (bool, optional) : Évalue aussi le classement sur tout le catalogue. Defaults to False.
+        n_workers (int, optional) : Nombre de processus (défaut : nombre de CPU). Defaults to None.
+        cache_dir (Path, optional) : Dossier du cache des folds. Defaults to None.
+
+    Yields:
+        dict : Résultats d'un fold (cf. `run_fold`)
+    """
+    ratings = ratings[["user_id", "item_id", "rating"]].reset_index(drop=True)
+    state = {
+        "users": ratings["user_id"].to_numpy(dtype=object),
+        "items": ratings["item_id"].to_numpy(dtype=object),
+        "ratings": ratings["rating"].to_numpy(dtype=np.float64),
+        "folds": load_or_build_folds(ratings, n_splits, seed, cache_dir),
+        "n_items": ratings["item_id"].nunique(),
+        "rating_scale": rating_scale,
+        "k": k,
+        "threshold": threshold,
+        "full_catalog": full_catalog,
+    }
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(state,)) as pool:
+        futures = [pool.submit(run_fold, name, params, fold) for name, params in algos.items() for fold in range(n_splits)]
+        for future in as_completed(futures):
+            yield future.result()
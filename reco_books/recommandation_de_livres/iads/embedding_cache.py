@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+VECTORS = "vectors.f32"
+KEYS = "keys.npy"
+META = "meta.json"
+
+
+def cache_dir(embeddings_path):
+    """
+    Retourne le dossier du cache associé à un fichier d'embeddings.
+
+    Ex. : embeddings_sbert.npy -> embeddings_sbert_cache (même dossier).
+    """
+    return embeddings_path.with_name(f"{embeddings_path.stem}_cache")
+
+
+def text_keys(texts, model_id):
+    """
+    Clés uint64 de textes pour un modèle : hachage du texte nettoyé, salé par l'identifiant du modèle.
+
+    Args:
+        texts (iterable) : Textes nettoyés (chaînes, ou listes de tokens jointes par des espaces)
+        model_id (str) : Identifiant du modèle qui produit les vecteurs
+
+    Returns:
+        np.array : Clé de chaque texte
+    """
+    texts = [" ".join(t) if isinstance(t, (list, tuple, np.ndarray)) else (t if isinstance(t, str) else "")
+             for t in texts]
+    salt = hashlib.md5(model_id.encode("utf-8")).hexdigest()[:16]
+    return pd.util.hash_array(np.asarray(texts, dtype=object), hash_key=salt)
+
+
+class EmbeddingCache:
+    """
+    Cache disque des embeddings de textes, pour un modèle donné.
+
+    Les vecteurs sont ajoutés à la fin d'un fichier binaire float32 (jamais réécrit) lu en mmap ;
+    `keys.npy` donne la clé de chaque ligne (cf. `text_keys`). Si l'identifiant du modèle ou la dimension
+    changent, le cache est vidé : ses vecteurs ne correspondent plus au modèle.
+    """
+
+    def __init__(self, path, model_id, dim):
+        """
+        Args:
+            path (Path) : Dossier du cache
+            model_id (str) : Identifiant du modèle (nom, budget de tokens, empreinte des poids...)
+            dim (int) : Dimension des vecteurs
+        """
+        self.path = path
+        self.model_id = model_id
+        self.dim = int(dim)
+        path.mkdir(parents=True, exist_ok=True)
+
+        meta = None
+        if (path / META).exists():
+            with open(path / META) as f:
+                meta = json.load(f)
+        if meta != {"model_id": model_id, "dim": self.dim} or not (path / KEYS).exists():
+            self._reset()
+        self.keys = np.load(path / KEYS)
+
+        # Vecteurs ajoutés sans que l'index ait été écrit (interruption) : ils sont ignorés et écrasés
+        size = len(self.keys) * self.dim * 4
+        if os.path.getsize(path / VECTORS) != size:
+            os.truncate(path / VECTORS, size)
+        self._load()
+
+    def _reset(self):
+        open(self.path / VECTORS, "wb").close()
+        np.save(self.path / KEYS, np.empty(0, dtype=np.uint64))
+        with open(self.path / META, "w") as f:
+            json.dump({"model_id": self.model_id, "dim": self.dim}, f, indent=2)
+
+    def _load(self):
+        self._index = pd.Index(self.keys)
+        if len(self.keys):
+            self.vectors = np.memmap(self.path / VECTORS, dtype=np.float32, mode="r", shape=(len(self.keys), self.dim))
+        else:
+            self.vectors = np.empty((0, self.dim), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, keys):
+        """Lignes du cache des clés demandées (-1 pour les clés absentes)."""
+        return self._index.get_indexer(pd.Index(np.asarray(keys, dtype=np.uint64)))
+
+    def append(self, keys, vectors):
+        """
+        Ajoute des vecteurs à la fin du cache.
+
+        Les vecteurs sont écrits avant l'index : une interruption entre les deux ne laisse que des lignes ignorées.
+
+        Args:
+            keys (np.array) : Clés des nouveaux textes (absentes du cache)
+            vectors (np.array) : Vecteurs correspondants (n, dim)
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(keys), self.dim)
+        with open(self.path / VECTORS, "ab") as f:
+            f.write(vectors.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self.keys = np.concatenate([self.keys, np.asarray(keys, dtype=np.uint64)])
+        tmp = self.path / f"{KEYS}.tmp.npy"
+        np.save(tmp, self.keys)
+        os.replace(tmp, self.path / KEYS)
+        self._load()
+
+
+def cached_encode(texts, encode, cache):
+    """
+    Embeddings de textes, en n'encodant que les textes absents du cache.
+
+    Les textes identiques ne sont encodés qu'une fois ; les nouveaux vecteurs sont ajoutés au cache.
+
+    Args:
+        texts (list) : Textes nettoyés
+        encode (callable) : Fonction liste de textes -> np.array (n, dim)
+        cache (EmbeddingCache) : Cache du modèle utilisé par `encode`
+
+    Returns:
+        tuple:
+            - embeddings (np.array) : Embeddings float32 (n_textes, dim)
+            - n_encoded (int) : Nombre de textes distincts encodés
+    """
+    texts = list(texts)
+    keys = text_keys(texts, cache.model_id)
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    rows = cache.lookup(unique_keys)
+    missing = np.flatnonzero(rows < 0)
+    if len(missing):
+        cache.append(unique_keys[missing], encode([texts[i] for i in first[missing]]))
+        rows[missing] = cache.lookup(unique_keys[missing])
+    return np.asarray(cache.vectors[rows[inverse.ravel()]], dtype=np.float32), len(missing)
@@ -0,0 +1,214 @@
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from recommandation_de_livres.iads.array_utils import compact_ids, normalize_rows
+from recommandation_de_livres.iads.mf_scoring import lookup_ids
+from recommandation_de_livres.iads.topk_utils import dot_top_k
+from recommandation_de_livres.iads.user_profiles import profiles_path, remove_profiles
+
+SOURCE = "source.json"
+
+
+def store_dir(embeddings_path):
+    """
+    Retourne le dossier du store associé à un fichier d'embeddings.
+
+    Ex. : embeddings_sbert.npy -> embeddings_sbert_store (même dossier).
+    """
+    return embeddings_path.with_name(f"{embeddings_path.stem}_store")
+
+
+def source_fingerprint(embeddings_path):
+    """Empreinte (taille, date de modification) d'un fichier d'embeddings : elle change à chaque réécriture."""
+    stat = embeddings_path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class EmbeddingStore:
+    """
+    Embeddings des livres normalisés (norme L2) une fois pour toutes, en float32 contigu,
+    avec les item_id alignés sur les lignes.
+
+    La similarité cosinus avec une requête normalisée est alors un simple produit scalaire,
+    calculé par blocs avec `topk_utils.dot_top_k`. Le store peut être sauvegardé en float16 :
+    chargé en mmap, il n'occupe alors que les pages lues, converties en float32 bloc par bloc.
+    """
+
+    def __init__(self, vectors, item_ids=None):
+        """
+        Args:
+            vectors (np.array) : Embeddings normalisés (n_livres, dimension)
+            item_ids (np.array, optional) : item_id alignés sur les lignes de `vectors`. Defaults to None.
+        """
+        self.vectors = vectors
+        self.item_ids = np.asarray(item_ids) if item_ids is not None else None
+        self._item_index = None
+
+    @classmethod
+    def from_embeddings(cls, embeddings, item_ids=None):
+        """Normalise les embeddings bruts et construit le store."""
+        return cls(np.ascontiguousarray(normalize_rows(embeddings)), item_ids)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    @property
+    def dtype(self):
+        return self.vectors.dtype
+
+    def save(self, path, dtype=np.float32, source=None):
+        """
+        Sauvegarde le store dans un dossier de fichiers `.npy`.
+
+        Args:
+            path (Path) : Dossier du store
+            dtype (np.dtype, optional) : Type des vecteurs sur disque (float32 ou float16). Defaults to np.float32.
+            source (Path, optional) : Fichier des embeddings bruts dont le store est issu ; son empreinte est
+                                      enregistrée pour détecter une réécriture des embeddings. Defaults to None.
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "vectors.npy", np.asarray(self.vectors, dtype=dtype), allow_pickle=False)
+        if self.item_ids is not None:
+            np.save(path / "item_ids.npy", compact_ids(self.item_ids), allow_pickle=False)
+        (path / SOURCE).unlink(missing_ok=True)
+        if source is not None:
+            with open(path / SOURCE, "w") as f:
+                json.dump(source_fingerprint(source), f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Charge un store sauvegardé avec `save`.
+
+        Args:
+            path (Path) : Dossier du store
+            mmap_mode (str, optional) : Mode de projection mémoire des vecteurs. Defaults to "r".
+
+        Returns:
+            EmbeddingStore ou None : Store chargé, None si le dossier n'existe pas
+        """
+        if not (path / "vectors.npy").exists():
+            return None
+        item_ids_path = path / "item_ids.npy"
+        item_ids = np.load(item_ids_path) if item_ids_path.exists() else None
+        return cls(np.load(path / "vectors.npy", mmap_mode=mmap_mode), item_ids)
+
+    def rows(self, item_ids):
+        """Retourne les lignes des livres (-1 pour les livres absents du store)."""
+        if self._item_index is None:
+            self._item_index = pd.Index(self.item_ids)
+        return lookup_ids(self._item_index, item_ids)
+
+    def search(self, queries, k, exclude=None, chunk_size=65536):
+        """
+        Retourne les k livres les plus similaires (cosinus) à une ou plusieurs requêtes.
+
+        Args:
+            queries (np.array) : Requête(s) brute(s) de forme (dimension,) ou (n_requetes, dimension)
+            k (int) : Nombre de livres
+            exclude (np.array, optional) : Masque booléen des lignes à exclure. Defaults to None.
+            chunk_size (int, optional) : Nombre de lignes scorées à la fois. Defaults to 65536.
+
+        Returns:
+            tuple: (lignes, similarités), cf. `topk_utils.top_k_indices`
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        normalized = normalize_rows(np.atleast_2d(queries))
+        if queries.ndim == 1:
+            normalized = normalized[0]
+        return dot_top_k(self.vectors, normalized, k, exclude=exclude, chunk_size=chunk_size)
+
+
+def as_embedding_store(embeddings):
+    """Retourne `embeddings` s'il s'agit déjà d'un store, sinon le store des embeddings bruts (normalisés ici)."""
+    if isinstance(embeddings, EmbeddingStore):
+        return embeddings
+    return EmbeddingStore.from_embeddings(embeddings)
+
+
+def load_embeddings(embeddings_path, mmap_mode="r"):
+    """
+    Charge les embeddings bruts d'un fichier `.npy`, projetés en mémoire en lecture seule par défaut.
+
+    Les pages du fichier sont partagées par tous les processus et sessions qui le lisent :
+    la mémoire résidente n'augmente pas avec le nombre de sessions.
+
+    Args:
+        embeddings_path (Path) : Chemin du fichier embeddings_<modèle>.npy
+        mmap_mode (str, optional) : Mode de projection mémoire (None pour charger en RAM). Defaults to "r".
+
+    Returns:
+        np.array : Embeddings (np.memmap en mode mmap)
+    """
+    return np.load(embeddings_path, mmap_mode=mmap_mode)
+
+
+def load_embedding_store(embeddings_path, item_ids=None, mmap_mode="r", dtype=np.float32):
+    """
+    Charge le store associé à un fichier d'embeddings.
+
+    S'il n'a pas été sauvegardé à l'entraînement, ou s'il ne correspond plus aux embeddings (taille
+    différente, ou fichier d'embeddings réécrit depuis : cf. `source_fingerprint`), il est construit
+    depuis les embeddings bruts et sauvegardé, puis rechargé en mmap.
+
+    Args:
+        embeddings_path (Path) : Chemin du fichier embeddings_<modèle>.npy
+        item_ids (np.array, optional) : item_id alignés sur les lignes des embeddings. Defaults to None.
+        mmap_mode (str, optional) : Mode de projection mémoire des vecteurs. Defaults to "r".
+        dtype (np.dtype, optional) : Type des vecteurs d'un store construit ici (float32 ou float16).
+                                     Defaults to np.float32.
+
+    Returns:
+        EmbeddingStore : Store des embeddings
+    """
+    path = store_dir(embeddings_path)
+    store = EmbeddingStore.load(path, mmap_mode=mmap_mode)
+    source = None
+    if (path / SOURCE).exists():
+        with open(path / SOURCE) as f:
+            source = json.load(f)
+    if store is None or (item_ids is not None and len(store) != len(item_ids)) \
+            or source != source_fingerprint(embeddings_path):
+        EmbeddingStore.from_embeddings(np.load(embeddings_path, mmap_mode="r"), item_ids).save(
+            path, dtype=dtype, source=embeddings_path)
+        store = EmbeddingStore.load(path, mmap_mode=mmap_mode)
+    if store.item_ids is None and item_ids is not None:
+        store.item_ids = np.asarray(item_ids)
+    return store
+
+
+def refresh_dependents(embeddings_path, item_ids=None, dtype=np.float32, models_dir=None):
+    """
+    À appeler après chaque écriture d'un fichier d'embeddings : reconstruit son store et supprime
+    les artefacts calculés sur les anciens embeddings (profils des utilisateurs, index ANN).
+
+    Args:
+        embeddings_path (Path) : Fichier embeddings_<modèle>.npy qui vient d'être écrit
+        item_ids (np.array, optional) : item_id alignés sur les lignes des embeddings. Defaults to None.
+        dtype (np.dtype, optional) : Type des vecteurs du store (float32 ou float16). Defaults to np.float32.
+        models_dir (Path, optional) : Dossier des modèles du dataset (index ANN). Defaults to None.
+    """
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    EmbeddingStore.from_embeddings(embeddings, item_ids).save(store_dir(embeddings_path), dtype=dtype,
+                                                              source=embeddings_path)
+    remove_profiles(profiles_path(embeddings_path))
+    if models_dir is not None:
+        from recommandation_de_livres.iads.ann_index import ann_index_dir
+
+        name = embeddings_path.stem.replace("embeddings_", "", 1)
+        shutil.rmtree(ann_index_dir(models_dir, name), ignore_errors=True)
+        (models_dir / f"knn_model_{name}.joblib").unlink(missing_ok=True)
+
+
+def save_embeddings(embeddings_path, embeddings, item_ids=None, dtype=np.float32, models_dir=None):
+    """Écrit des embeddings bruts (`.npy`) puis leur store, et invalide leurs dépendances (cf. `refresh_dependents`)."""
+    embeddings_path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(embeddings_path, embeddings)
+    refresh_dependents(embeddings_path, item_ids, dtype=dtype, models_dir=models_dir)
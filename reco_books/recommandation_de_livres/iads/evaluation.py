@@ -1,4 +1,135 @@
 import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from recommandation_de_livres.iads.mf_scoring import as_scorer, lookup_ids
+from recommandation_de_livres.iads.topk_utils import top_k_indices
+
+
+def predictions_to_arrays(predictions):
+    """
+    Convertit une liste de prédictions Surprise en tableaux NumPy.
+
+    Args:
+        predictions (list of tuples) : Liste de prédictions au format Surprise `(uid, iid, true_r, est, details)`
+
+    Returns:
+        tuple:
+            - user_ids (np.array) : ID des utilisateurs
+            - item_ids (np.array) : ID des livres
+            - true_r (np.array) : Notes réelles
+            - est (np.array) : Notes estimées
+    """
+    if len(predictions) == 0:
+        empty = np.array([], dtype=np.float64)
+        return np.array([], dtype=object), np.array([], dtype=object), empty, empty
+    user_ids, item_ids, true_r, est, _ = zip(*predictions)
+    return (np.asarray(user_ids, dtype=object), np.asarray(item_ids, dtype=object),
+            np.asarray(true_r, dtype=np.float64), np.asarray(est, dtype=np.float64))
+
+
+def rmse_mae(true_r, est):
+    """
+    Calcule la RMSE et la MAE des notes estimées.
+
+    Args:
+        true_r (np.array) : Notes réelles
+        est (np.array) : Notes estimées
+
+    Returns:
+        tuple: (rmse, mae)
+    """
+    errors = np.asarray(est, dtype=np.float64) - np.asarray(true_r, dtype=np.float64)
+    return float(np.sqrt(np.mean(errors ** 2))), float(np.mean(np.abs(errors)))
+
+
+def _segments(user_codes, key):
+    """
+    Trie les prédictions par utilisateur puis par `key` décroissant.
+
+    Returns:
+        tuple:
+            - order (np.array) : Permutation des prédictions
+            - starts (np.array) : Début de chaque segment utilisateur dans l'ordre trié
+            - rank (np.array) : Rang de chaque prédiction triée dans son segment
+    """
+    order = np.lexsort((-key, user_codes))
+    sorted_codes = user_codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    lengths = np.diff(np.r_[starts, len(order)])
+    rank = np.arange(len(order)) - np.repeat(starts, lengths)
+    return order, starts, rank
+
+
+def _ideal_dcg(n_rel, k):
+    """DCG idéal pour `n_rel` livres pertinents, tronqué à K."""
+    discounts = np.r_[0.0, np.cumsum(1.0 / np.log2(np.arange(2, k + 2)))]
+    return discounts[np.minimum(n_rel, k)]
+
+
+def _safe_divide(num, den):
+    """Division élément par élément, 0 quand le dénominateur est nul."""
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    return np.divide(num, den, out=np.zeros_like(num), where=den != 0)
+
+
+def ranking_metrics(user_ids, true_r, est, k=10, threshold=3.5):
+    """
+    Calcule les métriques de classement @K sur des paires (utilisateur, livre) notées.
+
+    Les prédictions sont triées en une seule fois par utilisateur puis par note estimée,
+    et les compteurs de chaque utilisateur sont obtenus avec `np.add.reduceat`.
+
+    - Precision@K et Recall@K suivent la définition de Surprise : un livre est recommandé
+      s'il est dans le top K et que sa note estimée dépasse le seuil.
+    - NDCG@K, MAP@K et HitRate@K considèrent tout le top K, avec une pertinence binaire
+      (note réelle >= seuil).
+
+    Args:
+        user_ids (np.array) : ID des utilisateurs
+        true_r (np.array) : Notes réelles
+        est (np.array) : Notes estimées
+        k (int, optional) : Taille du top. Defaults to 10.
+        threshold (float, optional) : Seuil au-dessus duquel une note est considérée comme positive. Defaults to 3.5.
+
+    Returns:
+        dict : Moyennes sur les utilisateurs de Precision@K, Recall@K, NDCG@K, MAP@K et HitRate@K
+    """
+    true_r = np.asarray(true_r, dtype=np.float64)
+    est = np.asarray(est, dtype=np.float64)
+    if len(est) == 0:
+        return {"Precision@K": 0.0, "Recall@K": 0.0, "NDCG@K": 0.0, "MAP@K": 0.0, "HitRate@K": 0.0}
+
+    user_codes = pd.factorize(np.asarray(user_ids, dtype=object))[0]
+    order, starts, rank = _segments(user_codes, est)
+    true_r, est = true_r[order], est[order]
+
+    in_top = rank < k
+    relevant = true_r >= threshold
+    recommended = in_top & (est >= threshold)
+    hits = in_top & relevant
+
+    n_rel = np.add.reduceat(relevant.astype(np.int64), starts)
+    n_rec_k = np.add.reduceat(recommended.astype(np.int64), starts)
+    n_rel_and_rec_k = np.add.reduceat((recommended & relevant).astype(np.int64), starts)
+    n_hits = np.add.reduceat(hits.astype(np.int64), starts)
+
+    dcg = np.add.reduceat(np.where(hits, 1.0 / np.log2(rank + 2), 0.0), starts)
+
+    # Précision au rang de chaque succès : succès cumulés dans le segment / (rang + 1)
+    cum_hits = np.cumsum(hits)
+    cum_hits -= np.repeat(cum_hits[starts] - hits[starts], np.diff(np.r_[starts, len(hits)]))
+    sum_precisions = np.add.reduceat(np.where(hits, cum_hits / (rank + 1), 0.0), starts)
+
+    return {
+        "Precision@K": float(np.mean(_safe_divide(n_rel_and_rec_k, n_rec_k))),
+        "Recall@K": float(np.mean(_safe_divide(n_rel_and_rec_k, n_rel))),
+        "NDCG@K": float(np.mean(_safe_divide(dcg, _ideal_dcg(n_rel, k)))),
+        "MAP@K": float(np.mean(_safe_divide(sum_precisions, np.minimum(n_rel, k)))),
+        "HitRate@K": float(np.mean(n_hits > 0)),
+    }
+
 
 def precision_recall_at_k(predictions, k=10, threshold=3.5):
     """
@@ -10,22 +141,108 @@ def precision_recall_at_k(predictions, k=10, threshold=3.5):
         threshold (float, optional) : Seuil au-dessus duquel une note est considérée comme positive. Defaults to 3.5.
 
     Returns:
-        tuple: 
+        tuple:
             - precision_mean (float) : Moyenne des Precision@K pour tous les utilisateurs
             - recall_mean (float) : Moyenne des Recall@K pour tous les utilisateurs
     """
-    user_est_true = {}
-    for uid, _, true_r, est, _ in predictions:
-        user_est_true.setdefault(uid, []).append((est, true_r))
+    user_ids, _, true_r, est = predictions_to_arrays(predictions)
+    metrics = ranking_metrics(user_ids, true_r, est, k=k, threshold=threshold)
+    return metrics["Precision@K"], metrics["Recall@K"]
+
+
+def _sparse_hits(matrix, top_idx):
+    """
+    Indique pour chaque ligne de `top_idx` si les colonnes retenues sont présentes dans la matrice CSR `matrix`.
+
+    Les couples (ligne, colonne) non nuls sont codés en clés `ligne * n_colonnes + colonne`, croissantes
+    si les indices de `matrix` sont triés : une recherche dichotomique remplace la densification du bloc.
+    """
+    n_cols = matrix.shape[1]
+    keys = np.repeat(np.arange(matrix.shape[0], dtype=np.int64), np.diff(matrix.indptr)) * n_cols + matrix.indices
+    wanted = np.arange(len(top_idx), dtype=np.int64)[:, None] * n_cols + top_idx
+    if len(keys) == 0:
+        return np.zeros(wanted.shape, dtype=bool)
+    return keys[np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)] == wanted
+
+
+def full_catalog_metrics(model, test_users, test_items, test_ratings, k=10, threshold=3.5,
+                         train_users=None, train_items=None, block_size=512):
+    """
+    Évalue le classement sur tout le catalogue : pour chaque utilisateur du test, tous les livres
+    qu'il n'a pas notés dans le train sont scorés, et le top K est comparé à ses livres pertinents du test.
+
+    Les utilisateurs sont scorés par blocs (un produit matriciel par bloc) et les utilisateurs sans
+    livre pertinent dans le test sont ignorés.
+
+    Args:
+        model (MFScorer ou surprise.AlgoBase) : Modèle entraîné sur le train
+        test_users (np.array) : ID des utilisateurs du test
+        test_items (np.array) : ID des livres du test
+        test_ratings (np.array) : Notes du test
+        k (int, optional) : Taille du top. Defaults to 10.
+        threshold (float, optional) : Seuil au-dessus duquel une note est considérée comme positive. Defaults to 3.5.
+        train_users (np.array, optional) : ID des utilisateurs du train, pour exclure les livres déjà notés
+        train_items (np.array, optional) : ID des livres du train
+        block_size (int, optional) : Nombre d'utilisateurs scorés à la fois. Defaults to 512.
+
+    Returns:
+        dict : Precision@K, Recall@K, NDCG@K, MAP@K, HitRate@K et CatalogCoverage
+    """
+    scorer = as_scorer(model)
+    user_index = pd.Index(scorer.user_ids)
+
+    relevant = pd.DataFrame({"user_id": np.asarray(test_users, dtype=object),
+                             "item_id": np.asarray(test_items, dtype=object)})
+    relevant = relevant[np.asarray(test_ratings, dtype=np.float64) >= threshold].drop_duplicates()
+    rel_users = relevant["user_id"].to_numpy()
+    rel_items = scorer.item_index(relevant["item_id"].to_numpy())
+    # Les livres inconnus du modèle ne peuvent pas être recommandés mais restent pertinents
+    user_codes, eval_users = pd.factorize(rel_users)
+    n_rel = np.bincount(user_codes, minlength=len(eval_users))
+    known = rel_items >= 0
+    rel_matrix = sp.csr_matrix((np.ones(known.sum(), dtype=bool), (user_codes[known], rel_items[known])),
+                               shape=(len(eval_users), scorer.n_items))
+    rel_matrix.sort_indices()
+
+    train_matrix = None
+    if train_users is not None:
+        train_codes = pd.Index(eval_users).get_indexer(np.asarray(train_users, dtype=object))
+        train_item_codes = scorer.item_index(train_items)
+        keep = (train_codes >= 0) & (train_item_codes >= 0)
+        train_matrix = sp.csr_matrix((np.ones(keep.sum(), dtype=bool), (train_codes[keep], train_item_codes[keep])),
+                                     shape=(len(eval_users), scorer.n_items))
+
+    inner_uids = lookup_ids(user_index, eval_users)
+    n_hits = np.zeros(len(eval_users))
+    dcg = np.zeros(len(eval_users))
+    sum_precisions = np.zeros(len(eval_users))
+    recommended = np.zeros(scorer.n_items, dtype=bool)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+
+    for start in range(0, len(eval_users), block_size):
+        stop = min(start + block_size, len(eval_users))
+        scores = scorer.score_users(inner_uids[start:stop])
+        if train_matrix is not None:
+            # Livres déjà notés masqués à partir de la structure CSR du bloc, sans la densifier
+            block = train_matrix[start:stop]
+            scores[np.repeat(np.arange(stop - start), np.diff(block.indptr)), block.indices] = -np.inf
+        top_idx, top_scores = top_k_indices(scores, k)
+        recommended[top_idx[top_scores > -np.inf]] = True
 
-    precisions, recalls = {}, {}
-    for uid, ratings in user_est_true.items():
-        ratings.sort(key=lambda x: x[0], reverse=True)  # Tri par score estimé décroissant
-        n_rel = sum(true_r >= threshold for (_, true_r) in ratings)
-        n_rec_k = sum(est >= threshold for (est, _) in ratings[:k])
-        n_rel_and_rec_k = sum((true_r >= threshold) and (est >= threshold) for (est, true_r) in ratings[:k])
+        hits = _sparse_hits(rel_matrix[start:stop], top_idx)
+        n_hits[start:stop] = hits.sum(axis=1)
+        dcg[start:stop] = hits @ discounts[:hits.shape[1]]
+        sum_precisions[start:stop] = (hits * np.cumsum(hits, axis=1) / np.arange(1, hits.shape[1] + 1)).sum(axis=1)
 
-        precisions[uid] = n_rel_and_rec_k / n_rec_k if n_rec_k != 0 else 0
-        recalls[uid] = n_rel_and_rec_k / n_rel if n_rel != 0 else 0
+    if len(eval_users) == 0:
+        return {"Precision@K": 0.0, "Recall@K": 0.0, "NDCG@K": 0.0, "MAP@K": 0.0, "HitRate@K": 0.0,
+                "CatalogCoverage": 0.0}
+    return {
+        "Precision@K": float(np.mean(n_hits / k)),
+        "Recall@K": float(np.mean(n_hits / n_rel)),
+        "NDCG@K": float(np.mean(dcg / _ideal_dcg(n_rel, k))),
+        "MAP@K": float(np.mean(sum_precisions / np.minimum(n_rel, k))),
+        "HitRate@K": float(np.mean(n_hits > 0)),
+        "CatalogCoverage": float(recommended.mean()),
+    }
 
-    return np.mean(list(precisions.values())), np.mean(list(recalls.values()))
\ No newline at end of file
@@ -0,0 +1,101 @@
+import numpy as np
+
+
+def fold_in_path(model_path):
+    """Retourne le chemin du fichier des facteurs mis à jour, rangé à côté du modèle."""
+    return model_path.with_name(f"{model_path.stem}_foldin.npz")
+
+
+def fold_in_user(scorer, user_id, item_ids, ratings, reg=0.02, n_sgd_steps=0, lr=0.005):
+    """
+    Calcule le vecteur latent d'un utilisateur sans réentraîner le modèle.
+
+    Les facteurs des livres sont figés et le vecteur utilisateur (et son biais pour un modèle biaisé)
+    est obtenu par moindres carrés régularisés :
+        (Q^T Q + reg * I) x = Q^T (r - moyenne - b_i)
+    Quelques pas de SGD en ligne peuvent ensuite ajuster les vecteurs des livres notés.
+
+    Args:
+        scorer (MFScorer) : Scorer du modèle collaboratif, mis à jour en place
+        user_id (int ou str) : ID de l'utilisateur
+        item_ids (np.array) : item_id des livres notés par l'utilisateur
+        ratings (np.array) : Notes correspondantes
+        reg (float, optional) : Régularisation. Defaults to 0.02.
+        n_sgd_steps (int, optional) : Nombre de pas de SGD sur les livres notés. Defaults to 0.
+        lr (float, optional) : Taux d'apprentissage de la SGD. Defaults to 0.005.
+
+    Returns:
+        tuple ou None : (pu, bu) de l'utilisateur, None si aucun livre noté n'est connu du modèle
+    """
+    items = scorer.item_index(item_ids)
+    known = items >= 0
+    if not known.any():
+        return None
+    items = items[known]
+    ratings = np.asarray(ratings, dtype=np.float64)[known]
+
+    qi, bi = scorer.item_factors(items)
+
+    d = qi.shape[1]
+    if scorer.biased:
+        target = ratings - scorer.global_mean - bi
+        # Le biais utilisateur est résolu comme une composante supplémentaire de poids 1
+        features = np.hstack([qi, np.ones((len(items), 1))])
+        solution = np.linalg.solve(features.T @ features + reg * np.eye(d + 1), features.T @ target)
+        pu, bu = solution[:d], solution[d]
+    else:
+        pu = np.linalg.solve(qi.T @ qi + reg * np.eye(d), qi.T @ ratings)
+        bu = 0.0
+
+    for _ in range(n_sgd_steps):
+        est = qi @ pu + (scorer.global_mean + bu + bi if scorer.biased else 0)
+        err = ratings - est
+        qi += lr * (err[:, None] * pu - reg * qi)
+        if scorer.biased:
+            bi += lr * (err - reg * bi)
+
+    scorer.set_user_factors(user_id, pu, bu)
+    if n_sgd_steps > 0:
+        scorer.set_item_factors(items, qi, bi)
+    return pu, bu
+
+
+def save_fold_in(scorer, path):
+    """
+    Sauvegarde les facteurs calculés par fold-in (utilisateurs et livres mis à jour).
+
+    Args:
+        scorer (MFScorer) : Scorer contenant les facteurs mis à jour
+        path (Path) : Chemin du fichier npz
+    """
+    user_ids = np.array(list(scorer.folded_users.keys()), dtype=str)
+    d = scorer.qi.shape[1]
+    pu = np.array([v[0] for v in scorer.folded_users.values()]).reshape(len(user_ids), d)
+    bu = np.array([v[1] for v in scorer.folded_users.values()], dtype=np.float64)
+    item_inner = np.fromiter(scorer.item_overrides.keys(), dtype=np.int64, count=len(scorer.item_overrides))
+    qi = np.array([v[0] for v in scorer.item_overrides.values()]).reshape(len(item_inner), d)
+    bi = np.array([v[1] for v in scorer.item_overrides.values()], dtype=np.float64)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        np.savez(f, user_ids=user_ids, pu=pu, bu=bu, item_inner=item_inner, qi=qi, bi=bi)
+
+
+def load_fold_in(scorer, path):
+    """
+    Applique au scorer les facteurs sauvegardés par `save_fold_in`, si le fichier existe.
+
+    Args:
+        scorer (MFScorer) : Scorer du modèle
+        path (Path) : Chemin du fichier npz
+
+    Returns:
+        MFScorer : Le scorer mis à jour
+    """
+    if not path.exists():
+        return scorer
+    with np.load(path) as f:
+        for user_id, pu, bu in zip(f["user_ids"], f["pu"], f["bu"]):
+            scorer.set_user_factors(str(user_id), pu, bu)
+        scorer.set_item_factors(f["item_inner"], f["qi"], f["bi"] if scorer.biased else None)
+    return scorer
@@ -0,0 +1,82 @@
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from recommandation_de_livres.iads.catalog_index import normalize_title, normalize_titles
+from recommandation_de_livres.iads.trigram_index import TrigramIndex
+
+
+def _similarity_function():
+    """
+    Similarité entre deux chaînes dans [0, 1] : `rapidfuzz` (optionnel, en C) si disponible,
+    sinon le ratio de `difflib.SequenceMatcher` utilisé par `difflib.get_close_matches`.
+    """
+    try:
+        from rapidfuzz.fuzz import ratio
+    except ImportError:
+        return lambda a, b: SequenceMatcher(None, a, b).ratio()
+    return lambda a, b: ratio(a, b) / 100
+
+
+class FuzzyTitleMatcher:
+    """
+    Recherche approchée de titres, construite une fois par dataset.
+
+    Les candidats sont les titres partageant le plus de trigrammes de caractères avec la saisie
+    (`TrigramIndex`) ; seuls ces candidats sont comparés à la saisie avec une similarité d'édition,
+    au lieu de parcourir tout le catalogue comme `difflib.get_close_matches`.
+    """
+
+    def __init__(self, titles, trigrams):
+        """
+        Args:
+            titles (list) : Titres normalisés, un par ligne du catalogue
+            trigrams (TrigramIndex) : Index des trigrammes de `titles`
+        """
+        self.titles = titles
+        self.trigrams = trigrams
+        self._similarity = _similarity_function()
+
+    def __len__(self):
+        return len(self.titles)
+
+    @classmethod
+    def from_titles(cls, titles):
+        """Construit le matcher à partir de titres bruts (normalisés ici, cf. `catalog_index.normalize_titles`)."""
+        titles = normalize_titles(titles).tolist()
+        return cls(titles, TrigramIndex.build(titles))
+
+    @classmethod
+    def from_books(cls, books, column="title"):
+        """Construit le matcher sur une colonne de titres d'un DataFrame (lignes = positions dans `books`)."""
+        return cls.from_titles(books[column])
+
+    def match(self, query, n=3, cutoff=0.6, n_candidates=50):
+        """
+        Retourne les titres les plus proches d'une saisie libre.
+
+        Args:
+            query (str) : Titre saisi
+            n (int, optional) : Nombre maximal de résultats. Defaults to 3.
+            cutoff (float, optional) : Similarité minimale (entre 0 et 1). Defaults to 0.6.
+            n_candidates (int, optional) : Nombre de candidats trigrammes vérifiés. Defaults to 50.
+
+        Returns:
+            tuple:
+                - rows (np.array) : Lignes des titres retenus, par similarité décroissante
+                - scores (np.array) : Similarités correspondantes
+        """
+        q = normalize_title(query)
+        candidates, _ = self.trigrams.candidates(q, n=max(n, n_candidates))
+        scores = np.array([self._similarity(q, self.titles[row]) for row in candidates], dtype=np.float64)
+        keep = scores >= cutoff
+        candidates, scores = candidates[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")[:n]
+        return candidates[order], scores[order]
+
+    def best(self, query, cutoff=0.6):
+        """Ligne et similarité du titre le plus proche, ou (-1, 0.0) si aucun ne dépasse `cutoff`."""
+        rows, scores = self.match(query, n=1, cutoff=cutoff)
+        if len(rows) == 0:
+            return -1, 0.0
+        return int(rows[0]), float(scores[0])
@@ -1,13 +1,21 @@
 import numpy as np
-from recommandation_de_livres.iads.content_utils import recommandation_content_top_k
+from recommandation_de_livres.iads.catalog_index import CatalogIndex
+from recommandation_de_livres.iads.content_utils import recommandation_content_batch_top_k
 from recommandation_de_livres.iads.collabo_utils import recommandation_collaborative_top_k
+from recommandation_de_livres.iads.interaction_index import InteractionIndex
+from recommandation_de_livres.iads.topk_utils import top_k_indices
 
 def recommandation_hybride(user_id, collaborative_model, content_model,
                                       content_df, collaborative_df, books,
                                       embeddings, knn=None,
-                                      alpha=0.5, k=5, top_k_content=10):
+                                      alpha=0.5, k=5, top_k_content=10, index=None, store=None,
+                                      catalog=None, books_catalog=None):
     """
     Recommandation hybride vectorisée utilisant collaboratif + contenu (Word2Vec / SBERT) avec KNN optionnel.
+
+    Les voisins de tous les livres collaboratifs sont cherchés en une fois ; les scores pondérés sont
+    accumulés sur ces seuls candidats, puis normalisés et triés partiellement. Les livres déjà notés
+    par l'utilisateur sont exclus.
     
     Args:
         user_id : identifiant utilisateur
@@ -21,66 +29,80 @@ def recommandation_hybride(user_id, collaborative_model, content_model,
         alpha : poids du score collaboratif (0=contenu, 1=collaboratif)
         k : nombre de recommandations finales
         top_k_content : nombre de voisins content-based par livre collaboratif
+        index : index des interactions précalculé (InteractionIndex, optionnel)
+        store : embeddings normalisés (EmbeddingStore, optionnel)
+        catalog : index du catalogue `content_df` (CatalogIndex, optionnel)
+        books_catalog : index du catalogue `books` pour la reco collaborative (CatalogIndex, optionnel)
         
     Returns:
         pd.DataFrame : top k livres recommandés avec colonne 'score_hybride'
     """
 
+    if index is None:
+        index = InteractionIndex.from_ratings(collaborative_df)
+
     # --- Reco collaborative top-k ---
     recos_collab, top_k_rating = recommandation_collaborative_top_k(
         k=k, user_id=user_id, model=collaborative_model,
-        ratings=collaborative_df, books=books
+        ratings=collaborative_df, books=books, index=index, catalog=books_catalog
     )
     if recos_collab is None or recos_collab.empty:
         return None
 
     # --- Préparer data ---
-    content_df = content_df.copy()
-    content_df['item_id'] = content_df['item_id'].astype(str)
-    isbn_collab = np.array([str(x) for x in top_k_rating['item_id']])
-    score_collab = np.array(top_k_rating['note_predite'].tolist())
-
-    id_to_index = {item: idx for idx, item in enumerate(content_df['item_id'])}
-    score_content_global = np.zeros(len(content_df))
+    if catalog is None:
+        catalog = CatalogIndex.from_books(content_df)
+    score_collab = top_k_rating['note_predite'].to_numpy(dtype=np.float64)
+    ref_rows = catalog.rows(top_k_rating['item_id'].to_numpy())
+    found = ref_rows >= 0
+    ref_rows, score_collab = ref_rows[found], score_collab[found]
 
-    # --- Calcul content-based pour chaque livre collaboratif ---
-    for i, isbn in enumerate(isbn_collab):
-        if isbn not in id_to_index:
-            continue
-        ref_index = id_to_index[isbn]
-        s_collab = score_collab[i]
-
-        # Utilisation KNN si fourni, sinon calcul classique
-        top_books, sim = recommandation_content_top_k(
-            content_df.iloc[ref_index]['title'],
-            embeddings,
-            content_model,
-            content_df,
-            knn=knn,
-            k=top_k_content
+    # --- Calcul content-based des voisins de tous les livres collaboratifs en une recherche ---
+    neighbors, weighted = np.empty(0, dtype=np.int64), np.empty(0)
+    if len(ref_rows):
+        neighbors, sim = recommandation_content_batch_top_k(
+            ref_rows, embeddings, content_df, knn=knn, k=top_k_content, store=store, catalog=catalog
         )
+        valid = neighbors >= 0
 
-        # Normaliser les similarités par livre
-        sim_norm = (sim - sim.min()) / (sim.max() - sim.min() + 1e-8)
-        score_content_global[top_books.index] += sim_norm * s_collab
+        # Normaliser les similarités par livre, pondérées par la note collaborative du livre de départ
+        sim_min = np.where(valid, sim, np.inf).min(axis=1, keepdims=True)
+        sim_max = np.where(valid, sim, -np.inf).max(axis=1, keepdims=True)
+        sim_norm = (sim - sim_min) / (sim_max - sim_min + 1e-8)
+        neighbors, weighted = neighbors[valid], (sim_norm * score_collab[:, None])[valid]
 
-    # --- Normalisation content et collaboratif ---
-    score_content_norm = (score_content_global - score_content_global.min()) / \
-                         (score_content_global.max() - score_content_global.min() + 1e-8)
+    # --- Scores accumulés sur les seuls candidats (livres collaboratifs et leurs voisins) ---
+    candidates, inverse = np.unique(np.concatenate([ref_rows, neighbors.ravel()]), return_inverse=True)
+    score_collab_cand = np.zeros(len(candidates))
+    score_collab_cand[inverse[:len(ref_rows)]] = score_collab
+    score_content_cand = np.zeros(len(candidates))
+    np.add.at(score_content_cand, inverse[len(ref_rows):], weighted)
 
-    score_collab_global = np.zeros(len(content_df))
-    indices_in_df = [id_to_index[isbn] for isbn in isbn_collab if isbn in id_to_index]
-    score_collab_global[indices_in_df] = [score_collab[i] for i, isbn in enumerate(isbn_collab) if isbn in id_to_index]
-    score_collab_norm = (score_collab_global - score_collab_global.min()) / \
-                        (score_collab_global.max() - score_collab_global.min() + 1e-8)
+    # --- Score final hybride (les livres hors candidats ont des scores nuls) ---
+    score_final = alpha * _minmax_candidates(score_collab_cand, len(catalog)) + \
+        (1 - alpha) * _minmax_candidates(score_content_cand, len(catalog))
 
-    # --- Score final hybride ---
-    score_final = alpha * score_collab_norm + (1 - alpha) * score_content_norm
+    # Exclure les livres déjà notés par l'utilisateur (et les autres éditions du même titre)
+    rated_rows = catalog.rows(index.rated_item_ids(user_id))
+    rated_titles = catalog.title_codes[rated_rows[rated_rows >= 0]]
+    exclude = np.isin(catalog.title_codes[candidates], rated_titles)
 
-    result_df = content_df.copy()
-    result_df['score_hybride'] = score_final
+    best, best_scores = top_k_indices(score_final, k, exclude=exclude)
+    best, best_scores = best[np.isfinite(best_scores)], best_scores[np.isfinite(best_scores)]
+    result_df = catalog.frame(candidates[best])
+    result_df['item_id'] = result_df['item_id'].astype(str)
+    result_df['score_hybride'] = best_scores
+    return result_df
 
-    # Exclure livres déjà vus
-    result_df = result_df.sort_values('score_hybride', ascending=False)
 
-    return result_df.head(k)
\ No newline at end of file
+def _minmax_candidates(scores, n_total):
+    """
+    Normalise dans [0, 1] les scores des candidats comme si tout le catalogue était normalisé :
+    les livres hors candidats ont un score nul, qui entre dans le minimum et le maximum.
+    """
+    if len(scores) == 0:
+        return scores
+    low, high = scores.min(), scores.max()
+    if len(scores) < n_total:
+        low, high = min(low, 0.0), max(high, 0.0)
+    return (scores - low) / (high - low + 1e-8)
@@ -0,0 +1,151 @@
+from concurrent.futures import ProcessPoolExecutor
+import time
+
+import numpy as np
+import pandas as pd
+from surprise import Dataset, Reader
+
+from recommandation_de_livres.iads.cross_validation import ALGORITHMS
+from recommandation_de_livres.iads.evaluation import rmse_mae
+from recommandation_de_livres.iads.mf_scoring import MFScorer
+
+# Espaces de recherche : liste = choix discret, ("log", a, b) = tirage log-uniforme dans [a, b]
+SEARCH_SPACES = {
+    "SVD": {
+        "n_factors": [20, 50, 100, 150, 200],
+        "lr_all": ("log", 1e-3, 2e-2),
+        "reg_all": ("log", 5e-3, 1e-1),
+    },
+    "NMF": {
+        "n_factors": [10, 20, 50, 100],
+        "reg_pu": ("log", 1e-2, 2e-1),
+        "reg_qi": ("log", 1e-2, 2e-1),
+    },
+}
+
+# État partagé par les processus du pool, initialisé une fois par worker
+_STATE = {}
+
+
+def sample_configs(model_name, n_trials, seed=42):
+    """
+    Tire des configurations aléatoires dans l'espace de recherche de l'algorithme.
+
+    Args:
+        model_name (str) : SVD ou NMF
+        n_trials (int) : Nombre de configurations
+        seed (int, optional) : Graine du tirage. Defaults to 42.
+
+    Returns:
+        list : Liste de dictionnaires d'hyperparamètres
+    """
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n_trials):
+        config = {}
+        for name, space in SEARCH_SPACES[model_name].items():
+            if isinstance(space, tuple):
+                _, low, high = space
+                config[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+            else:
+                config[name] = space[int(rng.integers(len(space)))]
+        configs.append(config)
+    return configs
+
+
+def init_worker(state):
+    """Initialise l'état partagé d'un worker du pool et construit le trainset une seule fois."""
+    _STATE.clear()
+    _STATE.update(state)
+    train = state["train"]
+    _STATE["trainset"] = Dataset.load_from_df(train, Reader(rating_scale=state["rating_scale"])).build_full_trainset()
+
+
+def evaluate_trial(model_name, params, n_epochs):
+    """
+    Entraîne une configuration pendant `n_epochs` epochs et calcule la RMSE sur la validation.
+
+    Returns:
+        tuple: (rmse, temps d'entraînement en secondes)
+    """
+    start = time.time()
+    algo = ALGORITHMS[model_name](n_epochs=n_epochs, **params)
+    algo.fit(_STATE["trainset"])
+    valid = _STATE["valid"]
+    est = MFScorer.from_surprise(algo).predict_pairs(valid["user_id"].to_numpy(dtype=object),
+                                                     valid["item_id"].to_numpy(dtype=object))
+    rmse, _ = rmse_mae(valid["rating"].to_numpy(dtype=np.float64), est)
+    return rmse, time.time() - start
+
+
+def successive_halving(ratings, model_name, n_trials=27, min_epochs=5, max_epochs=45, eta=3, valid_size=0.2,
+                       rating_scale=(1, 5), seed=42, n_workers=None, callback=None):
+    """
+    Recherche d'hyperparamètres par successive halving.
+
+    Toutes les configurations sont entraînées avec un petit budget d'epochs ; seul le meilleur tiers
+    (1 / eta) est conservé et réentraîné avec un budget eta fois plus grand, jusqu'à `max_epochs`.
+    Surprise ne sait pas reprendre un entraînement, chaque palier réentraîne donc depuis le début :
+    les configurations perdantes sont éliminées avant les entraînements longs.
+
+    Args:
+        ratings (pd.DataFrame) : DataFrame contenant ['user_id', 'item_id', 'rating']
+        model_name (str) : SVD ou NMF
+        n_trials (int, optional) : Nombre de configurations du premier palier. Defaults to 27.
+        min_epochs (int, optional) : Budget d'epochs du premier palier. Defaults to 5.
+        max_epochs (int, optional) : Budget d'epochs maximal. Defaults to 45.
+        eta (int, optional) : Facteur de réduction entre deux paliers. Defaults to 3.
+        valid_size (float, optional) : Part des notes gardée pour la validation. Defaults to 0.2.
+        rating_scale (tuple, optional) : Échelle des notes. Defaults to (1, 5).
+        seed (int, optional) : Graine du tirage et du découpage. Defaults to 42.
+        n_workers (int, optional) : Nombre de processus (défaut : nombre de CPU). Defaults to None.
+        callback (callable, optional) : Fonction appelée avec le tableau des essais à la fin de chaque palier
+
+    Returns:
+        tuple:
+            - best (dict) : Meilleure configuration (hyperparamètres, n_epochs, rmse)
+            - trials (pd.DataFrame) : Tableau de tous les essais (un par configuration et par palier)
+    """
+    ratings = ratings[["user_id", "item_id", "rating"]].reset_index(drop=True)
+    permutation = np.random.default_rng(seed).permutation(len(ratings))
+    n_valid = int(len(ratings) * valid_size)
+    state = {
+        "train": ratings.iloc[permutation[n_valid:]],
+        "valid": ratings.iloc[permutation[:n_valid]],
+        "rating_scale": rating_scale,
+    }
+
+    configs = dict(enumerate(sample_configs(model_name, n_trials, seed)))
+    alive = list(configs)
+    records = []
+    n_epochs, rung = min_epochs, 0
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(state,)) as pool:
+        while alive:
+            futures = {trial: pool.submit(evaluate_trial, model_name, configs[trial], n_epochs) for trial in alive}
+            scores = {}
+            for trial, future in futures.items():
+                rmse, fit_time = future.result()
+                scores[trial] = rmse
+                records.append({"trial": trial, "rung": rung, "n_epochs": n_epochs, **configs[trial],
+                                "rmse": rmse, "fit_time": fit_time, "status": "pruned"})
+
+            # Au dernier palier, toutes les configurations restantes ont reçu le budget complet
+            last_rung = n_epochs >= max_epochs
+            survivors = set(alive) if last_rung else set(sorted(alive, key=scores.get)[:max(1, len(alive) // eta)])
+            for record in records[-len(alive):]:
+                if record["trial"] in survivors:
+                    record["status"] = "completed" if last_rung else "promoted"
+
+            if callback is not None:
+                callback(pd.DataFrame(records))
+            if last_rung:
+                break
+            alive = sorted(survivors)
+            n_epochs, rung = min(n_epochs * eta, max_epochs), rung + 1
+
+    trials = pd.DataFrame(records)
+    completed = trials[trials["status"] == "completed"]
+    best_row = completed.loc[completed["rmse"].idxmin()]
+    best = {**configs[int(best_row["trial"])], "n_epochs": int(best_row["n_epochs"]), "rmse": float(best_row["rmse"])}
+    return best, trials
@@ -0,0 +1,291 @@
+import numpy as np
+import pandas as pd
+
+from recommandation_de_livres.iads.array_utils import storable_ids
+from recommandation_de_livres.iads.mf_scoring import lookup_ids
+
+MAX_ALIGNED = 8  # nombre de catalogues dont l'alignement est gardé en cache
+
+
+def ratings_fingerprint(ratings, start=0, previous=0):
+    """
+    Empreinte des notes (user_id, item_id, rating), sensible à l'ordre et calculable par ajout.
+
+    Chaque ligne est hachée puis multipliée par sa position ; l'empreinte est la somme modulo 2**64.
+    Pour des notes ajoutées à la fin, l'empreinte se cumule sans relire les notes existantes :
+    `ratings_fingerprint(nouvelles, start=n, previous=empreinte)`.
+
+    Args:
+        ratings (pd.DataFrame) : Notes (colonnes 'user_id', 'item_id', 'rating')
+        start (int, optional) : Position de la première ligne dans l'ensemble des notes. Defaults to 0.
+        previous (int, optional) : Empreinte des `start` premières notes. Defaults to 0.
+
+    Returns:
+        int : Empreinte des notes
+    """
+    # Identifiants hachés sous forme str : l'empreinte ne dépend pas du type (int ou str) des colonnes
+    hashed = pd.util.hash_pandas_object(pd.DataFrame({
+        "user_id": ratings["user_id"].astype(str).to_numpy(),
+        "item_id": ratings["item_id"].astype(str).to_numpy(),
+        "rating": ratings["rating"].to_numpy(dtype=np.float64),
+    }), index=False).to_numpy()
+    positions = np.arange(start + 1, start + len(hashed) + 1, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        return int(np.uint64(previous) + (hashed * positions).sum(dtype=np.uint64))
+
+
+def _extend_ids(ids, new_ids):
+    """Ajoute des identifiants à la fin d'un tableau d'identifiants (dtype sauvegardable sans pickle)."""
+    if len(new_ids) == 0:
+        return ids
+    ids = np.concatenate([np.asarray(ids, dtype=object), np.asarray(new_ids, dtype=object)])
+    if pd.api.types.infer_dtype(ids, skipna=False) == "integer":
+        ids = ids.astype(np.int64)
+    return storable_ids(ids)
+
+
+class InteractionIndex:
+    """
+    Index des interactions utilisateur -> livres au format CSR.
+
+    Les utilisateurs et les livres sont codés par des entiers. Pour l'utilisateur de code u,
+    `indices[indptr[u]:indptr[u + 1]]` donne les codes des livres notés et `data` les notes associées.
+    Chaque livre est aussi rattaché à un groupe de titre (`item_groups`) pour pouvoir exclure
+    toutes les éditions d'un livre déjà noté.
+    """
+
+    def __init__(self, user_ids, item_ids, indptr, indices, data, item_groups, fingerprint=None):
+        """
+        Args:
+            user_ids (np.array) : Identifiants bruts des utilisateurs (indexés par code utilisateur)
+            item_ids (np.array) : Identifiants bruts des livres (indexés par code livre)
+            indptr (np.array) : Offsets CSR de taille n_users + 1
+            indices (np.array) : Codes des livres notés, regroupés par utilisateur
+            data (np.array) : Notes associées à `indices`
+            item_groups (np.array) : Identifiant du groupe de titre de chaque livre
+            fingerprint (int, optional) : Empreinte des notes indexées (cf. `ratings_fingerprint`)
+        """
+        self.user_ids = np.asarray(user_ids)
+        self.item_ids = np.asarray(item_ids)
+        self.indptr = np.asarray(indptr)
+        self.indices = np.asarray(indices)
+        self.data = np.asarray(data)
+        self.item_groups = np.asarray(item_groups)
+        self.n_groups = int(self.item_groups.max()) + 1 if len(self.item_groups) else 0
+        self.fingerprint = int(fingerprint) if fingerprint is not None else None
+        self._user_index = None
+        self._item_index = None
+        # id(catalogue) -> (catalogue, codes) : une seule entrée par catalogue, lue et écrite d'un bloc
+        self._aligned = {}
+
+    @property
+    def n_users(self):
+        return len(self.user_ids)
+
+    @property
+    def n_items(self):
+        return len(self.item_ids)
+
+    @classmethod
+    def from_ratings(cls, ratings, group_col="title"):
+        """
+        Construit l'index à partir du DataFrame des notes.
+
+        Args:
+            ratings (pd.DataFrame) : DataFrame contenant au moins ['user_id', 'item_id', 'rating']
+            group_col (str, optional) : Colonne servant à regrouper les éditions d'un même livre. Defaults to "title".
+
+        Returns:
+            InteractionIndex : Index construit
+        """
+        user_codes, user_ids = pd.factorize(ratings["user_id"], sort=True)
+        item_codes, item_ids = pd.factorize(ratings["item_id"], sort=True)
+        user_codes = user_codes.astype(np.int32)
+        item_codes = item_codes.astype(np.int32)
+
+        order = np.argsort(user_codes, kind="stable")
+        counts = np.bincount(user_codes, minlength=len(user_ids))
+        indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        # Groupe de titre de chaque livre (un groupe par livre si le titre est absent)
+        item_groups = np.arange(len(item_ids), dtype=np.int32)
+        if group_col in ratings.columns:
+            first_rows = np.unique(item_codes, return_index=True)[1]
+            group_codes, _ = pd.factorize(ratings[group_col].to_numpy()[first_rows])
+            missing = group_codes < 0
+            group_codes[missing] = group_codes.max(initial=-1) + 1 + np.arange(missing.sum())
+            item_groups = group_codes.astype(np.int32)
+
+        return cls(
+            user_ids=storable_ids(user_ids),
+            item_ids=storable_ids(item_ids),
+            indptr=indptr,
+            indices=item_codes[order],
+            data=ratings["rating"].to_numpy(dtype=np.float32)[order],
+            item_groups=item_groups,
+            fingerprint=ratings_fingerprint(ratings),
+        )
+
+    def append(self, ratings):
+        """
+        Retourne l'index complété par des notes ajoutées à la fin des notes indexées, sans les refactoriser.
+
+        Les nouveaux utilisateurs et livres reçoivent les codes suivant ceux de l'index ; les notes d'un
+        utilisateur existant sont insérées à la fin de sa tranche CSR. Un livre absent de l'index forme
+        son propre groupe de titre (les éditions sont regroupées au prochain `from_ratings`).
+
+        Args:
+            ratings (pd.DataFrame) : Nouvelles notes (colonnes 'user_id', 'item_id', 'rating')
+
+        Returns:
+            InteractionIndex : Nouvel index (l'index courant, partagé, n'est pas modifié)
+        """
+        if self._user_index is None:
+            self._user_index = pd.Index(self.user_ids)
+        if self._item_index is None:
+            self._item_index = pd.Index(self.item_ids)
+        user_ids = ratings["user_id"].to_numpy()
+        item_ids = ratings["item_id"].to_numpy()
+
+        user_codes = lookup_ids(self._user_index, user_ids).astype(np.int64)
+        new_users = user_codes < 0
+        new_user_codes, new_user_ids = pd.factorize(user_ids[new_users])
+        user_codes[new_users] = self.n_users + new_user_codes
+        item_codes = lookup_ids(self._item_index, item_ids).astype(np.int64)
+        new_items = item_codes < 0
+        new_item_codes, new_item_ids = pd.factorize(item_ids[new_items])
+        item_codes[new_items] = self.n_items + new_item_codes
+        n_users = self.n_users + len(new_user_ids)
+
+        # Chaque note est insérée à la fin de la tranche de son utilisateur (à la fin des données s'il est nouveau)
+        order = np.argsort(user_codes, kind="stable")
+        user_codes, item_codes = user_codes[order], item_codes[order]
+        ends = np.append(self.indptr[1:], np.full(len(new_user_ids), self.indptr[-1]))
+        counts = np.diff(self.indptr, append=np.full(len(new_user_ids), self.indptr[-1]))
+        counts += np.bincount(user_codes, minlength=n_users)
+        indptr = np.zeros(n_users + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return InteractionIndex(
+            user_ids=_extend_ids(self.user_ids, new_user_ids),
+            item_ids=_extend_ids(self.item_ids, new_item_ids),
+            indptr=indptr,
+            indices=np.insert(self.indices, ends[user_codes], item_codes.astype(self.indices.dtype)),
+            data=np.insert(self.data, ends[user_codes], ratings["rating"].to_numpy(dtype=np.float32)[order]),
+            item_groups=np.concatenate([self.item_groups,
+                                        self.n_groups + np.arange(len(new_item_ids), dtype=self.item_groups.dtype)]),
+            fingerprint=None if self.fingerprint is None else
+            ratings_fingerprint(ratings, start=len(self.indices), previous=self.fingerprint),
+        )
+
+    def save(self, path):
+        """Sauvegarde l'index au format npz (avec l'empreinte des notes indexées)."""
+        extra = {"fingerprint": np.uint64(self.fingerprint)} if self.fingerprint is not None else {}
+        np.savez(path, user_ids=self.user_ids, item_ids=self.item_ids, indptr=self.indptr,
+                 indices=self.indices, data=self.data, item_groups=self.item_groups, **extra)
+
+    @classmethod
+    def load(cls, path):
+        """Charge un index sauvegardé avec `save`."""
+        with np.load(path) as f:
+            return cls(**{key: f[key] for key in f.files})
+
+    def user_code(self, user_id):
+        """Retourne le code d'un utilisateur, ou -1 s'il est inconnu."""
+        if self._user_index is None:
+            self._user_index = pd.Index(self.user_ids)
+        return int(lookup_ids(self._user_index, [user_id])[0])
+
+    def item_codes(self, item_ids):
+        """
+        Aligne une liste d'item_id sur les codes livres de l'index.
+
+        Les alignements sont mis en cache par catalogue : un scorer (ou un catalogue de contenu) appelle
+        toujours l'index avec le même tableau. Chaque entrée est un tuple (catalogue, codes) lu et écrit en
+        une seule opération : l'index, partagé entre les sessions Streamlit, reste cohérent entre threads.
+
+        Args:
+            item_ids (np.array) : item_id à convertir
+
+        Returns:
+            np.array : Codes livres (-1 pour les livres absents de l'index)
+        """
+        cached = self._aligned.get(id(item_ids))
+        if cached is not None and cached[0] is item_ids:
+            return cached[1]
+        if self._item_index is None:
+            self._item_index = pd.Index(self.item_ids)
+        codes = lookup_ids(self._item_index, item_ids)
+        if len(self._aligned) >= MAX_ALIGNED:
+            self._aligned = {}
+        self._aligned[id(item_ids)] = (item_ids, codes)
+        return codes
+
+    def rated_items(self, user_id):
+        """Retourne les codes des livres notés par l'utilisateur (tranche CSR)."""
+        u = self.user_code(user_id)
+        if u < 0:
+            return self.indices[:0]
+        return self.indices[self.indptr[u]:self.indptr[u + 1]]
+
+    def rated_item_ids(self, user_id):
+        """Retourne les item_id des livres notés par l'utilisateur."""
+        return self.item_ids[self.rated_items(user_id)]
+
+    def user_ratings(self, user_id):
+        """Retourne (item_id, notes) des livres notés par l'utilisateur."""
+        u = self.user_code(user_id)
+        if u < 0:
+            return self.item_ids[:0], self.data[:0]
+        lo, hi = self.indptr[u], self.indptr[u + 1]
+        return self.item_ids[self.indices[lo:hi]], self.data[lo:hi]
+
+    def rated_groups(self, user_id):
+        """Retourne les groupes de titres déjà notés par l'utilisateur."""
+        return np.unique(self.item_groups[self.rated_items(user_id)])
+
+    def exclusion_mask(self, user_id, item_ids=None):
+        """
+        Retourne le masque des livres à exclure des recommandations d'un utilisateur.
+
+        Un livre est exclu si l'utilisateur a noté une édition du même groupe de titre.
+
+        Args:
+            user_id (int ou str) : ID de l'utilisateur
+            item_ids (np.array, optional) : Catalogue du scorer sur lequel aligner le masque.
+                                            Defaults to None (catalogue de l'index).
+
+        Returns:
+            np.array : Masque booléen aligné sur `item_ids`
+        """
+        excluded_groups = np.zeros(self.n_groups + 1, dtype=bool)
+        excluded_groups[self.item_groups[self.rated_items(user_id)]] = True
+        if item_ids is None:
+            return excluded_groups[self.item_groups]
+
+        codes = self.item_codes(item_ids)
+        # Les livres absents de l'index pointent vers la dernière case, toujours à False
+        groups = np.where(codes >= 0, self.item_groups[codes], self.n_groups)
+        return excluded_groups[groups]
+
+
+def load_interaction_index(path, ratings):
+    """
+    Charge l'index des interactions sauvegardé s'il correspond aux notes, le reconstruit et le sauvegarde sinon.
+
+    L'index correspond aux notes si leur nombre et leur empreinte (cf. `ratings_fingerprint`) sont
+    identiques : un dataset reconstruit avec le même nombre de notes n'est pas confondu avec l'ancien.
+
+    Args:
+        path (Path) : Fichier interaction_index.npz
+        ratings (pd.DataFrame) : Notes du dataset
+
+    Returns:
+        InteractionIndex : Index des notes
+    """
+    index = InteractionIndex.load(path) if path.exists() else None
+    if index is None or len(index.indices) != len(ratings) or index.fingerprint != ratings_fingerprint(ratings):
+        index = InteractionIndex.from_ratings(ratings)
+        index.save(path)
+    return index
@@ -0,0 +1,360 @@
+import numpy as np
+import pandas as pd
+
+from recommandation_de_livres.iads.topk_utils import top_k_indices
+
+
+def lookup_ids(index, raw_ids):
+    """
+    Convertit des identifiants bruts en positions dans un `pd.Index`.
+
+    Les identifiants introuvables sont recherchés une seconde fois après conversion
+    str <-> int, car les datasets chargés dans les apps convertissent parfois `user_id` en str.
+
+    Args:
+        index (pd.Index) : Index des identifiants bruts
+        raw_ids (list ou np.array) : Identifiants à rechercher
+
+    Returns:
+        np.array : Positions dans l'index (-1 si l'identifiant est inconnu)
+    """
+    raw_ids = np.asarray(raw_ids, dtype=object)
+    # pd.Index infère le dtype des identifiants : un tableau object forcerait la conversion de tout l'index
+    positions = index.get_indexer(pd.Index(list(raw_ids)))
+    missing = np.flatnonzero(positions < 0)
+    if len(missing) == 0:
+        return positions
+
+    # Identifiants convertis en une passe, puis recherchés en un seul appel à `get_indexer`
+    alt = []
+    for raw in raw_ids[missing]:
+        try:
+            alt.append(int(raw) if isinstance(raw, str) else str(raw))
+        except ValueError:
+            alt.append(None)
+    converted = np.array([a is not None for a in alt])
+    if converted.any():
+        positions[missing[converted]] = index.get_indexer(pd.Index([a for a in alt if a is not None]))
+    return positions
+
+
+class MFScorer:
+    """
+    Moteur de scoring vectorisé pour les modèles de factorisation matricielle.
+
+    Les facteurs `pu`, `qi`, les biais `bu`, `bi` et la moyenne globale sont extraits une seule fois
+    du modèle entraîné. Un utilisateur est ensuite scoré contre tout le catalogue avec un unique
+    produit matrice-vecteur, au lieu d'un appel `model.predict(uid, iid)` par livre.
+    """
+
+    def __init__(self, pu, qi, bu=None, bi=None, global_mean=0.0,
+                 user_ids=None, item_ids=None, rating_scale=None, partial_bias=True):
+        """
+        Args:
+            pu (np.array) : Facteurs utilisateurs (n_users x n_factors)
+            qi (np.array) : Facteurs livres (n_items x n_factors)
+            bu (np.array, optional) : Biais utilisateurs, None si le modèle n'est pas biaisé
+            bi (np.array, optional) : Biais livres, None si le modèle n'est pas biaisé
+            global_mean (float) : Moyenne globale des notes
+            user_ids (np.array) : Identifiants bruts des utilisateurs, indexés par leur indice interne
+            item_ids (np.array) : Identifiants bruts des livres, indexés par leur indice interne
+            rating_scale (tuple, optional) : (note_min, note_max) pour borner les prédictions
+            partial_bias (bool, optional) : Pour un modèle biaisé, prédit moyenne globale + biais connu quand
+                l'utilisateur ou le livre est inconnu (SVD) ; sinon, moyenne globale seule (NMF). Defaults to True.
+        """
+        self.pu = pu
+        self.qi = qi
+        self.bu = bu
+        self.bi = bi
+        self.global_mean = float(global_mean)
+        self.user_ids = np.asarray(user_ids if user_ids is not None else np.arange(len(pu)))
+        self.item_ids = np.asarray(item_ids if item_ids is not None else np.arange(len(qi)))
+        self.rating_scale = rating_scale
+        self.partial_bias = bool(partial_bias)
+        # Facteurs mis à jour sans réentraînement (cf. iads/fold_in.py)
+        self.folded_users = {}
+        self.item_overrides = {}
+        self._user_index = None
+        self._item_index = None
+        self._overrides = None
+
+    @property
+    def biased(self):
+        return self.bu is not None and self.bi is not None
+
+    @property
+    def n_users(self):
+        return len(self.user_ids)
+
+    @property
+    def n_items(self):
+        return len(self.item_ids)
+
+    @classmethod
+    def from_surprise(cls, model):
+        """
+        Construit le scorer à partir d'un modèle Surprise entraîné (SVD ou NMF).
+
+        Args:
+            model (surprise.AlgoBase) : Modèle entraîné possédant `pu`, `qi`, `bu`, `bi` et `trainset`
+
+        Returns:
+            MFScorer : Scorer vectorisé équivalent au modèle
+        """
+        trainset = model.trainset
+        user_ids = np.empty(trainset.n_users, dtype=object)
+        user_ids[list(trainset._raw2inner_id_users.values())] = list(trainset._raw2inner_id_users.keys())
+        item_ids = np.empty(trainset.n_items, dtype=object)
+        item_ids[list(trainset._raw2inner_id_items.values())] = list(trainset._raw2inner_id_items.keys())
+
+        biased = getattr(model, "biased", False)
+        # NMF de Surprise lève PredictionImpossible dès que l'utilisateur ou le livre est inconnu
+        # (prédiction par défaut : moyenne globale), SVD garde le biais connu
+        partial_bias = type(model).__name__ != "NMF"
+        return cls(
+            pu=np.asarray(model.pu),
+            qi=np.asarray(model.qi),
+            bu=np.asarray(model.bu) if biased else None,
+            bi=np.asarray(model.bi) if biased else None,
+            global_mean=trainset.global_mean,
+            user_ids=user_ids,
+            item_ids=item_ids,
+            rating_scale=trainset.rating_scale,
+            partial_bias=partial_bias,
+        )
+
+    def user_index(self, raw_uid):
+        """Retourne l'indice interne d'un utilisateur, ou -1 s'il est inconnu du modèle."""
+        if self._user_index is None:
+            self._user_index = pd.Index(self.user_ids)
+        return int(lookup_ids(self._user_index, [raw_uid])[0])
+
+    def item_index(self, raw_iids):
+        """Retourne les indices internes des livres (-1 pour les livres inconnus du modèle)."""
+        if self._item_index is None:
+            self._item_index = pd.Index(self.item_ids)
+        return lookup_ids(self._item_index, raw_iids)
+
+    def clip(self, est):
+        """Borne les prédictions dans l'échelle des notes, comme le fait Surprise."""
+        if self.rating_scale is None:
+            return est
+        return np.clip(est, self.rating_scale[0], self.rating_scale[1])
+
+    def user_factors(self, raw_uid):
+        """
+        Retourne les facteurs d'un utilisateur, en priorité ceux calculés par fold-in.
+
+        Args:
+            raw_uid (int ou str) : ID de l'utilisateur
+
+        Returns:
+            tuple ou None : (pu, bu) de l'utilisateur, None s'il est inconnu du modèle
+        """
+        folded = self.folded_users.get(str(raw_uid))
+        if folded is not None:
+            return folded
+        u = self.user_index(raw_uid)
+        if u < 0:
+            return None
+        return self.pu[u], (self.bu[u] if self.biased else 0.0)
+
+    def set_user_factors(self, raw_uid, pu, bu=0.0):
+        """Enregistre les facteurs d'un utilisateur calculés sans réentraînement."""
+        self.folded_users[str(raw_uid)] = (np.asarray(pu, dtype=self.qi.dtype), float(bu))
+
+    def set_item_factors(self, inner_iids, qi, bi=None):
+        """Enregistre les facteurs mis à jour de livres (indices internes) sans modifier `qi` et `bi`."""
+        for n, i in enumerate(inner_iids):
+            self.item_overrides[int(i)] = (np.asarray(qi[n], dtype=self.qi.dtype),
+                                           float(bi[n]) if bi is not None else 0.0)
+        self._overrides = None
+
+    def item_factors(self, inner_iids):
+        """Retourne les facteurs (qi, bi) des livres d'indices internes donnés, mises à jour comprises."""
+        qi = np.array(self.qi[inner_iids], dtype=np.float64)
+        bi = np.array(self.bi[inner_iids], dtype=np.float64) if self.biased else None
+        for n, i in enumerate(inner_iids):
+            override = self.item_overrides.get(int(i))
+            if override is not None:
+                qi[n] = override[0]
+                if bi is not None:
+                    bi[n] = override[1]
+        return qi, bi
+
+    def _item_overrides(self):
+        """Retourne (indices, facteurs, biais complets) des livres mis à jour, mis en cache."""
+        if self._overrides is None:
+            ids = np.fromiter(self.item_overrides.keys(), dtype=np.int64, count=len(self.item_overrides))
+            qi = np.array([v[0] for v in self.item_overrides.values()]).reshape(len(ids), self.qi.shape[1])
+            bi = None
+            if self.biased:
+                bi = np.array(self.bi, copy=True)
+                bi[ids] = [v[1] for v in self.item_overrides.values()]
+            self._overrides = (ids, qi, bi)
+        return self._overrides
+
+    def _estimate(self, pu, bu):
+        """Scores (non bornés) de facteurs utilisateurs `pu` (n x d) et biais `bu` (n,) sur tout le catalogue."""
+        ids, qi_over, bi = self._item_overrides()
+        est = pu @ self.qi.T
+        if len(ids):
+            est[:, ids] = pu @ qi_over.T
+        if self.biased:
+            est += self.global_mean + bi + np.asarray(bu)[:, None]
+        return est
+
+    def _default_scores(self):
+        """Prédiction par défaut de Surprise pour un utilisateur inconnu."""
+        if self.biased and self.partial_bias:
+            return self.global_mean + self._item_overrides()[2]
+        return np.full(self.n_items, self.global_mean)
+
+    def score_users(self, inner_uids):
+        """
+        Calcule les notes estimées (non bornées) d'un bloc d'utilisateurs pour tout le catalogue.
+
+        Un utilisateur inconnu (indice -1) reçoit la prédiction par défaut de Surprise :
+        moyenne globale + biais du livre pour SVD biaisé, moyenne globale sinon.
+
+        Args:
+            inner_uids (np.array) : Indices internes des utilisateurs
+
+        Returns:
+            np.array : Matrice des scores (n_utilisateurs x n_items)
+        """
+        inner_uids = np.asarray(inner_uids)
+        known = inner_uids >= 0
+        est = np.empty((len(inner_uids), self.n_items), dtype=np.result_type(self.qi, np.float32))
+
+        if known.any():
+            uids = inner_uids[known]
+            est[known] = self._estimate(self.pu[uids], self.bu[uids] if self.biased else np.zeros(len(uids)))
+        if not known.all():
+            est[~known] = self._default_scores()
+        return est
+
+    def score_user(self, raw_uid):
+        """Calcule les notes estimées (non bornées) d'un utilisateur pour tout le catalogue."""
+        factors = self.user_factors(raw_uid)
+        if factors is None:
+            return self._default_scores()
+        pu, bu = factors
+        return self._estimate(pu[None, :], [bu])[0]
+
+    def predict(self, raw_uid, raw_iids):
+        """
+        Prédit, comme `model.predict(uid, iid).est`, les notes d'un utilisateur pour une liste de livres.
+
+        Args:
+            raw_uid (int ou str) : ID de l'utilisateur
+            raw_iids (list) : item_id des livres
+
+        Returns:
+            np.array : Notes prédites bornées dans l'échelle des notes
+        """
+        items = self.item_index(raw_iids)
+        factors = self.user_factors(raw_uid)
+
+        # Livre inconnu : moyenne globale (+ biais utilisateur pour SVD biaisé)
+        unknown_item = self.global_mean
+        if self.biased and self.partial_bias and factors is not None:
+            unknown_item += factors[1]
+
+        est = np.where(items >= 0, self.score_user(raw_uid)[np.maximum(items, 0)], unknown_item)
+        return self.clip(est)
+
+    def _pair_scores(self, pu, bu, qi, bi, known_user, known_item):
+        """
+        Notes estimées (non bornées) de paires dont les facteurs sont alignés ligne à ligne.
+
+        Les lignes d'un utilisateur (ou d'un livre) inconnu sont ignorées : la paire reçoit la
+        prédiction par défaut de Surprise (cf. `score_users`).
+        """
+        both = known_user & known_item
+        est = np.full(len(known_user), self.global_mean)
+        est[both] = np.einsum("ij,ij->i", pu[both], qi[both])
+        if self.biased:
+            biased_user = known_user if self.partial_bias else both
+            biased_item = known_item if self.partial_bias else both
+            est[both] += self.global_mean
+            est[biased_user] += bu[biased_user]
+            est[biased_item] += bi[biased_item]
+        return est
+
+    def predict_pairs(self, raw_uids, raw_iids):
+        """
+        Prédit les notes d'une liste de paires (utilisateur, livre), comme `algo.test(testset)`.
+
+        Les paires sont évaluées en une seule passe vectorisée ; les paires touchant un utilisateur
+        ou un livre mis à jour par fold-in sont recalculées de la même façon avec les facteurs à jour
+        (une lecture de `user_factors` par utilisateur distinct).
+
+        Args:
+            raw_uids (np.array) : ID des utilisateurs
+            raw_iids (np.array) : item_id des livres
+
+        Returns:
+            np.array : Notes prédites bornées dans l'échelle des notes
+        """
+        if self._user_index is None:
+            self._user_index = pd.Index(self.user_ids)
+        raw_uids = np.asarray(raw_uids, dtype=object)
+        raw_iids = np.asarray(raw_iids, dtype=object)
+        users = lookup_ids(self._user_index, raw_uids)
+        items = self.item_index(raw_iids)
+        known_user, known_item = users >= 0, items >= 0
+
+        u, i = np.maximum(users, 0), np.maximum(items, 0)
+        est = self._pair_scores(self.pu[u], self.bu[u] if self.biased else None, self.qi[i],
+                                self.bi[i] if self.biased else None, known_user, known_item)
+
+        updated = np.zeros(len(users), dtype=bool)
+        if self.folded_users:
+            updated |= np.isin(raw_uids.astype(str), list(self.folded_users))
+        if self.item_overrides:
+            updated |= np.isin(items, list(self.item_overrides))
+        pairs = np.flatnonzero(updated)
+        if len(pairs):
+            _, first, inverse = np.unique(raw_uids[pairs].astype(str), return_index=True, return_inverse=True)
+            factors = [self.user_factors(raw_uids[pairs[n]]) for n in first]
+            d = self.qi.shape[1]
+            pu = np.array([f[0] if f is not None else np.zeros(d) for f in factors], dtype=np.float64)
+            bu = np.array([f[1] if f is not None else 0.0 for f in factors], dtype=np.float64)
+            has_user = np.array([f is not None for f in factors])
+            qi, bi = self.item_factors(i[pairs])
+            inverse = inverse.ravel()
+            est[pairs] = self._pair_scores(pu[inverse], bu[inverse], qi, bi, has_user[inverse], known_item[pairs])
+        return self.clip(est)
+
+    def recommend(self, raw_uid, k, exclude=None):
+        """
+        Retourne les top-K livres d'un utilisateur sur tout le catalogue.
+
+        Args:
+            raw_uid (int ou str) : ID de l'utilisateur
+            k (int) : Nombre de recommandations
+            exclude (np.array, optional) : Masque booléen (n_items,) des livres à exclure. Defaults to None.
+
+        Returns:
+            tuple:
+                - item_ids (np.array) : item_id des livres recommandés
+                - scores (np.array) : Notes prédites bornées dans l'échelle des notes
+        """
+        top_idx, top_scores = top_k_indices(self.score_user(raw_uid), k, exclude=exclude)
+        return self.item_ids[top_idx], self.clip(top_scores)
+
+
+def as_scorer(model):
+    """
+    Retourne un `MFScorer` pour le modèle donné (le scorer lui-même ou un modèle Surprise).
+
+    Args:
+        model (MFScorer ou surprise.AlgoBase) : Modèle collaboratif
+
+    Returns:
+        MFScorer : Scorer vectorisé
+    """
+    if isinstance(model, MFScorer):
+        return model
+    return MFScorer.from_surprise(model)
@@ -0,0 +1,125 @@
+import json
+
+import numpy as np
+
+from recommandation_de_livres.iads.array_utils import compact_ids
+from recommandation_de_livres.iads.fold_in import fold_in_path
+from recommandation_de_livres.iads.mf_scoring import MFScorer, as_scorer
+from recommandation_de_livres.loaders.load_data import load_pkl
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def model_dir(models_dir, name):
+    """Retourne le dossier de l'artefact du modèle `name` (svd, nmf ou als)."""
+    return models_dir / f"{name}_model"
+
+
+def save_mf_model(model, path, dtype=np.float32, **metadata):
+    """
+    Exporte un modèle de factorisation matricielle en dossier de fichiers `.npy` et manifeste JSON.
+
+    Seuls les facteurs, les biais et les identifiants sont conservés : le trainset Surprise
+    (dictionnaires d'identifiants et notes) n'est pas sauvegardé. Les facteurs calculés par fold-in
+    pour l'ancien modèle sont supprimés.
+
+    Args:
+        model (MFScorer ou surprise.AlgoBase) : Modèle entraîné
+        path (Path) : Dossier de l'artefact
+        dtype (np.dtype, optional) : Type des facteurs et biais. Defaults to np.float32.
+        **metadata : Informations ajoutées au manifeste (algorithme, hyperparamètres...)
+
+    Returns:
+        Path : Dossier de l'artefact
+    """
+    scorer = as_scorer(model)
+    path.mkdir(parents=True, exist_ok=True)
+
+    arrays = {
+        "pu": np.ascontiguousarray(scorer.pu, dtype=dtype),
+        "qi": np.ascontiguousarray(scorer.qi, dtype=dtype),
+        "user_ids": compact_ids(scorer.user_ids),
+        "item_ids": compact_ids(scorer.item_ids),
+    }
+    if scorer.biased:
+        arrays["bu"] = np.ascontiguousarray(scorer.bu, dtype=dtype)
+        arrays["bi"] = np.ascontiguousarray(scorer.bi, dtype=dtype)
+    for key, array in arrays.items():
+        np.save(path / f"{key}.npy", array, allow_pickle=False)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "n_users": scorer.n_users,
+        "n_items": scorer.n_items,
+        "n_factors": int(scorer.qi.shape[1]),
+        "biased": scorer.biased,
+        "partial_bias": scorer.partial_bias,
+        "global_mean": scorer.global_mean,
+        "rating_scale": list(scorer.rating_scale) if scorer.rating_scale is not None else None,
+        "dtype": np.dtype(dtype).name,
+        "metadata": metadata,
+    }
+    with open(path / MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    fold_in_path(path).unlink(missing_ok=True)
+    return path
+
+
+def load_mf_model(path, mmap_mode="r"):
+    """
+    Charge un artefact écrit par `save_mf_model`.
+
+    Avec `mmap_mode='r'`, les tableaux sont projetés en mémoire en lecture seule : les pages sont
+    lues à la demande et partagées entre les processus via le cache du système.
+
+    Args:
+        path (Path) : Dossier de l'artefact
+        mmap_mode (str, optional) : Mode de `np.load` (None pour tout charger en RAM). Defaults to "r".
+
+    Returns:
+        MFScorer : Scorer du modèle
+    """
+    with open(path / MANIFEST, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest["format_version"] > FORMAT_VERSION:
+        raise ValueError(f"Format d'artefact non supporté : {manifest['format_version']}")
+
+    def load(key):
+        return np.load(path / f"{key}.npy", mmap_mode=mmap_mode, allow_pickle=False)
+
+    rating_scale = manifest["rating_scale"]
+    return MFScorer(
+        pu=load("pu"),
+        qi=load("qi"),
+        bu=load("bu") if manifest["biased"] else None,
+        bi=load("bi") if manifest["biased"] else None,
+        global_mean=manifest["global_mean"],
+        user_ids=load("user_ids"),
+        item_ids=load("item_ids"),
+        rating_scale=tuple(rating_scale) if rating_scale is not None else None,
+        # Artefacts antérieurs : déduit de l'algorithme noté dans les métadonnées
+        partial_bias=manifest.get("partial_bias", manifest["metadata"].get("algo") != "nmf"),
+    )
+
+
+def load_scorer(path, mmap_mode="r"):
+    """
+    Charge un modèle de factorisation depuis son artefact, ou depuis l'ancien pickle `<nom>.pkl`.
+
+    Args:
+        path (Path) : Dossier de l'artefact (cf. `model_dir`) ou chemin du pickle
+        mmap_mode (str, optional) : Mode de `np.load`. Defaults to "r".
+
+    Returns:
+        MFScorer : Scorer du modèle
+    """
+    if (path / MANIFEST).exists():
+        return load_mf_model(path, mmap_mode=mmap_mode)
+    return as_scorer(load_pkl(path.with_suffix(".pkl")))
+
+
+def model_exists(path):
+    """Indique si le modèle a été entraîné (artefact ou pickle)."""
+    return (path / MANIFEST).exists() or path.with_suffix(".pkl").exists()
@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+from recommandation_de_livres.iads.utils import imdb_weighted_rating
+
+# Métadonnées conservées dans la table pour filtrer et afficher les livres populaires
+FILTER_COLUMNS = ["categories", "language"]
+
+
+def compute_popularity(ratings, quantile=0.80):
+    """
+    Calcule le nombre de notes, la note moyenne et la note pondérée IMDB de chaque livre.
+
+    Les agrégats sont obtenus avec `np.bincount` sur les codes des livres, et la note pondérée
+    est calculée sur tout le tableau en une fois.
+
+    Args:
+        ratings (pd.DataFrame) : DataFrame contenant ['item_id', 'rating']
+        quantile (float, optional) : Quantile du nombre de notes utilisé comme seuil de popularité m. Defaults to 0.80.
+
+    Returns:
+        pd.DataFrame : ['item_id', 'count', 'mean_rating', 'score'] trié par score décroissant
+    """
+    codes, item_ids = pd.factorize(ratings["item_id"])
+    count = np.bincount(codes, minlength=len(item_ids))
+    mean_rating = np.bincount(codes, weights=ratings["rating"].to_numpy(dtype=np.float64),
+                              minlength=len(item_ids)) / np.maximum(count, 1)
+
+    m = np.quantile(count, quantile) if len(count) else 0.0
+    C = mean_rating.mean() if len(count) else 0.0
+    score = imdb_weighted_rating(count, mean_rating, m, C)
+
+    order = np.argsort(-score, kind="stable")
+    return pd.DataFrame({
+        "item_id": np.asarray(item_ids)[order],
+        "count": count[order],
+        "mean_rating": mean_rating[order],
+        "score": score[order],
+    })
+
+
+def build_popularity_table(ratings, books=None, quantile=0.80):
+    """
+    Construit la table de popularité triée, avec les colonnes de filtre (genres, langue) des livres.
+
+    Args:
+        ratings (pd.DataFrame) : DataFrame des notes
+        books (pd.DataFrame, optional) : DataFrame des livres (item_id, categories, language). Defaults to None.
+        quantile (float, optional) : Quantile du seuil de popularité. Defaults to 0.80.
+
+    Returns:
+        pd.DataFrame : Table de popularité triée par score décroissant
+    """
+    table = compute_popularity(ratings, quantile=quantile)
+    if books is not None:
+        cols = [c for c in FILTER_COLUMNS if c in books.columns]
+        if cols:
+            metadata = books.drop_duplicates(subset="item_id").set_index("item_id")[cols]
+            table = table.join(metadata, on="item_id")
+    return table
+
+
+class PopularityRanker:
+    """
+    Sert les top-N livres populaires depuis la table triée de `build_popularity_table`.
+
+    Les positions des livres de chaque genre ou langue sont calculées une fois puis mises en cache :
+    une requête ne parcourt que le début de ces positions.
+    """
+
+    def __init__(self, table):
+        """
+        Args:
+            table (pd.DataFrame) : Table de popularité triée par score décroissant
+        """
+        self.table = table.reset_index(drop=True)
+        self.item_ids = self.table["item_id"].to_numpy()
+        self._positions = {}
+
+    @classmethod
+    def load(cls, path):
+        """Charge la table de popularité sauvegardée au format parquet."""
+        return cls(pd.read_parquet(path))
+
+    def save(self, path):
+        """Sauvegarde la table de popularité au format parquet."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.table.to_parquet(path, index=False)
+
+    def _filter_positions(self, genre=None, language=None):
+        """Retourne (et met en cache) les positions des livres correspondant aux filtres, par score décroissant."""
+        key = (genre, language)
+        if key not in self._positions:
+            mask = np.ones(len(self.table), dtype=bool)
+            if genre is not None and "categories" in self.table.columns:
+                mask &= self.table["categories"].fillna("").str.contains(genre, case=False, regex=False).to_numpy()
+            if language is not None and "language" in self.table.columns:
+                mask &= (self.table["language"] == language).to_numpy()
+            self._positions[key] = np.flatnonzero(mask)
+        return self._positions[key]
+
+    def top_n(self, n=10, genre=None, language=None, exclude=None):
+        """
+        Retourne les `n` livres les plus populaires, éventuellement filtrés.
+
+        Args:
+            n (int, optional) : Nombre de livres. Defaults to 10.
+            genre (str, optional) : Genre recherché dans la colonne 'categories'. Defaults to None.
+            language (str, optional) : Langue des livres. Defaults to None.
+            exclude (array-like, optional) : item_id à exclure (livres déjà notés). Defaults to None.
+
+        Returns:
+            pd.DataFrame : Lignes de la table de popularité
+        """
+        positions = self._filter_positions(genre, language)
+        if exclude is not None and len(exclude):
+            # Seuls les n + len(exclude) premiers candidats peuvent faire partie du résultat
+            candidates = positions[:n + len(exclude)]
+            positions = candidates[~np.isin(self.item_ids[candidates], np.asarray(exclude))]
+        return self.table.iloc[positions[:n]]
+
+
+def recommandation_populaire_top_k(k, ranker, books, exclude=None, genre=None, language=None):
+    """
+    Recommandation de repli : les k livres les plus populaires non encore notés.
+
+    Args:
+        k (int) : Nombre de recommandations
+        ranker (PopularityRanker) : Table de popularité
+        books (pd.DataFrame) : DataFrame des livres
+        exclude (array-like, optional) : item_id déjà notés par l'utilisateur. Defaults to None.
+        genre (str, optional) : Genre recherché. Defaults to None.
+        language (str, optional) : Langue des livres. Defaults to None.
+
+    Returns:
+        pd.DataFrame : Livres recommandés avec les colonnes de `books` et ['count', 'mean_rating', 'score']
+    """
+    # Les livres populaires absents du catalogue `books` sont ignorés : on élargit la fenêtre
+    # de candidats jusqu'à obtenir k livres du catalogue (ou épuiser la table)
+    n = k
+    while True:
+        top = ranker.top_n(n, genre=genre, language=language, exclude=exclude)
+        result = top[["item_id", "count", "mean_rating", "score"]].merge(books, on="item_id", how="inner")
+        if len(result) >= k or len(top) < n:
+            return result.head(k)
+        n *= 4
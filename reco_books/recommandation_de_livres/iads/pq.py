@@ -0,0 +1,259 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from recommandation_de_livres.iads.array_utils import normalize_rows
+from recommandation_de_livres.iads.topk_utils import dot_top_k, top_k_indices
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+N_CENTROIDS = 256  # codes sur un octet par sous-espace
+
+
+def _kmeans(vectors, n_clusters, n_iter=15, seed=42):
+    """
+    K-means euclidien (initialisation sur des points tirés au hasard).
+
+    Returns:
+        np.array : Centroïdes de forme (n_clusters, dimension)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = _nearest(vectors, centroids)
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Les centroïdes vides sont réinitialisés sur des points tirés au hasard
+        centroids[~filled] = vectors[rng.choice(len(vectors), (~filled).sum(), replace=False)]
+    return centroids
+
+
+def _nearest(vectors, centroids):
+    """Indice du centroïde le plus proche (distance euclidienne) de chaque vecteur."""
+    return np.argmin((centroids ** 2).sum(axis=1) - 2 * vectors @ centroids.T, axis=1)
+
+
+class PQIndex:
+    """
+    Embeddings compressés par quantification produit (PQ), recherche par similarité cosinus.
+
+    Les embeddings normalisés sont découpés en `m` sous-vecteurs, chacun remplacé par l'indice (un octet)
+    du plus proche des 256 centroïdes de son sous-espace : un livre occupe `m` octets.
+    Une requête est comparée aux codes par tables de distances asymétriques (ADC) : la requête reste exacte,
+    seuls les livres sont quantifiés, et le score d'un livre est une somme de `m` lectures de table.
+    Les meilleurs candidats peuvent ensuite être reclassés exactement à partir des vecteurs originaux
+    (projetés en mémoire).
+
+    L'interface `kneighbors` est celle de `ann_index.IVFIndex`.
+    """
+
+    kind = "pq"
+
+    def __init__(self, codebooks, codes, dim, rerank_vectors=None, n_rerank=100):
+        """
+        Args:
+            codebooks (np.array) : Centroïdes de chaque sous-espace, de forme (m, 256, dimension / m)
+            codes (np.array) : Codes uint8 des livres, de forme (n_livres, m)
+            dim (int) : Dimension des embeddings d'origine
+            rerank_vectors (np.array, optional) : Embeddings normalisés d'origine pour le reclassement exact.
+                                                  Defaults to None.
+            n_rerank (int, optional) : Nombre de candidats reclassés. Defaults to 100.
+        """
+        self.codebooks = codebooks
+        self.codes = codes
+        self.dim = int(dim)
+        self.rerank_vectors = rerank_vectors
+        self.n_rerank = int(n_rerank)
+
+    @property
+    def m(self):
+        return self.codebooks.shape[0]
+
+    @property
+    def bytes_per_vector(self):
+        return self.codes.shape[1] * self.codes.itemsize
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _split(self, vectors):
+        """Complète les vecteurs par des zéros (dimension multiple de m) et les découpe en sous-vecteurs."""
+        dsub = self.codebooks.shape[2]
+        padded = np.zeros((len(vectors), self.m * dsub), dtype=np.float32)
+        padded[:, :vectors.shape[1]] = vectors
+        return padded.reshape(len(vectors), self.m, dsub)
+
+    @classmethod
+    def build(cls, embeddings, m=32, n_iter=15, sample_size=65536, n_rerank=100, seed=42, block_size=65536):
+        """
+        Apprend les codebooks sur les embeddings normalisés puis encode tout le catalogue.
+
+        Args:
+            embeddings (np.array) : Embeddings des livres (n_livres, dimension)
+            m (int, optional) : Nombre de sous-espaces, soit le nombre d'octets par livre. Defaults to 32.
+            n_iter (int, optional) : Nombre d'itérations du k-means de chaque sous-espace. Defaults to 15.
+            sample_size (int, optional) : Nombre de vecteurs utilisés pour apprendre les codebooks. Defaults to 65536.
+            n_rerank (int, optional) : Nombre de candidats reclassés exactement. Defaults to 100.
+            seed (int, optional) : Graine du tirage et des k-means. Defaults to 42.
+            block_size (int, optional) : Nombre de livres encodés à la fois. Defaults to 65536.
+
+        Returns:
+            PQIndex : Index construit
+        """
+        n, dim = embeddings.shape
+        dsub = -(-dim // m)
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(n, min(n, sample_size), replace=False))
+
+        index = cls(np.zeros((m, N_CENTROIDS, dsub), dtype=np.float32), None, dim, n_rerank=n_rerank)
+        sample = index._split(normalize_rows(embeddings[sample_rows]))
+        n_clusters = min(N_CENTROIDS, len(sample))
+        for j in range(m):
+            index.codebooks[j, :n_clusters] = _kmeans(sample[:, j], n_clusters, n_iter=n_iter, seed=seed + j)
+            # Petits catalogues : les centroïdes en trop dupliquent le premier et ne sont jamais choisis
+            index.codebooks[j, n_clusters:] = index.codebooks[j, 0]
+
+        index.codes = np.empty((n, m), dtype=np.uint8)
+        for start in range(0, n, block_size):
+            index.codes[start:start + block_size] = index.encode(embeddings[start:start + block_size])
+        return index
+
+    def encode(self, embeddings):
+        """Encode des embeddings (normalisés ici) en codes uint8 de forme (n, m)."""
+        sub = self._split(normalize_rows(embeddings))
+        codes = np.empty((len(sub), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _nearest(sub[:, j], self.codebooks[j])
+        return codes
+
+    def decode(self, codes):
+        """Reconstruit des embeddings normalisés approchés à partir de leurs codes."""
+        sub = self.codebooks[np.arange(self.m), np.asarray(codes)]
+        return sub.reshape(len(codes), -1)[:, :self.dim]
+
+    def adc_scores(self, query, block_size=65536):
+        """
+        Produits scalaires approchés (tables ADC) entre une requête normalisée et tous les livres.
+
+        Args:
+            query (np.array) : Requête normalisée de forme (dimension,)
+            block_size (int, optional) : Nombre de codes lus à la fois. Defaults to 65536.
+
+        Returns:
+            np.array : Scores de forme (n_livres,)
+        """
+        # Table (m, 256) : produit scalaire de chaque sous-vecteur de la requête avec chaque centroïde
+        table = np.einsum("jcd,jd->jc", self.codebooks, self._split(query[None])[0])
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), block_size):
+            codes = np.asarray(self.codes[start:start + block_size])
+            block = np.zeros(len(codes), dtype=np.float32)
+            for j in range(self.m):
+                block += table[j, codes[:, j]]
+            scores[start:start + len(codes)] = block
+        return scores
+
+    def kneighbors(self, X, n_neighbors=10, n_rerank=None, exclude=None):
+        """
+        Recherche les plus proches voisins (cosinus) d'une ou plusieurs requêtes.
+
+        Args:
+            X (np.array) : Requête(s) de forme (dimension,) ou (n_requetes, dimension)
+            n_neighbors (int, optional) : Nombre de voisins par requête. Defaults to 10.
+            n_rerank (int, optional) : Nombre de candidats ADC reclassés exactement si `rerank_vectors`
+                                       est défini (0 pour désactiver). Defaults to None (`self.n_rerank`).
+            exclude (np.array, optional) : Masque booléen (n_livres,) des livres à exclure. Defaults to None.
+
+        Returns:
+            tuple:
+                - distances (np.array) : 1 - similarité cosinus, de forme (n_requetes, n_voisins)
+                - indices (np.array) : Lignes des voisins dans la matrice d'embeddings
+        """
+        queries = normalize_rows(np.atleast_2d(np.asarray(X, dtype=np.float32)))
+        n_neighbors = min(int(n_neighbors), len(self))
+        n_rerank = self.n_rerank if n_rerank is None else int(n_rerank)
+        rerank = self.rerank_vectors is not None and n_rerank > 0
+
+        distances = np.full((len(queries), n_neighbors), np.inf, dtype=np.float32)
+        indices = np.full((len(queries), n_neighbors), -1, dtype=np.int64)
+        for q, query in enumerate(queries):
+            candidates, sims = top_k_indices(self.adc_scores(query), max(n_neighbors, n_rerank if rerank else 0),
+                                             exclude=exclude)
+            if rerank:
+                # Reclassement exact à partir des vecteurs d'origine des seuls candidats
+                rows = np.sort(candidates)
+                best, sims = dot_top_k(np.asarray(self.rerank_vectors[rows]), query, n_neighbors)
+                candidates = rows[best]
+            candidates, sims = candidates[:n_neighbors], sims[:n_neighbors]
+            distances[q, :len(candidates)] = 1 - sims
+            indices[q, :len(candidates)] = candidates
+        return distances, indices
+
+    def save(self, path):
+        """Sauvegarde les codebooks, les codes et le manifeste JSON dans un dossier."""
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "codebooks.npy", self.codebooks, allow_pickle=False)
+        np.save(path / "codes.npy", np.asarray(self.codes), allow_pickle=False)
+        with open(path / MANIFEST, "w", encoding="utf-8") as f:
+            json.dump({"format_version": FORMAT_VERSION, "kind": self.kind, "n_items": len(self), "dim": self.dim,
+                       "m": self.m, "bytes_per_vector": self.bytes_per_vector, "n_rerank": self.n_rerank}, f, indent=2)
+
+    @classmethod
+    def load(cls, path, manifest, mmap_mode="r"):
+        """Charge un index sauvegardé avec `save` (codes projetés en mémoire)."""
+        return cls(np.load(path / "codebooks.npy"), np.load(path / "codes.npy", mmap_mode=mmap_mode),
+                   manifest["dim"], n_rerank=manifest["n_rerank"])
+
+
+def recall_report(embeddings, m_values=(16, 32, 48, 64), k=10, n_queries=200, n_rerank=(0, 100), seed=42,
+                  **build_params):
+    """
+    Mesure le rappel@k de la recherche PQ selon le nombre d'octets par livre, avec et sans reclassement.
+
+    La vérité terrain est le top-k exact (cosinus) des embeddings d'origine ; les requêtes sont des livres
+    du catalogue tirés au hasard.
+
+    Args:
+        embeddings (np.array) : Embeddings des livres
+        m_values (tuple, optional) : Nombres de sous-espaces (octets par livre) testés. Defaults to (16, 32, 48, 64).
+        k (int, optional) : Taille du top. Defaults to 10.
+        n_queries (int, optional) : Nombre de requêtes. Defaults to 200.
+        n_rerank (tuple, optional) : Nombres de candidats reclassés testés (0 = ADC seul). Defaults to (0, 100).
+        seed (int, optional) : Graine du tirage des requêtes. Defaults to 42.
+        **build_params : Paramètres de `PQIndex.build`
+
+    Returns:
+        pd.DataFrame : Une ligne par configuration ['m', 'bytes_per_vector', 'compression', 'n_rerank',
+                       'recall@k', 'ms_par_requete', 'build_s']
+    """
+    vectors = normalize_rows(embeddings)
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+    truth, _ = dot_top_k(vectors, queries, k)
+
+    records = []
+    for m in m_values:
+        start = time.time()
+        index = PQIndex.build(embeddings, m=m, seed=seed, **build_params)
+        build_time = time.time() - start
+        index.rerank_vectors = vectors
+        for rerank in n_rerank:
+            start = time.time()
+            _, found = index.kneighbors(queries, n_neighbors=k, n_rerank=rerank)
+            elapsed = time.time() - start
+            hits = [len(np.intersect1d(t, f)) for t, f in zip(truth, found)]
+            records.append({
+                "m": m,
+                "bytes_per_vector": index.bytes_per_vector,
+                "compression": vectors.shape[1] * 4 / index.bytes_per_vector,
+                "n_rerank": rerank,
+                "recall@k": float(np.mean(hits) / k),
+                "ms_par_requete": 1000 * elapsed / len(queries),
+                "build_s": build_time,
+            })
+    return pd.DataFrame(records)
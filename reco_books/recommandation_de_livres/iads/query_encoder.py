@@ -0,0 +1,253 @@
+from functools import lru_cache
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+ONNX_CONFIG = "encoder_config.json"
+
+# Encodeurs déjà chargés dans ce processus, par (dossier du modèle, backend)
+_ENCODERS = {}
+
+
+def onnx_dir(model_path):
+    """
+    Retourne le dossier de l'export ONNX associé à un modèle Sentence-BERT sauvegardé.
+
+    Ex. : sbert_model -> sbert_model_onnx (même dossier).
+    """
+    return model_path.with_name(f"{model_path.name}_onnx")
+
+
+def _pooling(model):
+    """Mode de pooling ("mean" ou "cls") et normalisation finale d'un SentenceTransformer."""
+    pooling, normalize = None, False
+    for module in model:
+        name = type(module).__name__
+        if name == "Pooling":
+            pooling = module.get_pooling_mode_str()
+        elif name == "Normalize":
+            normalize = True
+    if pooling not in ("mean", "cls"):
+        raise ValueError(f"Pooling non supporté par l'export ONNX : {pooling}")
+    return pooling, normalize
+
+
+def export_onnx(model_path, output_dir=None, quantize=True):
+    """
+    Exporte le transformer d'un modèle Sentence-BERT sauvegardé au format ONNX.
+
+    Seul le transformer est exporté (sortie `last_hidden_state`) ; le pooling et la normalisation sont
+    refaits avec NumPy (cf. `OnnxBackend`), d'après la configuration écrite dans `encoder_config.json`.
+
+    Args:
+        model_path (Path) : Dossier du modèle (`sbert_model`)
+        output_dir (Path, optional) : Dossier de l'export. Defaults to None (`onnx_dir(model_path)`).
+        quantize (bool, optional) : Écrit aussi une version aux poids int8 (`model_int8.onnx`). Defaults to True.
+
+    Returns:
+        Path : Dossier de l'export
+    """
+    from sentence_transformers import SentenceTransformer
+    import torch
+
+    output_dir = output_dir or onnx_dir(model_path)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model = SentenceTransformer(str(model_path), device="cpu")
+    pooling, normalize = _pooling(model)
+    transformer = model[0].auto_model.eval()
+    example = model.tokenizer(["exemple de titre"], return_tensors="pt")
+    input_names = list(example.keys())
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs))).last_hidden_state
+
+    axes = {0: "batch", 1: "sequence"}
+    torch.onnx.export(HiddenStates(), tuple(example[name] for name in input_names), str(output_dir / "model.onnx"),
+                      input_names=input_names, output_names=["last_hidden_state"],
+                      dynamic_axes={**{name: axes for name in input_names}, "last_hidden_state": axes},
+                      opset_version=14)
+    model.tokenizer.save_pretrained(str(output_dir))
+    with open(output_dir / ONNX_CONFIG, "w") as f:
+        json.dump({"input_names": input_names, "pooling": pooling, "normalize": normalize,
+                   "max_seq_length": model.max_seq_length, "dim": model.get_sentence_embedding_dimension()},
+                  f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(output_dir / "model.onnx"), str(output_dir / "model_int8.onnx"),
+                         weight_type=QuantType.QInt8)
+    return output_dir
+
+
+class TorchBackend:
+    """Modèle Sentence-BERT PyTorch sur CPU, éventuellement avec les couches linéaires quantifiées en int8."""
+
+    def __init__(self, model_path, quantize=False, n_threads=None):
+        from sentence_transformers import SentenceTransformer
+        import torch
+
+        if n_threads:
+            torch.set_num_threads(n_threads)
+        self.model = SentenceTransformer(str(model_path), device="cpu")
+        if quantize:
+            # Quantification dynamique : poids int8, activations quantifiées à la volée
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        return self.model.encode(list(texts), batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+
+class OnnxBackend:
+    """Session ONNX Runtime du transformer exporté par `export_onnx`, pooling et normalisation en NumPy."""
+
+    def __init__(self, export_dir, quantize=True, n_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(export_dir / ONNX_CONFIG) as f:
+            self.config = json.load(f)
+        self.dim = self.config["dim"]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(export_dir))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if n_threads:
+            options.intra_op_num_threads = n_threads
+        path = export_dir / ("model_int8.onnx" if quantize else "model.onnx")
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+    def encode(self, texts):
+        tokens = self.tokenizer(list(texts), padding=True, truncation=True, max_length=self.config["max_seq_length"],
+                                return_tensors="np")
+        feeds = {name: tokens[name].astype(np.int64) for name in self.config["input_names"]}
+        hidden = self.session.run(None, feeds)[0]
+        if self.config["pooling"] == "cls":
+            vectors = hidden[:, 0]
+        else:
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            vectors = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.config["normalize"]:
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors.astype(np.float32)
+
+
+class QueryEncoder:
+    """
+    Encodeur des titres saisis (hors catalogue) au moment de la requête.
+
+    Le backend (`TorchBackend` ou `OnnxBackend`) reste chargé ; les derniers titres encodés sont gardés
+    dans un cache LRU, une requête répétée ne repasse donc pas par le modèle.
+    """
+
+    def __init__(self, backend, name, cache_size=1024):
+        """
+        Args:
+            backend : Backend exposant `encode(texts)` et `dim`
+            name (str) : Nom du backend (cf. BACKENDS)
+            cache_size (int, optional) : Nombre de titres gardés en cache. Defaults to 1024.
+        """
+        self.backend = backend
+        self.name = name
+        self.dim = backend.dim
+        self.encode_one = lru_cache(maxsize=cache_size)(self._encode_one)
+
+    def _encode_one(self, text):
+        vector = self.backend.encode([text])[0]
+        vector.setflags(write=False)
+        return vector
+
+    def encode(self, texts):
+        """Embeddings float32 de titres (n, dim), chaque titre passant par le cache."""
+        return np.vstack([self.encode_one(text) for text in texts])
+
+
+def _make_backend(model_path, backend, n_threads=None):
+    if backend in ("torch", "torch_int8"):
+        return TorchBackend(model_path, quantize=backend == "torch_int8", n_threads=n_threads)
+    if backend in ("onnx", "onnx_int8"):
+        export = onnx_dir(model_path)
+        model_file = export / ("model_int8.onnx" if backend == "onnx_int8" else "model.onnx")
+        # Export (re)fait si absent ou plus ancien que le modèle sauvegardé (modèle réentraîné)
+        model_mtime = max(p.stat().st_mtime for p in model_path.iterdir())
+        if not model_file.exists() or model_file.stat().st_mtime < model_mtime:
+            export_onnx(model_path, export, quantize=backend == "onnx_int8")
+        return OnnxBackend(export, quantize=backend == "onnx_int8", n_threads=n_threads)
+    raise ValueError(f"Backend inconnu : {backend} (attendu : auto, {', '.join(BACKENDS)})")
+
+
+def load_query_encoder(model_path, backend="auto", cache_size=1024, n_threads=None):
+    """
+    Retourne l'encodeur de requêtes d'un modèle Sentence-BERT, chargé une seule fois par processus.
+
+    Args:
+        model_path (Path) : Dossier du modèle sauvegardé (`sbert_model`)
+        backend (str, optional) : "torch", "torch_int8", "onnx", "onnx_int8" ou "auto" (ONNX int8 si
+            `onnxruntime` est installé, sinon PyTorch int8). Defaults to "auto".
+        cache_size (int, optional) : Nombre de titres gardés en cache. Defaults to 1024.
+        n_threads (int, optional) : Threads du backend. Defaults to None (valeur du backend).
+
+    Returns:
+        QueryEncoder : Encodeur prêt à l'emploi
+    """
+    if backend == "auto":
+        try:
+            import onnxruntime  # noqa: F401
+            backend = "onnx_int8"
+        except ImportError:
+            backend = "torch_int8"
+    key = (str(model_path), backend)
+    if key not in _ENCODERS:
+        _ENCODERS[key] = QueryEncoder(_make_backend(model_path, backend, n_threads), backend, cache_size=cache_size)
+    return _ENCODERS[key]
+
+
+def latency_report(model_path, titles, backends=BACKENDS, n_threads=None):
+    """
+    Compare les backends à l'encodeur PyTorch float32 sur des titres : latence et accord cosinus.
+
+    Args:
+        model_path (Path) : Dossier du modèle sauvegardé (`sbert_model`)
+        titles (list) : Titres de test (encodés un par un, comme à la requête)
+        backends (tuple, optional) : Backends comparés. Defaults to BACKENDS.
+        n_threads (int, optional) : Threads de chaque backend. Defaults to None.
+
+    Returns:
+        pd.DataFrame : Une ligne par backend : chargement (s), première requête, p50 et p95 (ms),
+                       requête en cache (ms), similarité cosinus moyenne et minimale avec le float32
+    """
+    reference, rows = None, []
+    for name in ("torch",) + tuple(b for b in backends if b != "torch"):
+        start = time.perf_counter()
+        encoder = QueryEncoder(_make_backend(model_path, name, n_threads), name, cache_size=len(titles))
+        load_s = time.perf_counter() - start
+
+        timings, vectors = [], []
+        for title in titles:
+            start = time.perf_counter()
+            vectors.append(encoder.encode_one(title))
+            timings.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        for title in titles:
+            encoder.encode_one(title)
+        cached_ms = (time.perf_counter() - start) * 1000 / max(len(titles), 1)
+
+        vectors = np.vstack(vectors)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if reference is None:
+            reference = vectors
+        cosine = (vectors * reference).sum(axis=1)
+        rows.append({"backend": name, "load_s": load_s, "first_ms": timings[0],
+                     "p50_ms": float(np.percentile(timings[1:] or timings, 50)),
+                     "p95_ms": float(np.percentile(timings[1:] or timings, 95)),
+                     "cached_ms": cached_ms, "cos_mean": float(cosine.mean()), "cos_min": float(cosine.min())})
+    report = pd.DataFrame(rows)
+    return report[report["backend"].isin(backends)].reset_index(drop=True)
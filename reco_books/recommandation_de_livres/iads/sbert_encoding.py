@@ -0,0 +1,179 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+# État partagé par les processus du pool, initialisé une fois par worker
+_STATE = {}
+
+
+def token_lengths(tokenizer, texts, max_tokens, block_size=10_000):
+    """
+    Nombre de tokens de chaque texte, tronqué à `max_tokens` (tokens spéciaux compris).
+
+    Args:
+        tokenizer : Tokenizer du modèle (`SentenceTransformer.tokenizer`)
+        texts (list) : Textes à encoder
+        max_tokens (int) : Budget de tokens par texte
+        block_size (int, optional) : Nombre de textes tokenisés à la fois. Defaults to 10_000.
+
+    Returns:
+        np.array : Longueur en tokens de chaque texte
+    """
+    lengths = np.empty(len(texts), dtype=np.int32)
+    for start in range(0, len(texts), block_size):
+        ids = tokenizer(texts[start:start + block_size], truncation=True, max_length=max_tokens)["input_ids"]
+        lengths[start:start + len(ids)] = [len(i) for i in ids]
+    return lengths
+
+
+def length_chunks(lengths, chunk_size):
+    """
+    Découpe les textes en blocs de longueurs voisines.
+
+    Les textes sont triés par longueur (tri stable, donc le même découpage à chaque appel) puis découpés
+    en blocs consécutifs : les batchs d'un bloc ne sont presque pas complétés par du padding.
+
+    Args:
+        lengths (np.array) : Longueur en tokens de chaque texte
+        chunk_size (int) : Nombre de textes par bloc
+
+    Returns:
+        list : Lignes des textes de chaque bloc
+    """
+    order = np.argsort(lengths, kind="stable")
+    return [order[start:start + chunk_size] for start in range(0, len(order), chunk_size)]
+
+
+def init_worker(state):
+    """Initialise un worker : nombre de threads fixé puis chargement du modèle sur CPU."""
+    from sentence_transformers import SentenceTransformer
+    import torch
+
+    _STATE.clear()
+    _STATE.update(state)
+    torch.set_num_threads(state["n_threads"])
+    model = SentenceTransformer(state["model_path"], device="cpu")
+    model.max_seq_length = state["max_tokens"]
+    _STATE["model"] = model
+
+
+def encode_chunk(chunk_id, texts):
+    """Encode les textes d'un bloc avec le modèle du worker."""
+    embeddings = _STATE["model"].encode(texts, batch_size=_STATE["batch_size"], convert_to_numpy=True,
+                                        show_progress_bar=False)
+    return chunk_id, embeddings
+
+
+def _fingerprint(texts, model_name, max_tokens, chunk_size, dim):
+    """
+    Identifie un encodage : une reprise n'est possible qu'avec les mêmes textes, dans le même ordre
+    (les blocs déjà encodés sont écrits à leurs lignes), et les mêmes paramètres.
+    """
+    text_hash = hashlib.md5(pd.util.hash_array(np.asarray(texts, dtype=object)).tobytes()).hexdigest()
+    return {"n_texts": len(texts), "text_hash": text_hash, "model": model_name,
+            "max_tokens": max_tokens, "chunk_size": chunk_size, "dim": dim}
+
+
+def checkpoint_path(output_path):
+    """Fichier de progression d'un encodage (ex. embeddings_sbert.npy -> embeddings_sbert.progress.json)."""
+    return output_path.with_name(f"{output_path.stem}.progress.json")
+
+
+def partial_path(output_path):
+    """Fichier des embeddings en cours d'écriture (renommé en `output_path` à la fin)."""
+    return output_path.with_name(f"{output_path.stem}.partial.npy")
+
+
+def _write_checkpoint(path, infos):
+    """Écrit le fichier de progression de façon atomique (une interruption ne laisse pas de JSON tronqué)."""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(infos, f, indent=2)
+    os.replace(tmp, path)
+
+
+def encode_texts(model, texts, output_path, model_path=None, max_tokens=256, batch_size=64, chunk_size=4096,
+                 n_workers=1, threads_per_worker=None, callback=None):
+    """
+    Encode un corpus avec Sentence-BERT et écrit les embeddings dans un fichier `.npy`, avec reprise.
+
+    - les textes sont tronqués à `max_tokens` tokens puis regroupés en blocs de longueurs voisines ;
+    - sur CPU, les blocs sont répartis entre `n_workers` processus ayant chacun `threads_per_worker`
+      threads (sur GPU, ou avec un seul worker, ils sont encodés dans le processus courant) ;
+    - chaque bloc est écrit à ses lignes dans un fichier projeté en mémoire, puis noté dans un fichier de
+      progression : relancé avec les mêmes textes et paramètres, l'encodage reprend aux blocs manquants.
+
+    Args:
+        model (SentenceTransformer) : Modèle chargé (tokenizer, dimension et encodage dans le processus courant)
+        texts (list) : Textes à encoder
+        output_path (Path) : Fichier `.npy` des embeddings
+        model_path (str, optional) : Nom ou dossier du modèle chargé par les workers. Defaults to None (un seul processus).
+        max_tokens (int, optional) : Budget de tokens par texte. Defaults to 256.
+        batch_size (int, optional) : Taille des batchs du modèle. Defaults to 64.
+        chunk_size (int, optional) : Nombre de textes par bloc (unité de travail et de reprise). Defaults to 4096.
+        n_workers (int, optional) : Nombre de processus d'encodage. Defaults to 1.
+        threads_per_worker (int, optional) : Threads par worker. Defaults to None (cœurs répartis entre les workers).
+        callback (callable, optional) : Appelée avec (blocs terminés, nombre de blocs) après chaque bloc. Defaults to None.
+
+    Returns:
+        np.array : Embeddings float32 (n_textes, dimension), projetés en mémoire depuis `output_path`
+    """
+    texts = [t if isinstance(t, str) else "" for t in texts]
+    max_tokens = min(max_tokens, model.max_seq_length or max_tokens)
+    model.max_seq_length = max_tokens
+    dim = model.get_sentence_embedding_dimension()
+
+    chunks = length_chunks(token_lengths(model.tokenizer, texts, max_tokens), chunk_size)
+    progress_path, tmp_path = checkpoint_path(output_path), partial_path(output_path)
+    model_name = str(model_path) if model_path is not None else str(getattr(model.tokenizer, "name_or_path", ""))
+    infos = _fingerprint(texts, model_name, max_tokens, chunk_size, dim)
+
+    # Reprise si le fichier de progression correspond au même encodage
+    done = set()
+    if progress_path.exists() and tmp_path.exists():
+        with open(progress_path) as f:
+            previous = json.load(f)
+        if {key: previous.get(key) for key in infos} == infos:
+            done = set(previous["done"])
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if done:
+        out = np.lib.format.open_memmap(tmp_path, mode="r+")
+    else:
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(texts), dim))
+
+    def write(out, chunk_id, embeddings):
+        out[chunks[chunk_id]] = embeddings
+        out.flush()
+        done.add(chunk_id)
+        _write_checkpoint(progress_path, {**infos, "done": sorted(done)})
+        if callback is not None:
+            callback(len(done), len(chunks))
+
+    todo = [i for i in range(len(chunks)) if i not in done]
+    bar = tqdm(total=len(chunks), initial=len(done), desc="Blocs encodés")
+    if n_workers > 1 and model_path is not None and model.device.type == "cpu":
+        state = {"model_path": str(model_path), "max_tokens": max_tokens, "batch_size": batch_size,
+                 "n_threads": threads_per_worker or max(1, (os.cpu_count() or 1) // n_workers)}
+        # Les workers sont créés par fork : le tokenizer ne doit pas y relancer ses propres threads
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(state,)) as pool:
+            futures = [pool.submit(encode_chunk, i, [texts[row] for row in chunks[i]]) for i in todo]
+            for future in as_completed(futures):
+                write(out, *future.result())
+                bar.update()
+    else:
+        for i in todo:
+            write(out, i, model.encode([texts[row] for row in chunks[i]], batch_size=batch_size,
+                                       convert_to_numpy=True, show_progress_bar=False))
+            bar.update()
+    bar.close()
+
+    del out
+    os.replace(tmp_path, output_path)
+    progress_path.unlink(missing_ok=True)
+    return np.load(output_path, mmap_mode="r")
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+def top_k_indices(scores, k, exclude=None):
+    """
+    Retourne les indices des k meilleurs scores, triés par score décroissant.
+
+    Seuls les k candidats retenus par `np.argpartition` (en O(n)) sont ensuite triés,
+    au lieu de trier tout le catalogue avec `np.argsort`.
+
+    Args:
+        scores (np.array) : Scores de forme (n,) ou (n_requetes, n)
+        k (int) : Nombre d'éléments à retourner
+        exclude (np.array, optional) : Masque booléen (même forme que `scores` ou (n,))
+                                       des éléments à exclure. Defaults to None.
+
+    Returns:
+        tuple:
+            - top_idx (np.array) : Indices des k meilleurs éléments (par ligne si 2D)
+            - top_scores (np.array) : Scores correspondants
+    """
+    scores = np.asarray(scores)
+    if exclude is not None:
+        scores = np.where(exclude, -np.inf, scores)
+
+    n = scores.shape[-1]
+    k = min(int(k), n)
+    if k <= 0:
+        empty_shape = scores.shape[:-1] + (0,)
+        return np.empty(empty_shape, dtype=np.int64), np.empty(empty_shape, dtype=scores.dtype)
+
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    top_idx = np.take_along_axis(candidates, order, axis=-1)
+    top_scores = np.take_along_axis(candidate_scores, order, axis=-1)
+
+    # En 1D on retire les éléments exclus si le catalogue restant contient moins de k éléments
+    if scores.ndim == 1 and exclude is not None:
+        keep = top_scores > -np.inf
+        top_idx, top_scores = top_idx[keep], top_scores[keep]
+
+    return top_idx, top_scores
+
+
+def dot_top_k(matrix, queries, k, exclude=None, chunk_size=65536):
+    """
+    Retourne les k lignes de `matrix` ayant le plus grand produit scalaire avec chaque requête.
+
+    La matrice est parcourue par blocs de `chunk_size` lignes : seul un bloc de scores
+    (n_requetes x chunk_size) est en mémoire à la fois, et le top-k de chaque bloc est fusionné
+    avec le top-k courant. Une matrice stockée en float16 (éventuellement projetée en mémoire)
+    est convertie en float32 bloc par bloc.
+
+    Args:
+        matrix (np.array) : Matrice (n, dimension), ex. embeddings normalisés
+        queries (np.array) : Requête(s) de forme (dimension,) ou (n_requetes, dimension)
+        k (int) : Nombre d'éléments à retourner
+        exclude (np.array, optional) : Masque booléen de forme (n,) ou (n_requetes, n) des lignes à exclure.
+                                       Defaults to None.
+        chunk_size (int, optional) : Nombre de lignes de `matrix` scorées à la fois. Defaults to 65536.
+
+    Returns:
+        tuple: (top_idx, top_scores), cf. `top_k_indices`
+    """
+    dtype = np.result_type(matrix.dtype, np.float32)
+    queries = np.asarray(queries, dtype=dtype)
+    single = queries.ndim == 1
+    queries = np.atleast_2d(queries)
+    n = len(matrix)
+
+    top_idx = np.empty((len(queries), 0), dtype=np.int64)
+    top_scores = np.empty((len(queries), 0), dtype=dtype)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        scores = queries @ np.asarray(matrix[start:stop], dtype=dtype).T
+        chunk_exclude = exclude[..., start:stop] if exclude is not None else None
+        idx, chunk_scores = top_k_indices(scores, k, exclude=chunk_exclude)
+        top_idx = np.concatenate([top_idx, idx + start], axis=1)
+        top_scores = np.concatenate([top_scores, chunk_scores], axis=1)
+        if start > 0:
+            best, top_scores = top_k_indices(top_scores, k)
+            top_idx = np.take_along_axis(top_idx, best, axis=1)
+
+    if single:
+        top_idx, top_scores = top_idx[0], top_scores[0]
+        if exclude is not None:
+            keep = top_scores > -np.inf
+            top_idx, top_scores = top_idx[keep], top_scores[keep]
+    return top_idx, top_scores
@@ -0,0 +1,159 @@
+import numpy as np
+
+from recommandation_de_livres.iads.topk_utils import top_k_indices
+
+MAX_LEN = 64  # les textes plus longs sont tronqués pour l'indexation
+
+
+def _padded(text, max_len=MAX_LEN):
+    """Texte entouré d'espaces (deux avant, un après) puis tronqué, comme pour l'indexation."""
+    return f"  {text} "[:max_len]
+
+
+def _trigram_keys(texts, max_len=MAX_LEN):
+    """
+    Clés int64 des trigrammes de caractères de plusieurs textes, calculées sans boucle par caractère.
+
+    Les textes sont convertis en tableau de points de code (n, max_len) ; la clé d'un trigramme
+    concatène ses trois points de code sur 21 bits chacun.
+
+    Returns:
+        tuple: (lignes, clés) de même longueur, une entrée par trigramme (doublons compris)
+    """
+    padded = np.array([_padded(t, max_len) for t in texts], dtype=f"<U{max_len}")
+    codes = padded.view(np.uint32).reshape(len(padded), max_len).astype(np.int64)
+    keys = (codes[:, :-2] << 42) | (codes[:, 1:-1] << 21) | codes[:, 2:]
+    valid = np.arange(max_len - 2) < (np.char.str_len(padded) - 2)[:, None]
+    rows = np.broadcast_to(np.arange(len(padded))[:, None], keys.shape)[valid]
+    return rows, keys[valid]
+
+
+class TrigramIndex:
+    """
+    Index inversé trigramme de caractères -> lignes, au format CSR.
+
+    `vocab` est trié : les lignes contenant le trigramme `vocab[t]` sont `postings[indptr[t]:indptr[t + 1]]`.
+    Une requête ne lit que les listes de ses trigrammes, en commençant par les plus rares.
+    """
+
+    def __init__(self, vocab, indptr, postings, n_trigrams, max_len=MAX_LEN):
+        """
+        Args:
+            vocab (np.array) : Clés int64 triées des trigrammes
+            indptr (np.array) : Offsets CSR de taille len(vocab) + 1
+            postings (np.array) : Lignes contenant chaque trigramme, regroupées par trigramme
+            n_trigrams (np.array) : Nombre de trigrammes distincts de chaque ligne
+            max_len (int, optional) : Longueur maximale indexée. Defaults to MAX_LEN.
+        """
+        self.vocab = np.asarray(vocab)
+        self.indptr = np.asarray(indptr)
+        self.postings = np.asarray(postings)
+        self.n_trigrams = np.asarray(n_trigrams)
+        self.max_len = int(max_len)
+
+    def __len__(self):
+        return len(self.n_trigrams)
+
+    @classmethod
+    def build(cls, texts, max_len=MAX_LEN, block_size=100_000):
+        """
+        Construit l'index des trigrammes de textes normalisés.
+
+        Args:
+            texts (list) : Textes indexés, un par ligne
+            max_len (int, optional) : Longueur maximale indexée. Defaults to MAX_LEN.
+            block_size (int, optional) : Nombre de textes convertis à la fois. Defaults to 100_000.
+
+        Returns:
+            TrigramIndex : Index construit
+        """
+        texts = list(texts)
+        all_rows, all_keys = [], []
+        for start in range(0, len(texts), block_size):
+            rows, keys = _trigram_keys(texts[start:start + block_size], max_len)
+            all_rows.append(rows + start)
+            all_keys.append(keys)
+        rows = np.concatenate(all_rows) if all_rows else np.empty(0, dtype=np.int64)
+        keys = np.concatenate(all_keys) if all_keys else np.empty(0, dtype=np.int64)
+
+        # Tri par (trigramme, ligne) puis suppression des trigrammes répétés dans une même ligne
+        order = np.lexsort((rows, keys))
+        rows, keys = rows[order], keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+        rows, keys = rows[first], keys[first]
+
+        vocab, starts = np.unique(keys, return_index=True)
+        indptr = np.append(starts, len(keys)).astype(np.int64)
+        n_trigrams = np.bincount(rows, minlength=len(texts)).astype(np.int32)
+        return cls(vocab, indptr, rows.astype(np.int32), n_trigrams, max_len=max_len)
+
+    def candidates(self, text, n=100, max_postings=10_000, n_verify=None):
+        """
+        Lignes les plus proches d'un texte selon le coefficient de Dice de leurs trigrammes.
+
+        Les listes des trigrammes de la requête sont lues entièrement du plus rare au plus fréquent,
+        jusqu'à `max_postings` entrées : elles donnent les `n_verify` meilleurs candidats. Le nombre exact
+        de trigrammes communs de ces seuls candidats est ensuite complété par recherche dichotomique
+        dans les listes des trigrammes fréquents (triées par ligne).
+
+        Args:
+            text (str) : Texte normalisé recherché
+            n (int, optional) : Nombre maximal de candidats. Defaults to 100.
+            max_postings (int, optional) : Nombre maximal d'entrées lues entièrement. Defaults to 10_000.
+            n_verify (int, optional) : Nombre de candidats vérifiés sur tous les trigrammes. Defaults to None (4 * n).
+
+        Returns:
+            tuple:
+                - rows (np.array) : Lignes candidates, par similarité décroissante
+                - similarity (np.array) : Coefficient de Dice 2 * |communs| / (|requête| + |ligne|)
+        """
+        _, keys = _trigram_keys([text], self.max_len)
+        keys = np.unique(keys)
+        codes = np.searchsorted(self.vocab, keys)
+        found = codes < len(self.vocab)
+        found[found] = self.vocab[codes[found]] == keys[found]
+        codes = codes[found]
+        if len(codes) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        lengths = self.indptr[codes + 1] - self.indptr[codes]
+        order = np.argsort(lengths, kind="stable")
+        # Toujours au moins le trigramme le plus rare
+        n_used = max(1, int(np.searchsorted(np.cumsum(lengths[order]), max_postings, side="right")))
+        used = codes[order[:n_used]]
+        postings = np.concatenate([self.postings[self.indptr[t]:self.indptr[t + 1]] for t in used])
+        rows, shared = np.unique(postings, return_counts=True)
+
+        # Vérification des meilleurs candidats sur les trigrammes fréquents non lus
+        best, _ = top_k_indices(shared, 4 * n if n_verify is None else n_verify)
+        rows, shared = rows[best], shared[best]
+        for t in codes[order[n_used:]]:
+            posting = self.postings[self.indptr[t]:self.indptr[t + 1]]
+            pos = np.minimum(np.searchsorted(posting, rows), len(posting) - 1)
+            shared += posting[pos] == rows
+
+        similarity = 2 * shared / (len(keys) + self.n_trigrams[rows])
+        best, similarity = top_k_indices(similarity, n)
+        return rows[best].astype(np.int64), similarity
+
+    def arrays(self):
+        """Tableaux de l'index, pour le sauvegarder seul (`save`) ou dans le fichier d'un autre index."""
+        return {"vocab": self.vocab, "indptr": self.indptr, "postings": self.postings,
+                "n_trigrams": self.n_trigrams, "max_len": np.int64(self.max_len)}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Reconstruit l'index à partir des tableaux de `arrays`."""
+        return cls(arrays["vocab"], arrays["indptr"], arrays["postings"], arrays["n_trigrams"],
+                   max_len=int(arrays["max_len"]))
+
+    def save(self, path):
+        """Sauvegarde l'index au format npz."""
+        np.savez(path, **self.arrays())
+
+    @classmethod
+    def load(cls, path):
+        """Charge un index sauvegardé avec `save`."""
+        with np.load(path) as f:
+            return cls.from_arrays({key: f[key] for key in f.files})
@@ -0,0 +1,332 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from recommandation_de_livres.iads.array_utils import storable_ids
+from recommandation_de_livres.iads.mf_scoring import lookup_ids
+
+
+def profiles_path(embeddings_path):
+    """
+    Retourne le chemin de la matrice des profils associée à un fichier d'embeddings.
+
+    Ex. : embeddings_sbert.npy -> profiles_sbert.npy (même dossier).
+    """
+    return embeddings_path.with_name(embeddings_path.name.replace("embeddings_", "profiles_", 1))
+
+
+def _meta_path(path):
+    """Fichier des métadonnées (utilisateurs, nombre de notes) d'une matrice de profils."""
+    return path.with_name(f"{path.stem}_users.npz")
+
+
+def _log_paths(path):
+    """Fichiers du journal des mises à jour : identifiants (texte) et enregistrements float32 (binaire)."""
+    return path.with_name(f"{path.stem}_log_users.txt"), path.with_name(f"{path.stem}_log.f32")
+
+
+def remove_profiles(path):
+    """Supprime des profils sauvegardés (matrice, métadonnées et journal), ex. après un réentraînement des embeddings."""
+    for file in (path, _meta_path(path), *_log_paths(path)):
+        file.unlink(missing_ok=True)
+
+
+def content_rating_matrix(index, content_item_ids):
+    """
+    Construit la matrice creuse des notes (utilisateurs x livres du dataset de contenu).
+
+    Les colonnes sont alignées sur les lignes de la matrice d'embeddings ; les notes des livres
+    sans embedding sont ignorées.
+
+    Args:
+        index (InteractionIndex) : Index des interactions
+        content_item_ids (np.array) : item_id alignés sur les lignes des embeddings
+
+    Returns:
+        tuple:
+            - ratings (sp.csr_matrix) : Notes en float32, de forme (n_users, n_livres_contenu)
+            - counts (np.array) : Nombre de notes de chaque utilisateur ayant un embedding
+    """
+    rows = lookup_ids(pd.Index(content_item_ids), index.item_ids)[index.indices]
+    users = np.repeat(np.arange(index.n_users), np.diff(index.indptr))
+    keep = rows >= 0
+    ratings = sp.csr_matrix((index.data[keep].astype(np.float32), (users[keep], rows[keep])),
+                            shape=(index.n_users, len(content_item_ids)))
+    counts = np.bincount(users[keep], minlength=index.n_users).astype(np.int32)
+    return ratings, counts
+
+
+def compute_profiles(ratings, counts, embeddings):
+    """
+    Calcule les profils d'un ensemble d'utilisateurs en un seul produit matriciel.
+
+    Le profil d'un utilisateur est la moyenne des embeddings des livres qu'il a notés, pondérés par
+    la note (cf. `content_utils.user_profile_embedding`).
+
+    Args:
+        ratings (sp.csr_matrix) : Notes des utilisateurs (lignes) alignées sur les embeddings (colonnes)
+        counts (np.array) : Nombre de notes de chaque ligne
+        embeddings (np.array) : Embeddings des livres
+
+    Returns:
+        np.array : Profils en float32, de forme (n_utilisateurs, dimension)
+    """
+    profiles = np.asarray(ratings @ np.asarray(embeddings, dtype=np.float32), dtype=np.float32)
+    profiles /= np.maximum(counts, 1)[:, None]
+    return profiles
+
+
+class UserProfiles:
+    """
+    Matrice des profils de contenu de tous les utilisateurs.
+
+    La ligne d'un utilisateur est son profil : une requête sur profil se ramène à une lecture de ligne
+    suivie d'un top-K sur les similarités.
+
+    Les notes ajoutées depuis le calcul de la matrice sont prises en compte sans la recalculer :
+    chaque profil modifié est conservé sous forme de somme pondérée et de nombre de notes (`updated`),
+    mis à jour en O(d) par note et ajouté à la fin d'un journal rejoué au chargement.
+    """
+
+    def __init__(self, user_ids, profiles, counts, n_interactions, item_ids):
+        """
+        Args:
+            user_ids (np.array) : Identifiants des utilisateurs (un par ligne de `profiles`)
+            profiles (np.array) : Profils en float32
+            counts (np.array) : Nombre de notes prises en compte dans chaque profil
+            n_interactions (int) : Nombre de notes de l'index utilisé pour le calcul
+            item_ids (np.array) : item_id alignés sur les lignes de la matrice d'embeddings
+        """
+        self.user_ids = np.asarray(user_ids)
+        self.profiles = profiles
+        self.counts = np.asarray(counts)
+        self.n_interactions = int(n_interactions)
+        self.item_ids = np.asarray(item_ids)
+        self.updated = {}
+        self.log_path = None
+        self._user_index = None
+        self._item_index = None
+
+    @property
+    def n_items(self):
+        return len(self.item_ids)
+
+    @classmethod
+    def from_index(cls, index, embeddings, content_item_ids):
+        """
+        Calcule les profils de tous les utilisateurs de l'index.
+
+        Args:
+            index (InteractionIndex) : Index des interactions
+            embeddings (np.array) : Embeddings des livres du dataset de contenu
+            content_item_ids (np.array) : item_id alignés sur les lignes de `embeddings`
+
+        Returns:
+            UserProfiles : Profils calculés
+        """
+        ratings, counts = content_rating_matrix(index, content_item_ids)
+        return cls(index.user_ids, compute_profiles(ratings, counts, embeddings), counts,
+                   len(index.indices), content_item_ids)
+
+    def save(self, path):
+        """
+        Sauvegarde la matrice des profils (npy) et ses métadonnées (npz) à côté.
+
+        Les profils mis à jour sont intégrés à la matrice et le journal des mises à jour est vidé.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.updated:
+            self.user_ids, self.profiles, self.counts = self._merged()
+            self.updated = {}
+            self._user_index = None
+
+        # Écriture dans un fichier temporaire puis remplacement : la matrice peut être projetée (mmap)
+        # depuis le fichier existant
+        tmp_path = path.with_name(f"{path.stem}.tmp.npy")
+        np.save(tmp_path, np.asarray(self.profiles, dtype=np.float32))
+        tmp_path.replace(path)
+        np.savez(_meta_path(path), user_ids=storable_ids(self.user_ids), counts=self.counts,
+                 n_interactions=self.n_interactions, item_ids=storable_ids(self.item_ids))
+        for log_file in _log_paths(path):
+            log_file.unlink(missing_ok=True)
+        self.log_path = path
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Charge des profils sauvegardés avec `save` et rejoue le journal des mises à jour.
+
+        Args:
+            path (Path) : Chemin du fichier profiles_<modèle>.npy
+            mmap_mode (str, optional) : Mode de projection mémoire de la matrice. Defaults to "r".
+
+        Returns:
+            UserProfiles ou None : Profils chargés, None si les fichiers n'existent pas
+        """
+        meta_path = _meta_path(path)
+        if not path.exists() or not meta_path.exists():
+            return None
+        with np.load(meta_path) as f:
+            profiles = cls(f["user_ids"], np.load(path, mmap_mode=mmap_mode), f["counts"],
+                           f["n_interactions"], f["item_ids"])
+        profiles._replay_log(path)
+        profiles.log_path = path
+        return profiles
+
+    def is_stale(self, index, n_items):
+        """
+        Indique si les profils ne correspondent plus à l'index des interactions ou aux embeddings.
+
+        Les profils étant lus par identifiant, seul l'ensemble des utilisateurs est comparé à l'index :
+        celui de la matrice complété par les profils du journal (nouveaux comptes), sans recalcul.
+        """
+        if self.n_interactions != len(index.indices) or self.n_items != n_items:
+            return True
+        known = self.rows(index.user_ids) >= 0
+        n_new = 0
+        if self.updated:
+            updated_ids = np.array(list(self.updated), dtype=object)
+            known |= np.isin(np.asarray(index.user_ids).astype(str), updated_ids.astype(str))
+            n_new = int((self.rows(updated_ids) < 0).sum())
+        return len(self.user_ids) + n_new != index.n_users or not known.all()
+
+    def rows(self, user_ids):
+        """Retourne les lignes des utilisateurs (-1 pour les utilisateurs inconnus)."""
+        if self._user_index is None:
+            self._user_index = pd.Index(self.user_ids)
+        return lookup_ids(self._user_index, user_ids)
+
+    def _running(self, user_id):
+        """Retourne (somme pondérée des embeddings, nombre de notes) d'un utilisateur."""
+        updated = self.updated.get(str(user_id))
+        if updated is not None:
+            return updated
+        row = int(self.rows([user_id])[0])
+        if row < 0:
+            return np.zeros(self.profiles.shape[1], dtype=np.float32), 0
+        count = int(self.counts[row])
+        return np.asarray(self.profiles[row], dtype=np.float32) * count, count
+
+    def profile(self, user_id):
+        """
+        Retourne le profil d'un utilisateur.
+
+        Returns:
+            np.array ou None : Profil de l'utilisateur, None s'il n'a noté aucun livre ayant un embedding
+        """
+        sums, count = self._running(user_id)
+        if count == 0:
+            return None
+        return sums / count
+
+    def batch(self, user_ids):
+        """
+        Retourne les profils d'un lot d'utilisateurs (lignes nulles pour les utilisateurs sans profil).
+
+        Args:
+            user_ids (np.array) : Identifiants des utilisateurs
+
+        Returns:
+            np.array : Profils de forme (len(user_ids), dimension)
+        """
+        rows = self.rows(user_ids)
+        profiles = np.asarray(self.profiles[np.maximum(rows, 0)], dtype=np.float32)
+        profiles[rows < 0] = 0
+        if self.updated:
+            keys = np.asarray(user_ids).astype(str)
+            for i in np.flatnonzero(np.isin(keys, list(self.updated))):
+                sums, count = self.updated[keys[i]]
+                profiles[i] = sums / max(count, 1)
+        return profiles
+
+    def batch_counts(self, user_ids):
+        """Nombre de notes prises en compte dans le profil de chaque utilisateur (0 sans profil)."""
+        rows = self.rows(user_ids)
+        counts = np.where(rows >= 0, self.counts[np.maximum(rows, 0)], 0)
+        if self.updated:
+            keys = np.asarray(user_ids).astype(str)
+            for i in np.flatnonzero(np.isin(keys, list(self.updated))):
+                counts[i] = self.updated[keys[i]][1]
+        return counts
+
+    def add_ratings(self, user_id, item_ids, ratings, embeddings, previous_ratings=None):
+        """
+        Met à jour le profil d'un utilisateur avec de nouvelles notes, en O(d) par note.
+
+        Args:
+            user_id (int ou str) : ID de l'utilisateur
+            item_ids (np.array) : item_id des livres notés
+            ratings (np.array) : Nouvelles notes
+            embeddings (np.array) : Embeddings des livres (alignés sur `item_ids` des profils)
+            previous_ratings (np.array, optional) : Anciennes notes des livres déjà notés (NaN pour une
+                                                    nouvelle note). Defaults to None (nouvelles notes).
+
+        Returns:
+            np.array ou None : Nouveau profil de l'utilisateur
+        """
+        ratings = np.asarray(ratings, dtype=np.float32)
+        if previous_ratings is None:
+            previous_ratings = np.full(len(ratings), np.nan, dtype=np.float32)
+        previous_ratings = np.asarray(previous_ratings, dtype=np.float32)
+        is_new = np.isnan(previous_ratings)
+
+        if self._item_index is None:
+            self._item_index = pd.Index(self.item_ids)
+        rows = lookup_ids(self._item_index, item_ids)
+        known = rows >= 0
+
+        sums, count = self._running(user_id)
+        deltas = (ratings - np.where(is_new, 0, previous_ratings))[known]
+        sums = sums + deltas @ np.asarray(embeddings[rows[known]], dtype=np.float32)
+        count += int(is_new[known].sum())
+        n_new = int(is_new.sum())
+
+        self.updated[str(user_id)] = (sums, count)
+        self.n_interactions += n_new
+        if self.log_path is not None:
+            self._append_log(str(user_id), sums, count, n_new)
+        return self.profile(user_id)
+
+    def _merged(self):
+        """Retourne (user_ids, profils, counts) avec les profils mis à jour intégrés à la matrice."""
+        user_ids = self.user_ids
+        profiles = np.array(self.profiles, dtype=np.float32)
+        counts = self.counts.astype(np.int32)
+        updated_ids = np.array(list(self.updated), dtype=object)
+        rows = self.rows(updated_ids)
+        new = rows < 0
+        if new.any():
+            user_ids = np.concatenate([user_ids.astype(object), updated_ids[new]])
+            profiles = np.vstack([profiles, np.zeros((new.sum(), profiles.shape[1]), dtype=np.float32)])
+            counts = np.concatenate([counts, np.zeros(new.sum(), dtype=np.int32)])
+            rows[new] = len(self.user_ids) + np.arange(new.sum())
+        for row, user_id in zip(rows, updated_ids):
+            sums, count = self.updated[user_id]
+            profiles[row] = sums / max(count, 1)
+            counts[row] = count
+        return user_ids, profiles, counts
+
+    def _append_log(self, user_id, sums, count, n_new):
+        """Ajoute un enregistrement (utilisateur, nouvelles notes, nombre de notes, somme) à la fin du journal."""
+        ids_path, values_path = _log_paths(self.log_path)
+        record = np.concatenate([[n_new, count], sums]).astype(np.float32)
+        with open(values_path, "ab") as f:
+            f.write(record.tobytes())
+        with open(ids_path, "a", encoding="utf-8") as f:
+            f.write(f"{user_id}\n")
+
+    def _replay_log(self, path):
+        """Rejoue le journal des mises à jour : le dernier enregistrement de chaque utilisateur fait foi."""
+        ids_path, values_path = _log_paths(path)
+        if not ids_path.exists() or not values_path.exists():
+            return
+        with open(ids_path, encoding="utf-8") as f:
+            user_ids = f.read().splitlines()
+        records = np.fromfile(values_path, dtype=np.float32)
+        width = self.profiles.shape[1] + 2
+        records = records[:len(records) // width * width].reshape(-1, width)
+        # Un enregistrement interrompu (écriture partielle) est ignoré
+        n = min(len(user_ids), len(records))
+        for user_id, record in zip(user_ids[:n], records[:n]):
+            self.updated[user_id] = (record[2:].copy(), int(record[1]))
+            self.n_interactions += int(record[0])
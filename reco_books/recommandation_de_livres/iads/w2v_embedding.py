@@ -0,0 +1,132 @@
+import hashlib
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+
+def encode_corpus(documents, vocabulary):
+    """
+    Convertit un corpus de documents tokenisés en un tableau plat d'indices de vocabulaire.
+
+    Tous les tokens sont convertis en une seule fois (`pd.Index.get_indexer`) ; les tokens absents
+    du vocabulaire sont retirés.
+
+    Args:
+        documents (iterable) : Documents, chacun une liste de tokens
+        vocabulary (list) : Tokens du vocabulaire, dans l'ordre des vecteurs (ex. `model.wv.index_to_key`)
+
+    Returns:
+        tuple:
+            - token_ids (np.array) : Indices int32 des tokens connus, documents concaténés
+            - offsets (np.array) : Début de chaque document dans `token_ids`, de taille n_documents + 1
+    """
+    documents = [list(doc) for doc in documents]
+    lengths = np.fromiter((len(doc) for doc in documents), dtype=np.int64, count=len(documents))
+    token_ids = pd.Index(vocabulary).get_indexer(list(chain.from_iterable(documents)))
+
+    # Nombre de tokens connus de chaque document, puis suppression des tokens inconnus
+    doc_of_token = np.repeat(np.arange(len(documents)), lengths)
+    known = token_ids >= 0
+    offsets = np.zeros(len(documents) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(doc_of_token[known], minlength=len(documents)), out=offsets[1:])
+    return token_ids[known].astype(np.int32), offsets
+
+
+def document_vectors(vectors, token_ids, offsets, weights=None, chunk_tokens=100_000):
+    """
+    Moyenne (éventuellement pondérée) des vecteurs des tokens de chaque document.
+
+    Les vecteurs d'un bloc de documents sont rassemblés en une matrice puis sommés par document avec
+    un seul `np.add.reduceat` ; les blocs contiennent au plus `chunk_tokens` tokens (sauf un document
+    plus long à lui seul), ce qui borne la mémoire.
+
+    Args:
+        vectors (np.array) : Vecteurs du vocabulaire (taille_vocabulaire, dimension)
+        token_ids (np.array) : Indices des tokens, documents concaténés (cf. `encode_corpus`)
+        offsets (np.array) : Début de chaque document dans `token_ids`, de taille n_documents + 1
+        weights (np.array, optional) : Poids de chaque mot du vocabulaire (ex. `sif_weights`). Defaults to None.
+        chunk_tokens (int, optional) : Nombre maximal de tokens rassemblés à la fois. Defaults to 100_000.
+
+    Returns:
+        np.array : Vecteurs float32 des documents (n_documents, dimension), nuls pour les documents sans token connu
+    """
+    n_docs = len(offsets) - 1
+    result = np.zeros((n_docs, vectors.shape[1]), dtype=np.float32)
+    start_doc = 0
+    while start_doc < n_docs:
+        # Dernier document du bloc : au plus chunk_tokens tokens, au moins un document
+        stop_doc = int(np.searchsorted(offsets, offsets[start_doc] + chunk_tokens, side="right")) - 1
+        stop_doc = min(max(stop_doc, start_doc + 1), n_docs)
+        lo, hi = offsets[start_doc], offsets[stop_doc]
+        ids = token_ids[lo:hi]
+        block = np.asarray(vectors[ids], dtype=np.float32)
+        if weights is not None:
+            token_weights = np.asarray(weights, dtype=np.float32)[ids]
+            block *= token_weights[:, None]
+        else:
+            token_weights = np.ones(len(ids), dtype=np.float32)
+
+        lengths = np.diff(offsets[start_doc:stop_doc + 1])
+        # reduceat ne gère pas les segments vides : seuls les documents non vides sont sommés
+        nonempty = np.flatnonzero(lengths > 0)
+        if len(nonempty):
+            starts = offsets[start_doc:stop_doc][nonempty] - lo
+            sums = np.add.reduceat(block, starts, axis=0)
+            totals = np.add.reduceat(token_weights, starts)
+            valid = totals > 0
+            result[start_doc + nonempty[valid]] = sums[valid] / totals[valid, None]
+        start_doc = stop_doc
+    return result
+
+
+def sif_weights(counts, a=1e-3):
+    """
+    Poids SIF (smooth inverse frequency) a / (a + p(mot)) des mots du vocabulaire.
+
+    Args:
+        counts (np.array) : Nombre d'occurrences de chaque mot du vocabulaire
+        a (float, optional) : Paramètre de lissage. Defaults to 1e-3.
+
+    Returns:
+        np.array : Poids float32 de chaque mot
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    return (a / (a + counts / counts.sum())).astype(np.float32)
+
+
+def embed_documents(model, documents, weighting=None, chunk_tokens=100_000):
+    """
+    Calcule les embeddings Word2Vec de tous les documents (moyenne des vecteurs de leurs mots).
+
+    Remplace l'appel de `content_utils.get_text_vector` document par document.
+
+    Args:
+        model (gensim.models.Word2Vec) : Modèle entraîné
+        documents (iterable) : Documents tokenisés
+        weighting (str, optional) : None (moyenne simple) ou "sif" (moyenne pondérée SIF). Defaults to None.
+        chunk_tokens (int, optional) : Nombre maximal de tokens rassemblés à la fois. Defaults to 100_000.
+
+    Returns:
+        np.array : Embeddings float32 des documents (n_documents, vector_size)
+    """
+    token_ids, offsets = encode_corpus(documents, model.wv.index_to_key)
+    weights = None
+    if weighting == "sif":
+        weights = sif_weights([model.wv.get_vecattr(word, "count") for word in model.wv.index_to_key])
+    elif weighting is not None:
+        raise ValueError("Pondération inconnue : None ou 'sif' attendu.")
+    return document_vectors(model.wv.vectors, token_ids, offsets, weights=weights, chunk_tokens=chunk_tokens)
+
+
+def model_id(model, weighting=None):
+    """
+    Identifiant d'un modèle Word2Vec entraîné (empreinte du vocabulaire et des vecteurs) et de la pondération.
+
+    Un modèle réentraîné a d'autres vecteurs, donc un autre identifiant : les embeddings en cache
+    (cf. `embedding_cache`) ne sont réutilisés qu'avec le même modèle.
+    """
+    digest = hashlib.md5()
+    digest.update("\n".join(model.wv.index_to_key).encode("utf-8"))
+    digest.update(np.ascontiguousarray(model.wv.vectors).tobytes())
+    return f"word2vec:{digest.hexdigest()}:{weighting or 'mean'}"
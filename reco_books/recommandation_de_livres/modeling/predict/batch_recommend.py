@@ -0,0 +1,98 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+from pathlib import Path
+import shutil
+
+from loguru import logger
+import numpy as np
+from tqdm import tqdm
+import typer
+
+from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.iads.batch_utils import (
+    build_state,
+    init_worker,
+    score_user_block,
+    user_buckets,
+    write_manifest,
+)
+from recommandation_de_livres.iads.interaction_index import load_interaction_index
+from recommandation_de_livres.iads.model_store import load_scorer, model_dir
+from recommandation_de_livres.iads.user_profiles import UserProfiles, profiles_path
+from recommandation_de_livres.iads.utils import choose_dataset_interactively
+from recommandation_de_livres.loaders.load_data import load_parquet
+
+app = typer.Typer()
+
+DIR = choose_dataset_interactively()
+print(f"Dataset choisi : {DIR}")
+
+
+@app.command()
+def main(
+    model_type: str = typer.Option("svd", help="svd, nmf, als, content ou hybrid"),
+    collab_model: str = typer.Option("svd", help="Modèle collaboratif du mode hybrid (svd, nmf ou als)"),
+    content_model: str = typer.Option("sbert", help="Embeddings des modes content/hybrid (sbert ou w2v)"),
+    top_n: int = 20,
+    alpha: float = 0.5,
+    block_size: int = 512,
+    n_workers: int = mp.cpu_count(),
+    n_buckets: int = 16,
+    ratings_path: Path = PROCESSED_DATA_DIR / DIR / "collaborative_dataset.parquet",
+    index_path: Path = PROCESSED_DATA_DIR / DIR / "interaction_index.npz",
+    content_path: Path = PROCESSED_DATA_DIR / DIR / "content_dataset.parquet",
+    output_dir: Path = None,
+):
+    if model_type not in ("svd", "nmf", "als", "content", "hybrid"):
+        raise ValueError("Modèle invalide : svd, nmf, als, content ou hybrid attendu.")
+    output_dir = output_dir or PROCESSED_DATA_DIR / DIR / "recommendations" / model_type
+
+    logger.info("Loading the interaction index...")
+    index = load_interaction_index(index_path, load_parquet(ratings_path))
+
+    scorer = None
+    if model_type in ("svd", "nmf", "als", "hybrid"):
+        name = collab_model if model_type == "hybrid" else model_type
+        model_path = model_dir(MODELS_DIR / DIR, name)
+        logger.info(f"Loading the collaborative model from {model_path}")
+        scorer = load_scorer(model_path)
+
+    embeddings, content_item_ids, profiles = None, None, None
+    if model_type in ("content", "hybrid"):
+        embeddings_path = PROCESSED_DATA_DIR / DIR / f"embeddings_{content_model}.npy"
+        logger.info(f"Loading the embeddings from {embeddings_path}")
+        embeddings = np.load(embeddings_path)
+        content_item_ids = load_parquet(content_path)["item_id"].to_numpy()
+
+        path = profiles_path(embeddings_path)
+        profiles = UserProfiles.load(path)
+        if profiles is None or profiles.is_stale(index, len(embeddings)):
+            logger.info("Computing the user profiles...")
+            profiles = UserProfiles.from_index(index, embeddings, content_item_ids)
+            profiles.save(path)
+            logger.info(f"User profiles saved to {path}")
+
+    state = build_state(model_type, index, top_n, scorer=scorer, embeddings=embeddings,
+                        content_item_ids=content_item_ids, alpha=alpha, profiles=profiles)
+
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+
+    blocks = [(start, min(start + block_size, index.n_users)) for start in range(0, index.n_users, block_size)]
+    logger.info(f"Scoring {index.n_users} users in {len(blocks)} blocks with {n_workers} workers...")
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(state,)) as pool:
+        futures = [pool.submit(score_user_block, start, stop) for start, stop in blocks]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Blocs d'utilisateurs"):
+            block = future.result()
+            block["user_bucket"] = user_buckets(block["user_id"].to_numpy(), n_buckets)
+            block.to_parquet(output_dir, engine="pyarrow", partition_cols=["user_bucket"], index=False)
+
+    write_manifest(output_dir, model_type=model_type, collab_model=collab_model, content_model=content_model,
+                   top_n=top_n, alpha=alpha, n_buckets=n_buckets, n_users=index.n_users)
+    logger.success(f"Recommendations saved to {output_dir}")
+
+
+if __name__ == "__main__":
+    app()
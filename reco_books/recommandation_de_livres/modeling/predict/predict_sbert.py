@@ -6,8 +6,6 @@ import numpy as np
 import pandas as pd
 from loguru import logger
 import typer
-from sentence_transformers import SentenceTransformer
-import joblib
 
 from sklearn.metrics.pairwise import cosine_similarity
 
@@ -18,6 +16,9 @@ from recommandation_de_livres.iads.content_utils import (
     user_profile_embedding,
     recommandation_content_user_top_k
 )
+from recommandation_de_livres.iads.ann_index import load_content_knn
+from recommandation_de_livres.iads.interaction_index import load_interaction_index
+from recommandation_de_livres.iads.query_encoder import load_query_encoder
 from recommandation_de_livres.iads.utils import choose_dataset_interactively
 
 app = typer.Typer()
@@ -30,13 +31,11 @@ print(f"Dataset choisi : {DIR}")
 use_knn_input = input("Voulez-vous utiliser KNN pour accélérer la recherche ? (o/n) [o] : ").strip().lower() or "o"
 use_knn = use_knn_input == "o"
 if use_knn:
-    knn_path = MODELS_DIR / DIR / "knn_model_sbert.joblib"
-    if knn_path.exists():
-        knn = joblib.load(knn_path)
-        print(f"KNN chargé depuis : {knn_path}")
+    knn = load_content_knn(MODELS_DIR / DIR, "sbert")
+    if knn is not None:
+        print(f"Index des plus proches voisins chargé depuis : {MODELS_DIR / DIR}")
     else:
-        print("Fichier KNN non trouvé, KNN ne sera pas utilisé.")
-        knn = None
+        print("Index des plus proches voisins non trouvé, KNN ne sera pas utilisé.")
 else:
     knn = None
 
@@ -45,14 +44,19 @@ ratings_path = PROCESSED_DATA_DIR / DIR / "collaborative_dataset.parquet"
 model_sbert_path = MODELS_DIR / DIR / "sbert_model"
 embeddings_sbert_path = PROCESSED_DATA_DIR / DIR / "embeddings_sbert.npy"
 content_path = PROCESSED_DATA_DIR / DIR / "content_dataset.parquet"
+index_path = PROCESSED_DATA_DIR / DIR / "interaction_index.npz"
 
 @app.command()
-def main(top_k: int = typer.Option(5, prompt="Nombre de recommandations souhaité")):
+def main(
+    top_k: int = typer.Option(5, prompt="Nombre de recommandations souhaité"),
+    backend: str = typer.Option("auto", help="Encodeur des titres : auto, torch, torch_int8, onnx ou onnx_int8"),
+):
     logger.info("Chargement du contenu et des modèles...")
     content_df = load_parquet(content_path)
-    model = SentenceTransformer(str(model_sbert_path))
+    model = load_query_encoder(model_sbert_path, backend=backend)
     embeddings = np.load(embeddings_sbert_path)
     ratings = load_parquet(ratings_path)
+    index = load_interaction_index(index_path, ratings)
 
     # --- Choix interactif ---
     choice = input("Souhaitez-vous générer des recommandations basées sur un profil utilisateur ou un titre ? [profil/titre] : ").strip().lower()
@@ -67,7 +71,8 @@ def main(top_k: int = typer.Option(5, prompt="Nombre de recommandations souhait
             title = input("Titre du livre pour la recommandation : ").strip()
             top_books, sim_scores = recommandation_content_top_k(title, embeddings, model, content_df, knn=knn, k=top_k)
         else:
-            top_books, sim_scores = recommandation_content_user_top_k(user_id, embeddings, model, content_df, ratings, knn=knn, k=top_k)
+            top_books, sim_scores = recommandation_content_user_top_k(user_id, embeddings, content_df, ratings, knn=knn, k=top_k,
+                                                                       index=index)
 
     elif choice == "titre":
         title = input("Titre du livre pour la recommandation : ").strip()
@@ -1,12 +1,14 @@
 from pathlib import Path
 import pandas as pd
-import pickle
 import typer
 from loguru import logger
 from tqdm import tqdm
 
 from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.iads.catalog_index import CatalogIndex
 from recommandation_de_livres.iads.collabo_utils import recommandation_collaborative_top_k
+from recommandation_de_livres.iads.interaction_index import load_interaction_index
+from recommandation_de_livres.iads.model_store import load_scorer
 from recommandation_de_livres.loaders.load_data import load_parquet
 from recommandation_de_livres.iads.utils import choose_dataset_interactively
 
@@ -17,23 +19,27 @@ print(f"Dataset choisi : {DIR}")
 @app.command()
 def main(
     user_index: str,
-    model_path: Path = MODELS_DIR / DIR / "svd_model.pkl",
+    model_path: Path = MODELS_DIR / DIR / "svd_model",
     ratings_path: Path = PROCESSED_DATA_DIR / DIR / "collaborative_dataset.parquet",
+    index_path: Path = PROCESSED_DATA_DIR / DIR / "interaction_index.npz",
+    content_path: Path = PROCESSED_DATA_DIR / DIR / "content_dataset.parquet",
     top_k: int = 5
 ):
     
     logger.info("Loading ratings and books data...")
     ratings = load_parquet(ratings_path)
+    # Index des notes et catalogue chargés une fois, plutôt que reconstruits sur toutes les notes par l'appel
+    index = load_interaction_index(index_path, ratings)
+    books = load_parquet(content_path)
     user_ratings = ratings.loc[ratings['user_index']==int(user_index)].iloc[0]
     if user_ratings.empty:
         raise ValueError(f"Aucun utilisateur trouvé avec user_index={user_index}")
     else:
-        user_id = user_ratings['user_id']
+        user_id = str(user_ratings['user_id'])
     ratings["user_id"] = ratings["user_id"].astype(str)
 
     logger.info(f"Loading trained SVD model from {model_path}")
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
+    scorer = load_scorer(model_path)
 
     if user_id not in ratings['user_id'].unique():
         logger.warning(f"User {user_id} not found in ratings dataset.")
@@ -41,15 +47,18 @@ def main(
 
     logger.info(f"Predicting top-{top_k} recommendations for user {user_id}...")
 
-    top_recommendations = recommandation_collaborative_top_k(
+    top_recommendations, _ = recommandation_collaborative_top_k(
     k=top_k,
     user_id=user_id,
-    model=model,
-    ratings=ratings
+    model=scorer,
+    ratings=ratings,
+    books=books,
+    index=index,
+    catalog=CatalogIndex.from_books(books)
     )
 
     logger.info("Top recommendations:")
-    logger.info("\n" + top_recommendations.to_string(index=False))
+    logger.info("\n" + top_recommendations[['title', 'authors']].to_string(index=False))
 
 
 if __name__ == "__main__":
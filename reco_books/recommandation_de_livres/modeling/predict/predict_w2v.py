@@ -9,7 +9,6 @@ import typer
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.neighbors import NearestNeighbors
 import gensim
-import joblib
 
 from recommandation_de_livres.config import PROCESSED_DATA_DIR, MODELS_DIR
 from recommandation_de_livres.iads.content_utils import (
@@ -18,6 +17,8 @@ from recommandation_de_livres.iads.content_utils import (
     recommandation_content_user_top_k
 )
 from recommandation_de_livres.loaders.load_data import load_parquet
+from recommandation_de_livres.iads.ann_index import load_content_knn
+from recommandation_de_livres.iads.interaction_index import load_interaction_index
 from recommandation_de_livres.iads.utils import choose_dataset_interactively
 
 app = typer.Typer()
@@ -30,13 +31,11 @@ print(f"Dataset choisi : {DIR}")
 use_knn_input = input("Voulez-vous utiliser KNN pour accélérer la recherche ? (o/n) [o] : ").strip().lower() or "o"
 use_knn = use_knn_input == "o"
 if use_knn:
-    knn_path = MODELS_DIR / DIR / "knn_model_w2v.joblib"
-    if knn_path.exists():
-        knn = joblib.load(knn_path)
-        print(f"KNN chargé depuis : {knn_path}")
+    knn = load_content_knn(MODELS_DIR / DIR, "w2v")
+    if knn is not None:
+        print(f"Index des plus proches voisins chargé depuis : {MODELS_DIR / DIR}")
     else:
-        print("Fichier KNN non trouvé, KNN ne sera pas utilisé.")
-        knn = None
+        print("Index des plus proches voisins non trouvé, KNN ne sera pas utilisé.")
 else:
     knn = None
 
@@ -45,6 +44,7 @@ ratings_path = PROCESSED_DATA_DIR / DIR / "collaborative_dataset.parquet"
 model_w2v_path = MODELS_DIR / DIR / "word2vec.model"
 embeddings_w2v_path = PROCESSED_DATA_DIR / DIR / "embeddings_w2v.npy"
 content_path = PROCESSED_DATA_DIR / DIR / "content_dataset.parquet"
+index_path = PROCESSED_DATA_DIR / DIR / "interaction_index.npz"
 
 @app.command()
 def main(top_k: int = typer.Option(5, prompt="Nombre de recommandations souhaité")):
@@ -53,6 +53,7 @@ def main(top_k: int = typer.Option(5, prompt="Nombre de recommandations souhait
     model = gensim.models.Word2Vec.load(str(model_w2v_path))
     embeddings = np.load(embeddings_w2v_path)
     ratings = load_parquet(ratings_path)
+    index = load_interaction_index(index_path, ratings)
 
     # --- Choix interactif ---
     choice = input("Souhaitez-vous générer des recommandations basées sur un profil utilisateur ou un titre ? [profil/titre] : ").strip().lower()
@@ -66,7 +67,8 @@ def main(top_k: int = typer.Option(5, prompt="Nombre de recommandations souhait
             title = input("Titre du livre pour la recommandation : ").strip()
             top_books, sim_scores = recommandation_content_top_k(title, embeddings, model, content_df, knn=knn, k=top_k)
         else:
-            top_books, sim_scores = recommandation_content_user_top_k(user_id, embeddings, model, content_df, ratings, knn=knn, k=top_k)
+            top_books, sim_scores = recommandation_content_user_top_k(user_id, embeddings, content_df, ratings, knn=knn, k=top_k,
+                                                                       index=index)
 
     elif choice == "titre":
         title = input("Titre du livre pour la recommandation : ").strip()
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from loguru import logger
+import numpy as np
+import typer
+
+from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.iads.pq import recall_report
+from recommandation_de_livres.iads.utils import choose_dataset_interactively
+
+app = typer.Typer()
+
+DIR = choose_dataset_interactively()
+print(f"Dataset choisi : {DIR}")
+
+@app.command()
+def main(
+    # ---- REPLACE DEFAULT PATHS AS APPROPRIATE ----
+    content_model: str = typer.Option("sbert", help="Embeddings à compresser (sbert ou w2v)"),
+    models_dir: Path = MODELS_DIR / DIR,
+    m_values: str = typer.Option("16,32,48,64", help="Nombres d'octets par livre testés"),
+    n_rerank: str = typer.Option("0,100", help="Nombres de candidats reclassés testés (0 = ADC seul)"),
+    k: int = 10,
+    n_queries: int = 200,
+    seed: int = 42,
+    # -----------------------------------------
+):
+    if content_model not in ("sbert", "w2v"):
+        raise ValueError("Modèle invalide : sbert ou w2v attendu.")
+    embeddings_path = PROCESSED_DATA_DIR / DIR / f"embeddings_{content_model}.npy"
+
+    logger.info(f"Loading the embeddings from {embeddings_path}")
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    logger.info(f"Embeddings: {embeddings.shape[0]} books x {embeddings.shape[1]} dimensions "
+                f"({embeddings.shape[1] * 4} bytes per book in float32)")
+
+    logger.info("Building the PQ codecs and measuring recall...")
+    report = recall_report(embeddings, m_values=[int(m) for m in m_values.split(",")], k=k, n_queries=n_queries,
+                           n_rerank=[int(n) for n in n_rerank.split(",")], seed=seed)
+
+    report_path = models_dir / f"pq_{content_model}_report.csv"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(report_path, index=False)
+    logger.info(f"\n{report.to_string(index=False)}")
+    logger.success(f"PQ report saved to {report_path}")
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from loguru import logger
+import typer
+
+from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.iads.query_encoder import BACKENDS, latency_report, onnx_dir
+from recommandation_de_livres.iads.utils import choose_dataset_interactively
+from recommandation_de_livres.loaders.load_data import load_parquet
+
+app = typer.Typer()
+
+DIR = choose_dataset_interactively()
+print(f"Dataset choisi : {DIR}")
+
+@app.command()
+def main(
+    # ---- REPLACE DEFAULT PATHS AS APPROPRIATE ----
+    model_path: Path = MODELS_DIR / DIR / "sbert_model",
+    content_path: Path = PROCESSED_DATA_DIR / DIR / "content_dataset.parquet",
+    backends: str = typer.Option(",".join(BACKENDS), help="Backends comparés à PyTorch float32"),
+    n_queries: int = 200,
+    n_threads: int = typer.Option(None, help="Threads de chaque backend"),
+    seed: int = 42,
+    # -----------------------------------------
+):
+    backends = tuple(backends.split(","))
+    if any(b.startswith("onnx") for b in backends):
+        logger.info(f"ONNX backends are exported to {onnx_dir(model_path)} if needed")
+
+    # Titres réels du catalogue, encodés un par un comme les titres saisis
+    titles = load_parquet(content_path)["title"].dropna().astype(str)
+    titles = titles.sample(min(n_queries, len(titles)), random_state=seed).tolist()
+
+    logger.info(f"Measuring the query latency of {', '.join(backends)} on {len(titles)} titles...")
+    report = latency_report(model_path, titles, backends=backends, n_threads=n_threads)
+
+    report_path = MODELS_DIR / DIR / "query_encoder_report.csv"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(report_path, index=False)
+    logger.info(f"\n{report.to_string(index=False)}")
+    logger.success(f"Query encoder report saved to {report_path}")
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,62 @@
+import json
+import multiprocessing as mp
+from pathlib import Path
+
+from loguru import logger
+import typer
+
+from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.iads.hyperparameter_search import successive_halving
+from recommandation_de_livres.iads.utils import choose_dataset_interactively
+from recommandation_de_livres.loaders.load_data import load_parquet
+
+app = typer.Typer()
+
+DIR = choose_dataset_interactively()
+print(f"Dataset choisi : {DIR}")
+
+@app.command()
+def main(
+    # ---- REPLACE DEFAULT PATHS AS APPROPRIATE ----
+    features_path: Path = PROCESSED_DATA_DIR / DIR / "collaborative_dataset.parquet",
+    models_dir: Path = MODELS_DIR / DIR,
+    model_type: str = typer.Option("svd", help="svd ou nmf"),
+    n_trials: int = 27,
+    min_epochs: int = 5,
+    max_epochs: int = 45,
+    eta: int = 3,
+    valid_size: float = 0.2,
+    rating_max: int = 5,
+    seed: int = 42,
+    n_workers: int = mp.cpu_count(),
+    # -----------------------------------------
+):
+    if model_type not in ("svd", "nmf"):
+        raise ValueError("Modèle invalide : svd ou nmf attendu.")
+
+    logger.info("Loading the features...")
+    collaborative_df = load_parquet(features_path)
+
+    logger.info(f"Searching {n_trials} {model_type.upper()} configurations ({min_epochs} to {max_epochs} epochs, eta={eta})...")
+
+    def log_rung(trials):
+        rung = trials[trials["rung"] == trials["rung"].max()]
+        logger.info(f"Rung {rung['rung'].iloc[0]} ({rung['n_epochs'].iloc[0]} epochs): "
+                    f"{len(rung)} trials, best RMSE {rung['rmse'].min():.4f}")
+
+    best, trials = successive_halving(collaborative_df, model_type.upper(), n_trials=n_trials, min_epochs=min_epochs,
+                                      max_epochs=max_epochs, eta=eta, valid_size=valid_size,
+                                      rating_scale=(1, rating_max), seed=seed, n_workers=n_workers, callback=log_rung)
+
+    logger.success(f"Best configuration: {best}")
+
+    models_dir.mkdir(parents=True, exist_ok=True)
+    best_path = models_dir / f"{model_type}_search_best.json"
+    trials_path = models_dir / f"{model_type}_search_trials.csv"
+    with open(best_path, "w", encoding="utf-8") as f:
+        json.dump(best, f, indent=2)
+    trials.to_csv(trials_path, index=False)
+    logger.success(f"Search results saved to {best_path} and {trials_path}")
+
+if __name__ == "__main__":
+    app()
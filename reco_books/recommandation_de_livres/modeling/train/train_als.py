@@ -0,0 +1,61 @@
+from pathlib import Path
+
+from loguru import logger
+import pandas as pd
+import typer
+
+from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.iads.als import ALS, build_rating_matrix
+from recommandation_de_livres.iads.model_store import save_mf_model
+from recommandation_de_livres.iads.utils import choose_dataset_interactively
+from recommandation_de_livres.loaders.load_data import load_parquet
+
+app = typer.Typer()
+
+DIR = choose_dataset_interactively()
+print(f"Dataset choisi : {DIR}")
+
+@app.command()
+def main(
+    # ---- REPLACE DEFAULT PATHS AS APPROPRIATE ----
+    features_path: Path = PROCESSED_DATA_DIR / DIR / "collaborative_dataset.parquet",
+    implicit_path: Path = PROCESSED_DATA_DIR / DIR / "implicit_dataset.parquet",
+    model_path: Path = MODELS_DIR / DIR / "als_model",
+    n_factors: int = 50,
+    n_epochs: int = 15,
+    reg: float = 0.1,
+    implicit: bool = False,
+    alpha: float = 40.0,
+    implicit_weight: float = 1.0,
+    n_threads: int = None,
+    rating_max: int = 5,
+    # -----------------------------------------
+):
+    logger.info("Loading the features...")
+
+    collaborative_df = load_parquet(features_path)[['user_id', 'item_id', 'rating']]
+
+    if implicit and implicit_path.exists():
+        implicit_df = load_parquet(implicit_path)
+        logger.info(f"Adding {len(implicit_df)} implicit interactions...")
+        collaborative_df = pd.concat([collaborative_df, implicit_df[['user_id', 'item_id', 'rating']]], ignore_index=True)
+
+    logger.info("Building the sparse rating matrix...")
+
+    matrix, user_ids, item_ids = build_rating_matrix(collaborative_df, implicit_weight=implicit_weight)
+    logger.info(f"Matrix: {matrix.shape[0]} users x {matrix.shape[1]} items, {matrix.nnz} interactions")
+
+    als = ALS(n_factors=n_factors, n_epochs=n_epochs, reg=reg, implicit=implicit, alpha=alpha, n_threads=n_threads)
+
+    logger.info(f"Training the {'implicit' if implicit else 'explicit'} ALS model...")
+
+    als.fit(matrix, user_ids, item_ids, callback=lambda epoch, _: logger.info(f"Epoch {epoch + 1}/{n_epochs} done"))
+
+    logger.success("Modeling training complete.")
+
+    logger.success(f"Saving the ALS factors to {model_path}")
+    save_mf_model(als.to_scorer(rating_scale=(1, rating_max)), model_path, algo="als", n_factors=n_factors,
+                  n_epochs=n_epochs, reg=reg, implicit=implicit, alpha=alpha)
+
+if __name__ == "__main__":
+    app()
@@ -1,9 +1,8 @@
 from pathlib import Path
 from loguru import logger
 import numpy as np
-import joblib
-from sklearn.neighbors import NearestNeighbors
 from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.iads.ann_index import ann_index_dir, build_ann_index
 from recommandation_de_livres.iads.utils import choose_dataset_interactively
 
 # Choix interactif du dataset
@@ -18,31 +17,42 @@ choice = input("Entrez 1 ou 2 : ").strip()
 
 if choice == "1":
     embeddings_path = PROCESSED_DATA_DIR / DIR / "embeddings_w2v.npy"
-    knn_model_path = MODELS_DIR / DIR / "knn_model_w2v.joblib"
+    index_path = ann_index_dir(MODELS_DIR / DIR, "w2v")
 elif choice == "2":
     embeddings_path = PROCESSED_DATA_DIR / DIR / "embeddings_sbert.npy"
-    knn_model_path = MODELS_DIR / DIR / "knn_model_sbert.joblib"
+    index_path = ann_index_dir(MODELS_DIR / DIR, "sbert")
 else:
     raise ValueError("Choix invalide. Entrez 1 ou 2.")
 
 print(f"Embeddings choisis : {embeddings_path}")
 
-# Paramètres du KNN
-n_neighbors = 11
-metric = "cosine"
+# Paramètres de l'index ANN
+kind = input("Type d'index ANN (ivf/hnsw/pq) [ivf] : ").strip().lower() or "ivf"
+if kind == "ivf":
+    n_lists = input("Nombre de listes (vide = 4 * sqrt(nombre de livres)) : ").strip()
+    nprobe = int(input("Nombre de listes parcourues par requête (nprobe) [8] : ").strip() or 8)
+    params = {"n_lists": int(n_lists) if n_lists else None, "nprobe": nprobe}
+elif kind == "hnsw":
+    M = int(input("Nombre de liens par nœud (M) [16] : ").strip() or 16)
+    ef = int(input("Taille de la liste de candidats à la recherche (ef) [64] : ").strip() or 64)
+    params = {"M": M, "ef": ef}
+elif kind == "pq":
+    m = int(input("Nombre d'octets par livre (m, 16 à 64) [32] : ").strip() or 32)
+    n_rerank = int(input("Nombre de candidats reclassés exactement [100] : ").strip() or 100)
+    params = {"m": m, "n_rerank": n_rerank}
+else:
+    raise ValueError("Choix invalide. Entrez ivf, hnsw ou pq.")
 
 # ---- Chargement des embeddings ----
 logger.info(f"Chargement des embeddings depuis {embeddings_path}")
 embeddings = np.load(embeddings_path)
 logger.info(f"Dimensions des embeddings : {embeddings.shape}")
 
-# ---- Entraînement du modèle KNN ----
-logger.info("Initialisation et entraînement du modèle KNN...")
-knn = NearestNeighbors(n_neighbors=n_neighbors, metric=metric)
-knn.fit(embeddings)
+# ---- Construction de l'index ANN ----
+logger.info(f"Construction de l'index {kind.upper()}...")
+index = build_ann_index(embeddings, kind=kind, **params)
 
-# ---- Sauvegarde du modèle ----
-knn_model_path.parent.mkdir(parents=True, exist_ok=True)
-joblib.dump(knn, knn_model_path)
-logger.success(f"Modèle KNN sauvegardé dans {knn_model_path}")
-logger.success("Entraînement KNN terminé avec succès.")
+# ---- Sauvegarde de l'index ----
+index.save(index_path)
+logger.success(f"Index ANN sauvegardé dans {index_path}")
+logger.success("Construction de l'index ANN terminée avec succès.")
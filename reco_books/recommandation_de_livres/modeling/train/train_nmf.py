@@ -5,9 +5,9 @@ from loguru import logger
 from tqdm import tqdm
 import pandas as pd
 import typer
-import pickle
 
 from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.iads.model_store import save_mf_model
 from recommandation_de_livres.iads.utils import choose_dataset_interactively
 from recommandation_de_livres.loaders.load_data import load_parquet
 
@@ -23,7 +23,7 @@ rating_max = int(raing_max_input) if raing_max_input.strip() != "" else 5
 def main(
     # ---- REPLACE DEFAULT PATHS AS APPROPRIATE ----
     features_path: Path = PROCESSED_DATA_DIR / DIR / "collaborative_dataset.parquet",
-    model_path: Path = MODELS_DIR / DIR / "nmf_model.pkl",
+    model_path: Path = MODELS_DIR / DIR / "nmf_model",
     # -----------------------------------------
 ):
     logger.info("Loading the features...")
@@ -56,11 +56,8 @@ def main(
 
     logger.success("Modeling training complete.")
 
-    model_path.parent.mkdir(parents=True, exist_ok=True)
-
-    logger.success(f"Saving the NMF model to {model_path}")
-    with open(model_path, 'wb') as f:
-        pickle.dump(nmf, f)
+    logger.success(f"Saving the NMF factors to {model_path}")
+    save_mf_model(nmf, model_path, algo="nmf", n_factors=n_factors, n_epochs=n_epochs, reg_pu=reg_pu, reg_qi=reg_qi)
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
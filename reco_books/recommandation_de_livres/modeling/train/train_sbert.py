@@ -2,14 +2,14 @@ from pathlib import Path
 from sentence_transformers import SentenceTransformer
 
 from loguru import logger
-from tqdm import tqdm
-import pandas as pd
-import numpy as np
+import multiprocessing as mp
 import typer
-import pickle
 import torch
 
 from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.iads.embedding_cache import EmbeddingCache, cache_dir, cached_encode
+from recommandation_de_livres.iads.embedding_store import save_embeddings, store_dir
+from recommandation_de_livres.iads.sbert_encoding import encode_texts
 from recommandation_de_livres.iads.utils import choose_dataset_interactively
 from recommandation_de_livres.loaders.load_data import load_parquet
 
@@ -25,6 +25,12 @@ def main(
     features_path: Path = PROCESSED_DATA_DIR / DIR / "features_sbert.parquet",
     model_path: Path = MODELS_DIR / DIR / "sbert_model",
     embeddings_path: Path = PROCESSED_DATA_DIR / DIR / "embeddings_sbert.npy",
+    store_dtype: str = typer.Option("float32", help="Type des vecteurs normalisés sur disque (float32 ou float16)"),
+    max_tokens: int = typer.Option(256, help="Budget de tokens par texte (les textes plus longs sont tronqués)"),
+    batch_size: int = 64,
+    chunk_size: int = typer.Option(4096, help="Textes par bloc (unité de répartition et de reprise)"),
+    n_workers: int = typer.Option(max(1, mp.cpu_count() // 4), help="Processus d'encodage sur CPU"),
+    threads_per_worker: int = typer.Option(None, help="Threads par processus (par défaut : cœurs / processus)"),
     # -----------------------------------------
 ):
     logger.info("Loading the features...")
@@ -35,26 +41,38 @@ def main(
 
     sbert = SentenceTransformer('all-MiniLM-L6-v2', device='cuda' if torch.cuda.is_available() else 'cpu')
 
-    logger.info("Creating Sentence-Bert embeddings...")
-
-    embeddings=sbert.encode(content_df['text_clean'], convert_to_numpy=True, batch_size=64, show_progress_bar=True)
-    
-    logger.success("Embeddings creation complete.")
-
     model_path.parent.mkdir(parents=True, exist_ok=True)
-    embeddings_path.parent.mkdir(parents=True, exist_ok=True)
 
     logger.info(f"Saving the Sentence-BERT model to {model_path}")
-    
+
+    # Sauvegardé avant l'encodage : les workers chargent le modèle depuis ce dossier
     sbert.save(str(model_path))
 
     logger.success("Sentence-BERT model saved.")
 
-    logger.info(f"Saving embeddings to {embeddings_path}")
+    # Seuls les textes absents du cache (livres nouveaux ou modifiés) sont encodés
+    cache = EmbeddingCache(cache_dir(embeddings_path), f"all-MiniLM-L6-v2:{max_tokens}",
+                           sbert.get_sentence_embedding_dimension())
+    delta_path = embeddings_path.with_name(f"{embeddings_path.stem}_delta.npy")
+
+    def encode(texts):
+        logger.info(f"Creating Sentence-Bert embeddings for {len(texts)} new texts...")
+        return encode_texts(sbert, texts, delta_path, model_path=model_path, max_tokens=max_tokens,
+                            batch_size=batch_size, chunk_size=chunk_size, n_workers=n_workers,
+                            threads_per_worker=threads_per_worker)
+
+    embeddings, n_encoded = cached_encode(content_df['text_clean'].tolist(), encode, cache)
+    delta_path.unlink(missing_ok=True)
+
+    logger.success(f"Embeddings creation complete ({n_encoded} texts encoded, {len(cache)} in cache).")
+
+    logger.info(f"Saving embeddings to {embeddings_path} and the normalized store to {store_dir(embeddings_path)}")
 
-    np.save(embeddings_path, embeddings)
+    # Le store est reconstruit ; l'index ANN et les profils des anciens embeddings sont supprimés
+    save_embeddings(embeddings_path, embeddings, content_df['item_id'].to_numpy(), dtype=store_dtype,
+                    models_dir=MODELS_DIR / DIR)
 
-    logger.success("Embeddings saved")
+    logger.success("Embeddings and embedding store saved")
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
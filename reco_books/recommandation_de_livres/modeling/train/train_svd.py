@@ -5,9 +5,9 @@ from loguru import logger
 from tqdm import tqdm
 import pandas as pd
 import typer
-import pickle
 
 from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
+from recommandation_de_livres.iads.model_store import save_mf_model
 from recommandation_de_livres.iads.utils import choose_dataset_interactively
 from recommandation_de_livres.loaders.load_data import load_parquet
 
@@ -23,7 +23,7 @@ rating_max = int(raing_max_input) if raing_max_input.strip() != "" else 5
 def main(
     # ---- REPLACE DEFAULT PATHS AS APPROPRIATE ----
     features_path: Path = PROCESSED_DATA_DIR / DIR / "collaborative_dataset.parquet",
-    model_path: Path = MODELS_DIR / DIR / "svd_model.pkl",
+    model_path: Path = MODELS_DIR / DIR / "svd_model",
     # -----------------------------------------
 ):
     logger.info("Loading the features...")
@@ -57,11 +57,8 @@ def main(
 
     logger.success("Modeling training complete.")
 
-    model_path.parent.mkdir(parents=True, exist_ok=True)
-
-    logger.success(f"Saving the SVD model to {model_path}")
-    with open(model_path, 'wb') as f:
-        pickle.dump(svd, f)
+    logger.success(f"Saving the SVD factors to {model_path}")
+    save_mf_model(svd, model_path, algo="svd", n_factors=n_factors, n_epochs=n_epochs, lr_all=lr_all, reg_all=reg_all)
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -1,9 +1,7 @@
 from pathlib import Path
 
 from loguru import logger
-from tqdm import tqdm
 import pandas as pd
-import numpy as np
 import typer
 import gensim
 import multiprocessing as mp
@@ -11,7 +9,9 @@ import multiprocessing as mp
 from recommandation_de_livres.config import MODELS_DIR, PROCESSED_DATA_DIR
 from recommandation_de_livres.iads.utils import choose_dataset_interactively
 from recommandation_de_livres.loaders.load_data import load_parquet
-from recommandation_de_livres.iads.content_utils import get_text_vector
+from recommandation_de_livres.iads.w2v_embedding import embed_documents, model_id
+from recommandation_de_livres.iads.embedding_cache import EmbeddingCache, cache_dir, cached_encode
+from recommandation_de_livres.iads.embedding_store import save_embeddings, store_dir
 from recommandation_de_livres.iads.progress_w2v import TqdmCorpus, EpochLogger
 
 app = typer.Typer()
@@ -25,16 +25,51 @@ def main(
     features_path: Path = PROCESSED_DATA_DIR / DIR / "features_w2v.parquet",
     model_path: Path = MODELS_DIR / DIR / "word2vec.model",
     embeddings_path: Path = PROCESSED_DATA_DIR / DIR / "embeddings_w2v.npy",
+    store_dtype: str = typer.Option("float32", help="Type des vecteurs normalisés sur disque (float32 ou float16)"),
+    weighting: str = typer.Option(None, help="Pondération des mots des embeddings : aucune (moyenne) ou sif"),
     vector_size: int = 300,
     window: int = 10,
     min_count: int = 2,
     epochs: int = 5,
+    retrain: bool = typer.Option(True, help="Réentraîner le modèle ; sinon le modèle existant est rechargé et les embeddings en cache réutilisés"),
     # -----------------------------------------
 ):
     logger.info("Loading the features...")
 
     content_df = load_parquet(features_path)
 
+    if not retrain and model_path.exists():
+        logger.info(f"Loading the Word2Vec model from {model_path}")
+        w2v = gensim.models.Word2Vec.load(str(model_path))
+    else:
+        w2v = train_model(content_df, vector_size, window, min_count, epochs)
+
+        model_path.parent.mkdir(parents=True, exist_ok=True)
+
+        logger.info(f"Saving the Word2Vec model to {model_path}")
+        w2v.save(str(model_path))
+        logger.success("Word2Vec model saved.")
+
+    embeddings_path.parent.mkdir(parents=True, exist_ok=True)
+
+    logger.info("Calculating the embeddings...")
+
+    # Moyenne des vecteurs des mots des livres absents du cache, par blocs de tokens
+    cache = EmbeddingCache(cache_dir(embeddings_path), model_id(w2v, weighting), w2v.wv.vector_size)
+    book_embeddings, n_encoded = cached_encode(
+        content_df['text_clean'].tolist(), lambda docs: embed_documents(w2v, docs, weighting=weighting), cache
+    )
+    logger.info(f"{n_encoded} texts embedded, {len(cache)} in cache")
+
+    logger.info(f"Saving the embeddings to {embeddings_path} and the normalized store to {store_dir(embeddings_path)}")
+    # Le store est reconstruit ; l'index ANN et les profils des anciens embeddings sont supprimés
+    save_embeddings(embeddings_path, book_embeddings, content_df['item_id'].to_numpy(), dtype=store_dtype,
+                    models_dir=MODELS_DIR / DIR)
+    logger.success("Embeddings and embedding store saved.")
+
+
+def train_model(content_df, vector_size, window, min_count, epochs):
+    """Entraîne un modèle Word2Vec (CBOW) sur les textes nettoyés des livres."""
     logger.info("Creating a Word2Vec model...")
 
     corpus = TqdmCorpus(content_df['text_clean'].apply(lambda x: list(x)))
@@ -61,23 +96,7 @@ def main(
     )
 
     logger.success("Model training complete.")
-
-    model_path.parent.mkdir(parents=True, exist_ok=True)
-    embeddings_path.parent.mkdir(parents=True, exist_ok=True)
-
-    logger.info(f"Saving the Word2Vec model to {model_path}")
-    w2v.save(str(model_path))
-    logger.success("Word2Vec model saved.")
-
-    logger.info("Calculating the embeddings...")
-
-    book_embeddings = np.vstack([
-        get_text_vector(tokens, w2v) for tokens in tqdm(corpus, desc="Calcul des embeddings")
-    ])
-
-    logger.info(f"Saving the embeddings to {embeddings_path}")
-    np.save(embeddings_path, book_embeddings)
-    logger.success("Embeddings saved.")
+    return w2v
 
 if __name__ == "__main__":
     app()
\ No newline at end of file